@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+# Finished jobs are deleted once they are this old
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', str(24 * 3600)))
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class QueueFull(Exception):
+    """Raised when the local job queue has no room for another job"""
+
+
+class JobError(Exception):
+    """Raised by a handler to fail a job with a JSON-serialisable detail payload"""
+
+    def __init__(self, detail):
+        super().__init__(detail.get('error', 'Job failed') if isinstance(detail, dict) else str(detail))
+        self.detail = detail
+
+
+class JobStore:
+    """Job state in a local SQLite file, shared by every worker process on the box"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    worker_pid INTEGER,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind, payload, max_pending=None):
+        """
+        Queue a job and return its id. With max_pending, raises QueueFull
+        instead when that many jobs are already queued; the count and the
+        insert share one write transaction, so concurrent submits cannot
+        overshoot it.
+        """
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if max_pending is not None and self.count_queued() >= max_pending:
+                raise QueueFull(f"{max_pending} jobs already waiting")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, worker_pid, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, cls=DjangoJSONEncoder), os.getpid(), utc_now())
+            )
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return job_id
+
+    def update(self, job_id, **fields):
+        for key in ('payload', 'result', 'error'):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key], cls=DjangoJSONEncoder)
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        self._connect().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ('payload', 'result', 'error'):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def delete(self, job_id):
+        self._connect().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def count_queued(self):
+        return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def claim(self, kinds):
+        """
+        Mark the oldest queued job of one of kinds as running for this
+        process and return it, or None. The conditional UPDATE lets only one
+        worker, in any process, claim a given job.
+        """
+        if not kinds:
+            return None
+        conn = self._connect()
+        placeholders = ', '.join('?' for _ in kinds)
+        while True:
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) "
+                f"ORDER BY created_at LIMIT 1",
+                tuple(kinds)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ? WHERE id = ? AND status = 'queued'",
+                (os.getpid(), utc_now(), row['id'])
+            ).rowcount
+            if claimed:
+                return self.get(row['id'])
+            # Another worker got there first; try the next job
+
+    def fail_orphaned(self):
+        """Fail running jobs whose worker process has exited, so clients stop waiting on them"""
+        conn = self._connect()
+        rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        orphaned = [row['id'] for row in rows if row['worker_pid'] == os.getpid() or not pid_alive(row['worker_pid'])]
+        for job_id in orphaned:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                (json.dumps({'error': 'Worker exited before the job finished'}), utc_now(), job_id)
+            )
+        if orphaned:
+            logger.warning(f"Failed {len(orphaned)} jobs left running by exited workers")
+        return len(orphaned)
+
+    def prune(self, max_age=JOB_RETENTION_SECONDS):
+        """Delete finished jobs that finished more than max_age seconds ago; returns how many"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=max_age)).isoformat()
+        return self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (*TERMINAL_STATUSES, cutoff)
+        ).rowcount
+
+
+def pid_alive(pid):
+    """Whether a process with this pid is running on this box"""
+    if not pid:
+        return False
+    if os.name == 'nt':
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Job queue backed by the JobStore table, drained by a small pool of
+    worker threads in each process.
+
+    Workers claim queued rows from the store, so a job submitted by one
+    process can run in any process that handles its kind, and jobs queued
+    by a process that exits are picked up by the others. Jobs left running
+    by an exited process are failed at startup. When max_pending jobs are
+    already queued on the box, submit() raises QueueFull so the view can
+    push back on the client.
+    """
+
+    def __init__(self, store, workers=2, max_pending=20, poll_interval=1.0, prune_interval=600):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+        self._handlers = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self.store.fail_orphaned()
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Start this process's workers if they are not running; submit() does this too"""
+        self._ensure_workers()
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, payload):
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind}")
+        self._ensure_workers()
+        job_id = self.store.create(kind, payload, max_pending=self.max_pending)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def pending(self):
+        return self.store.count_queued()
+
+    def _work(self):
+        while True:
+            try:
+                job = self.store.claim(list(self._handlers))
+            except sqlite3.Error as e:
+                logger.error(f"Could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                self._maybe_prune()
+                # Woken early by submit() in this process; other processes' jobs are found by polling
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run(job)
+
+    def _maybe_prune(self):
+        """Delete old finished jobs every prune_interval seconds, from whichever worker is idle"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune < self.prune_interval:
+                return
+            self._last_prune = now
+        try:
+            pruned = self.store.prune()
+        except sqlite3.Error as e:
+            logger.error(f"Could not prune finished jobs: {str(e)}")
+            return
+        if pruned:
+            logger.info(f"Pruned {pruned} finished jobs")
+
+    def _run(self, job):
+        job_id, kind = job['id'], job['kind']
+        try:
+            result = self._handlers[kind](job['payload'])
+            self.store.update(job_id, status='succeeded', result=result, finished_at=utc_now())
+        except JobError as e:
+            self.store.update(job_id, status='failed', error=e.detail, finished_at=utc_now())
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {str(e)}", exc_info=True)
+            self.store.update(job_id, status='failed', error={'error': str(e)}, finished_at=utc_now())
+
+
+def wants_async(request):
+    """Whether a DRF request asked for async processing (?async=true or an async form field)"""
+    value = request.query_params.get('async') or request.data.get('async', '')
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def iter_job_events(store, job_id, poll_interval=1.0, timeout=600):
+    """Server-sent events with the job state, until it finishes or timeout passes"""
+    deadline = time.monotonic() + timeout
+    last_status = None
+    while True:
+        job = store.get(job_id)
+        if job is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+            return
+        if job['status'] != last_status:
+            last_status = job['status']
+            yield f"data: {json.dumps(job, cls=DjangoJSONEncoder)}\n\n"
+        if job['status'] in TERMINAL_STATUSES or time.monotonic() > deadline:
+            return
+        time.sleep(poll_interval)
+
+
+job_store = JobStore(os.getenv('JOB_STORE_PATH', BASE_DIR / 'jobs.sqlite3'))
+job_queue = JobQueue(
+    job_store,
+    workers=int(os.getenv('JOB_WORKERS', '2')),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', '20')),
+)
@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_enabled():
+    """Whether heavy models should be loaded at startup (WARMUP_MODELS=true)"""
+    return os.getenv('WARMUP_MODELS', '').lower() in ('1', 'true', 'yes')
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where it cannot be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelCache:
+    """
+    Lazily loads heavy models once per worker process and shares them.
+
+    Loaders are registered by name at import time and only run on first
+    use (or during warm-up). Each name has its own lock, so loading Whisper
+    does not block a request that only needs PaddleOCR.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaders = {}
+        self._load_locks = {}
+        self._models = {}
+        self._info = {}
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._load_locks[name]:
+            if name in self._models:
+                return self._models[name]
+
+            rss_before = rss_bytes()
+            started = time.perf_counter()
+            model = self._loaders[name]()
+            load_seconds = time.perf_counter() - started
+            rss_after = rss_bytes()
+
+            self._info[name] = {
+                'loadedAt': datetime.now().isoformat(),
+                'loadTimeMs': round(load_seconds * 1000, 2),
+                'rssDeltaBytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            }
+            self._models[name] = model
+            logger.info(f"Loaded model {name} in {self._info[name]['loadTimeMs']} ms")
+            return model
+
+    def warm_up(self, names=None):
+        """Load the given (default: all registered) models, logging failures"""
+        for name in names or list(self._loaders):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Warm-up of {name} failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            registered = list(self._loaders)
+        return {
+            'processRssBytes': rss_bytes(),
+            'models': {
+                name: {'loaded': name in self._models, **self._info.get(name, {})}
+                for name in registered
+            }
+        }
+
+
+model_cache = ModelCache()
@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DATABASE_NAME = 'Techonovate'
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so utilisation can be reported"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open_connections = 0
+            self.in_use = 0
+            self.peak_in_use = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.connections_created = 0
+            self.pool_clears = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'openConnections': self.open_connections,
+                'inUse': self.in_use,
+                'peakInUse': self.peak_in_use,
+                'checkouts': self.checkouts,
+                'checkoutFailures': self.checkout_failures,
+                'connectionsCreated': self.connections_created,
+                'poolClears': self.pool_clears,
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+
+pool_metrics = PoolMetrics()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def client_options():
+    """Pool size and timeouts, configurable through the environment"""
+    return {
+        'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', '100')),
+        'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', '0')),
+        'maxIdleTimeMS': int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '300000')),
+        'waitQueueTimeoutMS': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+        'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '10000')),
+        'socketTimeoutMS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '30000')),
+    }
+
+
+def get_client():
+    """Return the process-wide pooled MongoClient, creating it on first use"""
+    global _client, _client_pid
+    # MongoClient is not fork-safe, so each worker process builds its own
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            pool_metrics.reset()
+            _client = MongoClient(
+                os.getenv('DATABASE_URL', 'mongodb://localhost:27017/'),
+                event_listeners=[pool_metrics],
+                **client_options()
+            )
+            _client_pid = os.getpid()
+            logger.info(f"Created MongoDB client with options {client_options()}")
+    return _client
+
+
+def get_database():
+    return get_client()[DATABASE_NAME]
+
+
+def get_collection(name):
+    return get_database()[name]
+
+
+def pool_stats():
+    """Connection pool utilisation for this worker process"""
+    stats = pool_metrics.snapshot()
+    max_pool_size = client_options()['maxPoolSize']
+    stats['maxPoolSize'] = max_pool_size
+    stats['utilisation'] = round(stats['inUse'] / max_pool_size, 4) if max_pool_size else None
+    stats['pid'] = os.getpid()
+    return stats
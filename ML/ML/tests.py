@@ -0,0 +1,153 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from .jobs import JobError, JobQueue, JobStore, QueueFull
+
+
+class JobStoreTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'jobs.sqlite3')
+        self.store = JobStore(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class JobStoreTests(JobStoreTestCase):
+    def test_only_one_worker_claims_a_job(self):
+        job_ids = {self.store.create('bill', {'n': i}) for i in range(20)}
+        claimed = []
+
+        def worker():
+            # Each thread has its own connection, like a worker in another process
+            while True:
+                job = self.store.claim(['bill'])
+                if job is None:
+                    return
+                claimed.append(job['id'])
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(claimed), sorted(job_ids))
+        self.assertEqual(self.store.count_queued(), 0)
+        self.assertEqual(self.store.get(claimed[0])['status'], 'running')
+
+    def test_claim_only_takes_handled_kinds(self):
+        self.store.create('transcribe', {})
+
+        self.assertIsNone(self.store.claim(['bill']))
+        self.assertIsNone(self.store.claim([]))
+        self.assertEqual(self.store.claim(['bill', 'transcribe'])['kind'], 'transcribe')
+
+    def test_orphaned_jobs_of_exited_workers_fail(self):
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        orphaned = self.store.create('bill', {})
+        self.store.update(orphaned, status='running', worker_pid=exited.pid)
+        queued = self.store.create('bill', {})
+
+        self.assertEqual(self.store.fail_orphaned(), 1)
+
+        job = self.store.get(orphaned)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], {'error': 'Worker exited before the job finished'})
+        self.assertEqual(self.store.get(queued)['status'], 'queued')
+
+    def test_prune_deletes_only_finished_jobs(self):
+        finished = self.store.create('bill', {})
+        self.store.update(finished, status='succeeded', finished_at='2000-01-01T00:00:00+00:00')
+        queued = self.store.create('bill', {})
+
+        self.assertEqual(self.store.prune(max_age=60), 1)
+
+        self.assertIsNone(self.store.get(finished))
+        self.assertIsNotNone(self.store.get(queued))
+
+
+class JobQueueTests(JobStoreTestCase):
+    def queue(self, **kwargs):
+        # No worker threads, so queued jobs stay queued until a test runs them
+        queue = JobQueue(self.store, workers=0, **kwargs)
+        queue.register('ok', lambda payload: {'doubled': payload['n'] * 2})
+        queue.register('job_error', self.raise_job_error)
+        queue.register('crash', lambda payload: 1 / 0)
+        return queue
+
+    @staticmethod
+    def raise_job_error(payload):
+        raise JobError({'error': 'No text found', 'page': payload['page']})
+
+    def run_next(self, queue):
+        job = self.store.claim(['ok', 'job_error', 'crash'])
+        queue._run(job)
+        return self.store.get(job['id'])
+
+    def test_submit_raises_queue_full_at_max_pending(self):
+        queue = self.queue(max_pending=2)
+        queue.submit('ok', {'n': 1})
+        queue.submit('ok', {'n': 2})
+
+        with self.assertRaises(QueueFull):
+            queue.submit('ok', {'n': 3})
+        self.assertEqual(queue.pending(), 2)
+
+    def test_concurrent_submits_do_not_overshoot_max_pending(self):
+        queue = self.queue(max_pending=5)
+        rejected = []
+
+        def submit():
+            try:
+                queue.submit('ok', {'n': 1})
+            except QueueFull:
+                rejected.append(True)
+
+        threads = [threading.Thread(target=submit) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(queue.pending(), 5)
+        self.assertEqual(len(rejected), 7)
+
+    def test_unknown_kind_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.queue().submit('unknown', {})
+
+    def test_handler_result_is_stored(self):
+        queue = self.queue()
+        queue.submit('ok', {'n': 21})
+
+        job = self.run_next(queue)
+
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result'], {'doubled': 42})
+        self.assertIsNotNone(job['finished_at'])
+
+    def test_job_error_detail_is_stored(self):
+        queue = self.queue()
+        queue.submit('job_error', {'page': 3})
+
+        job = self.run_next(queue)
+
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], {'error': 'No text found', 'page': 3})
+
+    def test_handler_exception_fails_the_job(self):
+        queue = self.queue()
+        queue.submit('crash', {})
+
+        job = self.run_next(queue)
+
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], {'error': 'division by zero'})
@@ -17,11 +17,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path,include
 
+from . import views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/',include('audioprocessing.urls')),
     path('api/',include('calculator.urls')),
     path('api/',include('webscraping.urls')),
     path('api/',include('OCR.urls')),
+    path('api/db-status/', views.db_status, name='db-status'),
+    path('api/model-cache-status/', views.model_cache_status, name='model-cache-status'),
+    path('api/jobs/<str:job_id>/', views.job_status, name='job-status'),
 ]
 
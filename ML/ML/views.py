@@ -0,0 +1,39 @@
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+
+from .jobs import iter_job_events, job_queue, job_store
+from .model_cache import model_cache
+from .mongo import pool_stats
+
+
+@require_http_methods(["GET"])
+def db_status(request):
+    """Report MongoDB connection pool utilisation for this worker"""
+    return JsonResponse(pool_stats())
+
+
+@require_http_methods(["GET"])
+def model_cache_status(request):
+    """Report which heavy models this worker has loaded, with load time and memory"""
+    return JsonResponse(model_cache.stats())
+
+
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """
+    Status and result of an async upload job.
+
+    Poll it, or pass ?stream=1 to receive server-sent events until the job finishes.
+    """
+    # Jobs queued by a worker process that has since exited run in whichever process is polled
+    job_queue.start()
+    if request.GET.get('stream') in ('1', 'true'):
+        response = StreamingHttpResponse(iter_job_events(job_store, job_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    job = job_store.get(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Job not found', 'job_id': job_id}, status=404)
+    job['queue_pending'] = job_queue.pending()
+    return JsonResponse(job)
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
 
+from ML.model_cache import model_cache, warmup_enabled
+
 
 class OcrConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'OCR'
+
+    def ready(self):
+        # Optionally load PaddleOCR at startup instead of on the first upload
+        if warmup_enabled():
+            from . import views  # noqa: F401 registers the loaders
+            model_cache.warm_up(['paddleocr'])
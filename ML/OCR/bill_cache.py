@@ -0,0 +1,170 @@
+import datetime
+import hashlib
+import logging
+import os
+import threading
+from collections import Counter
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from ML.mongo import get_collection, get_database
+
+logger = logging.getLogger(__name__)
+
+CACHE_COLLECTION = 'bill_cache'
+
+# Bump when OCR or extraction/analysis changes, so stale cached stages are ignored
+OCR_STAGE_VERSION = 'ocr-1'
+BILL_PIPELINE_VERSION = 'bill-4'
+
+BILL_CACHE_ENABLED = os.getenv('BILL_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+BILL_CACHE_TTL_SECONDS = int(os.getenv('BILL_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+BILL_CACHE_MAX_ENTRIES = int(os.getenv('BILL_CACHE_MAX_ENTRIES', '10000'))
+# Size-based eviction runs after this many writes rather than on every one
+BILL_CACHE_EVICT_EVERY = int(os.getenv('BILL_CACHE_EVICT_EVERY', '50'))
+
+
+class HashingWriter:
+    """Wraps a file, hashing everything written to it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, chunk):
+        self.sha256.update(chunk)
+        return self.f.write(chunk)
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+class BillCache:
+    """
+    Content-addressed cache of bill pipeline stages in MongoDB.
+
+    Entries are keyed on the sha256 of the uploaded bytes, the stage name
+    ('text' for OCR output, 'analysis' for extraction, carbon impact and the
+    LLM analysis) and that stage's version. Entries expire BILL_CACHE_TTL_SECONDS
+    after their last use, and the least recently used are evicted once the
+    collection grows past BILL_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, enabled=BILL_CACHE_ENABLED, ttl_seconds=BILL_CACHE_TTL_SECONDS,
+                 max_entries=BILL_CACHE_MAX_ENTRIES, evict_every=BILL_CACHE_EVICT_EVERY):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._indexes_ready = False
+        self._writes = 0
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+
+    @staticmethod
+    def key(stage, version, sha256):
+        return f"{stage}:{version}:{sha256}"
+
+    def _collection(self):
+        collection = get_collection(CACHE_COLLECTION)
+        if not self._indexes_ready:
+            with self._lock:
+                if not self._indexes_ready:
+                    try:
+                        collection.create_index([('last_used_at', ASCENDING)], name='last_used_ttl',
+                                                expireAfterSeconds=self.ttl_seconds)
+                    except OperationFailure:
+                        # The TTL changed since the index was built
+                        get_database().command('collMod', CACHE_COLLECTION, index={
+                            'name': 'last_used_ttl', 'expireAfterSeconds': self.ttl_seconds
+                        })
+                    self._indexes_ready = True
+        return collection
+
+    def get(self, stage, version, sha256):
+        """Cached value for a stage, or None. Failures count as misses."""
+        if not self.enabled or not sha256:
+            return None
+        try:
+            entry = self._collection().find_one_and_update(
+                {'_id': self.key(stage, version, sha256)},
+                {'$set': {'last_used_at': datetime.datetime.utcnow()}, '$inc': {'hits': 1}},
+                projection={'value': 1}
+            )
+        except Exception as e:
+            logger.error(f"Bill cache lookup failed: {str(e)}")
+            entry = None
+        with self._lock:
+            (self.hits if entry else self.misses)[stage] += 1
+        return entry['value'] if entry else None
+
+    def set(self, stage, version, sha256, value):
+        if not self.enabled or not sha256:
+            return
+        now = datetime.datetime.utcnow()
+        try:
+            self._collection().insert_one({
+                '_id': self.key(stage, version, sha256),
+                'stage': stage,
+                'version': version,
+                'sha256': sha256,
+                'value': value,
+                'hits': 0,
+                'created_at': now,
+                'last_used_at': now,
+            })
+        except DuplicateKeyError:
+            # A concurrent upload of the same bill stored it first
+            return
+        except Exception as e:
+            logger.error(f"Bill cache write failed: {str(e)}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries beyond max_entries"""
+        try:
+            collection = self._collection()
+            excess = collection.estimated_document_count() - self.max_entries
+            if excess <= 0:
+                return 0
+            stale = [entry['_id'] for entry in
+                     collection.find({}, {'_id': 1}).sort('last_used_at', ASCENDING).limit(excess)]
+            deleted = collection.delete_many({'_id': {'$in': stale}}).deleted_count
+        except Exception as e:
+            logger.error(f"Bill cache eviction failed: {str(e)}")
+            return 0
+        with self._lock:
+            self.evictions += deleted
+        logger.info(f"Evicted {deleted} bill cache entries")
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            stages = set(self.hits) | set(self.misses)
+            return {
+                'enabled': self.enabled,
+                'pid': os.getpid(),
+                'ttlSeconds': self.ttl_seconds,
+                'maxEntries': self.max_entries,
+                'evictions': self.evictions,
+                'stages': {
+                    stage: {
+                        'hits': self.hits[stage],
+                        'misses': self.misses[stage],
+                        'hitRate': round(self.hits[stage] / (self.hits[stage] + self.misses[stage]), 4),
+                    }
+                    for stage in sorted(stages)
+                }
+            }
+
+
+bill_cache = BillCache()
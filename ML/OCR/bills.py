@@ -0,0 +1,114 @@
+import base64
+import datetime
+import threading
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from ML.mongo import get_collection
+
+BILLS_COLLECTION = 'carbon_footprint_bills'
+
+# Keyset list windows leave out the raw OCR text and the LLM analysis text unless fields=full
+SUMMARY_PROJECTION = {
+    'extracted_text': 0,
+    'analysis.analysis': 0,
+}
+
+# Filtered estimated counts stop counting here and report a lower bound
+ESTIMATED_COUNT_CAP = 10000
+
+NEWEST_FIRST = [('created_at', DESCENDING), ('_id', DESCENDING)]
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+
+def get_bills_collection():
+    """Return the bills collection, creating its listing indexes once per process"""
+    global _indexes_ready
+    collection = get_collection(BILLS_COLLECTION)
+    if not _indexes_ready:
+        with _indexes_lock:
+            if not _indexes_ready:
+                collection.create_index([('user', ASCENDING), *NEWEST_FIRST], name='user_created_at')
+                collection.create_index([('utility_types', ASCENDING), *NEWEST_FIRST], name='utility_created_at')
+                collection.create_index(NEWEST_FIRST, name='created_at')
+                _indexes_ready = True
+    return collection
+
+
+def encode_cursor(bill):
+    raw = f"{bill['created_at'].isoformat()}|{bill['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    created_at, bill_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+    return datetime.datetime.fromisoformat(created_at), ObjectId(bill_id)
+
+
+def parse_date(value):
+    """ISO date or datetime from a query parameter"""
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def build_bill_filter(user=None, utility=None, created_from=None, created_to=None):
+    """Mongo filter for the listing; created_to is exclusive"""
+    query = {}
+    if user:
+        query['user'] = user
+    if utility:
+        query['utility_types'] = utility
+    if created_from or created_to:
+        query['created_at'] = {}
+        if created_from:
+            query['created_at']['$gte'] = created_from
+        if created_to:
+            query['created_at']['$lt'] = created_to
+    return query
+
+
+def count_bills(collection, query, mode):
+    """
+    Count for the listing: 'exact' counts matching documents, 'estimated'
+    uses collection metadata when unfiltered and a capped count otherwise.
+    Returns (count, is_lower_bound), or (None, False) for mode 'none'.
+    """
+    if mode == 'exact':
+        return collection.count_documents(query), False
+    if mode == 'estimated':
+        if not query:
+            return collection.estimated_document_count(), False
+        count = collection.count_documents(query, limit=ESTIMATED_COUNT_CAP)
+        return count, count >= ESTIMATED_COUNT_CAP
+    return None, False
+
+
+def serialise_bill(bill):
+    bill['_id'] = str(bill['_id'])
+    return bill
+
+
+def fetch_bills(query, limit=10, cursor=None, full=False):
+    """
+    Return one window of bills matching query, newest first, plus the cursor
+    for the next (older) window. Seeks on the (created_at, _id) keys of the
+    listing indexes, so deep windows cost the same as the first.
+    """
+    query = dict(query)
+    if cursor:
+        created_at, bill_id = decode_cursor(cursor)
+        query['$and'] = query.get('$and', []) + [{'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': bill_id}},
+        ]}]
+
+    bills = list(
+        get_bills_collection()
+        .find(query, None if full else SUMMARY_PROJECTION)
+        .sort(NEWEST_FIRST)
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(bills[limit - 1]) if len(bills) > limit else None
+    return [serialise_bill(bill) for bill in bills[:limit]], next_cursor
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+from bisect import bisect_right
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FACTORS_PATH = Path(__file__).resolve().parent / 'emission_factors.json'
+
+
+def normalise_unit(unit):
+    return ' '.join(unit.lower().split()) if unit else None
+
+
+class EmissionFactorTable:
+    """
+    Versioned emission factors per region and year, with unit conversions
+    to the unit each factor is expressed in.
+
+    A bill uses the factors of the latest year not after the bill's year
+    (or the earliest year on record for older bills).
+    """
+
+    def __init__(self, data, default_region=None):
+        self.version = data['version']
+        self.unit = data.get('unit', 'kg CO2e')
+        self.default_region = default_region or data['default_region']
+        self.factors = {
+            region: {int(year): factors for year, factors in years.items()}
+            for region, years in data['factors'].items()
+        }
+        self.years = {region: sorted(years) for region, years in self.factors.items()}
+        self.unit_conversions = data.get('unit_conversions', {})
+
+    @classmethod
+    def load(cls, path, default_region=None):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), default_region)
+
+    def resolve(self, region=None, year=None):
+        """(region, year, factors by utility) for a bill"""
+        region = region if region in self.factors else self.default_region
+        years = self.years[region]
+        if year is None:
+            chosen = years[-1]
+        else:
+            chosen = years[max(bisect_right(years, year) - 1, 0)]
+        return region, chosen, self.factors[region][chosen]
+
+    def compute(self, line_items, region=None, year=None):
+        """
+        Emissions for every line item in one vectorised pass. Line items are
+        dicts with utility_type, consumption and (optionally) the billed unit;
+        ones without a known utility or consumption are returned as skipped.
+        """
+        region, year, factors = self.resolve(region, year)
+        items, skipped = [], []
+        for item in line_items:
+            if item.get('utility_type') in factors and item.get('consumption') is not None:
+                items.append(item)
+            else:
+                skipped.append(item)
+
+        consumption = np.array([item['consumption'] for item in items], dtype=np.float64)
+        multiplier = np.ones(len(items), dtype=np.float64)
+        factor = np.array([factors[item['utility_type']]['factor'] for item in items], dtype=np.float64)
+        for i, item in enumerate(items):
+            conversion = self.unit_conversions.get(normalise_unit(item.get('unit')))
+            # Unknown or missing units are taken to already be in the factor's unit
+            if conversion and conversion['to'] == factors[item['utility_type']]['unit']:
+                multiplier[i] = conversion['multiplier']
+
+        normalised = consumption * multiplier
+        emissions = normalised * factor
+        total = float(emissions.sum())
+        shares = emissions / total if total else np.zeros_like(emissions)
+
+        breakdown = [
+            {
+                'utility_type': item['utility_type'],
+                'consumption': item['consumption'],
+                'billed_unit': item.get('unit'),
+                'normalised_consumption': float(normalised[i]),
+                'normalised_unit': factors[item['utility_type']]['unit'],
+                'emission_factor': float(factor[i]),
+                'carbon_emissions': float(emissions[i]),
+                'share': round(float(shares[i]), 4),
+            }
+            for i, item in enumerate(items)
+        ]
+        return {
+            'carbon_emissions': total,
+            'unit': self.unit,
+            'breakdown': breakdown,
+            'skipped': skipped,
+            'emission_factors': {'version': self.version, 'region': region, 'year': year},
+        }
+
+
+emission_factor_table = EmissionFactorTable.load(
+    os.getenv('EMISSION_FACTORS_PATH', DEFAULT_FACTORS_PATH),
+    default_region=os.getenv('EMISSION_FACTOR_REGION')
+)
@@ -0,0 +1,323 @@
+import datetime
+import re
+from collections import defaultdict, namedtuple
+from operator import itemgetter
+
+FIELDS = ('amount', 'date', 'consumption')
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+_MONTH = r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+_NUMBER = r'\d+(?:,\d+)*(?:\.\d+)?'
+
+# Consumption units: (pattern, utility, weight). Water and gas units are
+# slightly less trusted than electricity ones, which bills state most often.
+CONSUMPTION_UNITS = [
+    (r'kwh|units?', 'electricity', 1.0),
+    (r'kl|kilolit(?:re|er)s?|lit(?:re|er)s?', 'water', 0.9),
+    (r'mmbtu|cubic\s*met(?:re|er)s?|scm', 'gas', 0.9),
+]
+_UNIT = '|'.join(pattern for pattern, _, _ in CONSUMPTION_UNITS)
+
+# Declarative field rules: every pattern is compiled into one regex at import
+# time. Named groups carry the parts each parser needs. 'starts' is the class of
+# characters a match can begin with; the scanner checks it before trying the
+# rule, which is much cheaper than failing inside the pattern at every word.
+FIELD_RULES = [
+    {'field': 'amount', 'parse': 'number', 'score': 1.0, 'starts': '[ri₹]',
+     'pattern': rf'(?:\b(?:rs\.?|inr)|₹)\s*(?P<value>{_NUMBER})'},
+    {'field': 'date', 'parse': 'numeric_date', 'score': 1.0, 'starts': r'\d',
+     'pattern': r'\b(?P<first>\d{1,2})[-/.](?P<second>\d{1,2})[-/.](?P<year>\d{4}|\d{2})\b'},
+    {'field': 'date', 'parse': 'named_date', 'score': 1.0, 'starts': r'\d',
+     'pattern': rf'\b(?P<day>\d{{1,2}})(?:st|nd|rd|th)?[\s-]*(?P<month>{_MONTH})[\s,-]*(?P<year>\d{{4}}|\d{{2}})\b'},
+    {'field': 'date', 'parse': 'named_date', 'score': 1.0, 'starts': '[adfjmnos]',
+     'pattern': rf'\b(?P<month>{_MONTH})\s*(?P<day>\d{{1,2}})(?:st|nd|rd|th)?,?\s*(?P<year>\d{{4}})\b'},
+    {'field': 'consumption', 'parse': 'number', 'units': CONSUMPTION_UNITS, 'score': 1.0, 'starts': r'\d',
+     'pattern': rf'(?P<value>{_NUMBER})\s*(?P<unit>{_UNIT})\b(?!(?:\s+consumed)?\s*[:=-]?\s*\d)'},
+    # 'Units: 198' or 'Net units consumed 240' style, only trusted for electricity. The
+    # label is matched here rather than as a cue so the cue group cannot swallow
+    # the unit word; it still scores as a cue. A value followed by its own unit
+    # is left to the rule above, and that rule in turn leaves a unit word
+    # followed by a number ('Reading 8318 Units consumed: 198') to this one.
+    {'field': 'consumption', 'parse': 'number', 'units': CONSUMPTION_UNITS[:1], 'score': 0.8, 'starts': '[bkntu]',
+     'pattern': rf'\b(?P<label>(?:(?:total|net|billed)\s+)?(?P<unit>{CONSUMPTION_UNITS[0][0]})(?:\s+consumed)?)'
+                rf'\s*[:=-]?\s*(?P<value>{_NUMBER})\b(?!,?\d|\.\d|\s*(?:{_UNIT})\b)'},
+]
+
+# Words shortly before a candidate that make it more (or less) likely to be the
+# field. A cue's weight fades linearly over the context window.
+CONTEXT_CUES = {
+    'amount': {
+        'amount payable': 3, 'payable': 2, 'amount due': 3, 'total due': 3, 'net amount': 2,
+        'bill amount': 2, 'total': 1, 'arrears': -2, 'previous': -2, 'last paid': -2,
+        'paid': -1, 'rebate': -2, 'subsidy': -2, 'late fee': -2, 'after due date': -2,
+    },
+    'date': {
+        'bill date': 3, 'billing date': 3, 'invoice date': 3, 'date of issue': 3, 'issue date': 3,
+        'date': 1, 'due date': -1, 'pay by': -1, 'last date': -1, 'reading date': -1, 'previous': -1,
+    },
+    'consumption': {
+        'units consumed': 3, 'consumed': 3, 'consumption': 3, 'total units': 3, 'billed units': 3, 'net units': 3,
+        'usage': 2, 'previous': -2, 'reading': -1, 'average': -1, 'last year': -2,
+    },
+}
+
+# Consumption of a second utility is only itemised when it scores at least this,
+# i.e. its cues are not mostly negative (previous month, readings, averages)
+MIN_LINE_ITEM_SCORE = 0.3
+
+Candidate = namedtuple('Candidate', ['field', 'value', 'score', 'start', 'utility', 'unit'])
+
+
+def normalise_year(year):
+    year = int(year)
+    if year < 100:
+        year += 2000 if year < 70 else 1900
+    return year
+
+
+def make_date(year, month, day):
+    """datetime for a plausible bill date, or None"""
+    if not 1990 <= year <= 2100:
+        return None
+    try:
+        return datetime.datetime(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_numeric_date(first, second, year, day_first=True):
+    """
+    Normalise DD/MM/YY(YY), DD-MM-YYYY or DD.MM.YYYY. When one part cannot be
+    a month the order is unambiguous, otherwise day_first decides.
+    """
+    first, second, year = int(first), int(second), normalise_year(year)
+    if first > 12 >= second:
+        day, month = first, second
+    elif second > 12 >= first:
+        day, month = second, first
+    elif day_first:
+        day, month = first, second
+    else:
+        day, month = second, first
+    return make_date(year, month, day)
+
+
+def parse_named_date(day, month, year):
+    """Normalise '5 Mar 2024', '05-march-24' or 'March 5, 2024'"""
+    return make_date(normalise_year(year), MONTHS[month[:3]], int(day))
+
+
+class CueTable(dict):
+    """phrase -> [(field, weight)]; phrases matched across other whitespace are normalised on lookup"""
+
+    def __missing__(self, phrase):
+        return self.get(' '.join(phrase.split()), ())
+
+
+class UnitTable(dict):
+    """Matched unit text -> (utility, weight), filled in as unit spellings are seen"""
+
+    def __init__(self, units):
+        super().__init__()
+        self.units = [(re.compile(pattern), utility, weight) for pattern, utility, weight in units]
+
+    def __missing__(self, unit):
+        found = next(
+            ((utility, weight) for unit_pattern, utility, weight in self.units if unit_pattern.fullmatch(unit)),
+            (None, 1.0)
+        )
+        self[unit] = found
+        return found
+
+
+class BillFieldExtractor:
+    """
+    Extracts amount, date and consumption from bill text in a single scan.
+
+    Field rules and context cues are compiled into one alternation, so one
+    pass over the text finds every candidate value and every cue. All cue
+    phrases share one group and are looked up by the text they matched. Each
+    candidate is scored by its rule, the nearby cues before it and its
+    position (earlier wins ties), and the best one per field is kept.
+    """
+
+    def __init__(self, rules=FIELD_RULES, cues=CONTEXT_CUES, context_chars=60, day_first=True):
+        self.context_chars = context_chars
+        self.day_first = day_first
+
+        # phrase -> [(field, weight)]; longest first so 'amount payable' wins over 'payable'
+        self.cue_weights = CueTable()
+        for field, weights in cues.items():
+            for phrase, weight in weights.items():
+                self.cue_weights.setdefault(' '.join(phrase.split()), []).append((field, weight))
+
+        # Group name -> (field, score, parser, unit group, unit table, label group), resolved once here
+        self.rules = {}
+        # Start guard -> alternatives; rules sharing a guard are tried behind a single lookahead
+        alternatives = {}
+        for i, rule in enumerate(rules):
+            name = f'r{i}'
+            pattern = re.sub(r'\(\?P<(\w+)>', rf'(?P<{name}_\1>', rule['pattern'])
+            alternatives.setdefault(rule.get('starts'), []).append(f'(?P<{name}>{pattern})')
+            groups = set(re.findall(r'\(\?P<(\w+)>', rule['pattern']))
+            self.rules[name] = (
+                rule['field'],
+                rule.get('score', 1.0),
+                self._parser(rule['parse'], {part: f'{name}_{part}' for part in groups}),
+                f'{name}_unit' if 'unit' in groups else None,
+                UnitTable(rule.get('units', [])),
+                f'{name}_label' if 'label' in groups else None,
+            )
+
+        phrases = sorted(self.cue_weights, key=len, reverse=True)
+        alternatives.setdefault('[%s]' % re.escape(''.join(sorted({phrase[0] for phrase in phrases}))), []).append(
+            r'(?P<cue>\b(?:%s)\b)' % '|'.join(r'\s+'.join(re.escape(word) for word in phrase.split()) for phrase in phrases)
+        )
+
+        # Every alternative starts a word, so a match begins with the character
+        # before it (_score() pads the text with a leading space). Starting with a
+        # character class lets the regex engine skip through words in C instead
+        # of trying every alternative at each position.
+        self.pattern = re.compile(r'[^a-z\d](?:%s)' % '|'.join(
+            ('(?=%s)(?:%s)' % (starts, '|'.join(group)) if starts else '|'.join(group))
+            for starts, group in alternatives.items()
+        ))
+
+    def _parser(self, kind, group_names):
+        """match -> parsed value, for one rule's renamed groups"""
+        if kind == 'number':
+            value = group_names['value']
+            return lambda match: float(match[value].replace(',', ''))
+        if kind == 'numeric_date':
+            first, second, year = group_names['first'], group_names['second'], group_names['year']
+            return lambda match: parse_numeric_date(match[first], match[second], match[year], self.day_first)
+        if kind == 'named_date':
+            day, month, year = group_names['day'], group_names['month'], group_names['year']
+            return lambda match: parse_named_date(match[day], match[month], match[year])
+        raise ValueError(f"Unknown parser {kind}")
+
+    def _score(self, text):
+        """
+        Scored candidates per field, in text order, as (score, start, parse,
+        match, utility, unit). Values are parsed later, and only for the
+        candidates that are kept.
+        """
+        # Padded so a match can start at the first word; positions below are in text
+        text_lower = ' ' + text.lower()
+        position_weight = 0.5 / max(len(text), 1)
+        context_chars = self.context_chars
+        rules = self.rules
+        cue_weights = self.cue_weights
+        candidates = defaultdict(list)
+        recent_cues = defaultdict(list)
+
+        for match in self.pattern.finditer(text_lower):
+            name = match.lastgroup
+            if name == 'cue':
+                end = match.end() - 1
+                for field, weight in cue_weights[match[name]]:
+                    recent_cues[field].append((end, weight))
+                continue
+
+            field, score, parse, unit_group, utilities, label_group = rules[name]
+            start = match.start()
+            if label_group is not None:
+                # A label such as 'units consumed' counts as a cue right at the value
+                for cue_field, weight in cue_weights[match[label_group]]:
+                    recent_cues[cue_field].append((start, weight))
+
+            unit = match[unit_group] if unit_group else None
+            if unit:
+                utility, unit_weight = utilities[unit]
+                score *= unit_weight
+            else:
+                utility = None
+
+            # The strongest positive and strongest negative cue count, so a
+            # run of repeated cue words does not outweigh a closer one
+            positive = negative = 0.0
+            for end, weight in reversed(recent_cues[field]):
+                distance = start - end
+                if distance >= context_chars:
+                    break
+                weight *= 1 - distance / context_chars
+                if weight > positive:
+                    positive = weight
+                elif weight < negative:
+                    negative = weight
+            score += positive + negative - position_weight * start
+            candidates[field].append((score, start, parse, match, utility, unit))
+        return candidates
+
+    @staticmethod
+    def _best(scored):
+        """(entry, value) of the highest scoring candidate whose value parses (earliest on ties)"""
+        if scored:
+            # The top candidate nearly always parses, so only sort when it does not
+            entry = max(scored, key=itemgetter(0))
+            value = entry[2](entry[3])
+            if value is not None:
+                return entry, value
+            for entry in sorted(scored, key=itemgetter(0), reverse=True):
+                value = entry[2](entry[3])
+                if value is not None:
+                    return entry, value
+        return None, None
+
+    def scan(self, text):
+        """All scored candidates per field, in text order"""
+        scored = self._score(text)
+        return {
+            field: [
+                Candidate(field, value, score, start, utility, unit)
+                for score, start, parse, match, utility, unit in scored[field]
+                for value in (parse(match),) if value is not None
+            ]
+            for field in FIELDS
+        }
+
+    def line_items(self, consumption_scored, best=None):
+        """
+        One consumption line item per utility on the bill: the best candidate
+        of each utility whose cues are not net negative, plus the overall
+        best. Returned in text order.
+        """
+        overall, value = best or self._best(consumption_scored)
+        if overall is None:
+            return []
+        by_utility = {}
+        for entry in consumption_scored:
+            if entry[4] != overall[4]:
+                by_utility.setdefault(entry[4], []).append(entry)
+        chosen = [(overall, value)]
+        for scored in by_utility.values():
+            entry, value = self._best(scored)
+            if entry is not None and entry[0] >= MIN_LINE_ITEM_SCORE:
+                chosen.append((entry, value))
+        if len(chosen) > 1:
+            chosen.sort(key=lambda item: item[0][1])
+        return [{'utility_type': entry[4], 'consumption': value, 'unit': entry[5]} for entry, value in chosen]
+
+    def extract(self, text):
+        """Best value per field as a bill_info dict, or None when nothing was found"""
+        scored = self._score(text)
+        amount = self._best(scored['amount'])[1]
+        date = self._best(scored['date'])[1]
+        consumption = self._best(scored['consumption'])
+
+        bill_info = {
+            'amount': amount,
+            'date': date,
+            'consumption': consumption[1],
+            'utility_type': consumption[0][4] if consumption[0] else None,
+        }
+        if not any(bill_info.values()):
+            return None
+        bill_info['line_items'] = self.line_items(scored['consumption'], consumption)
+        return bill_info
+
+
+bill_extractor = BillFieldExtractor()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from OCR.bills import get_bills_collection
+
+
+class Command(BaseCommand):
+    help = 'Add the created_at, user and utility_types listing fields to bills stored before they existed'
+
+    def handle(self, *args, **options):
+        result = get_bills_collection().update_many(
+            {'created_at': {'$exists': False}},
+            [{'$set': {
+                'created_at': '$uploaded_at',
+                'user': {'$ifNull': ['$user', None]},
+                'utility_types': {'$ifNull': [
+                    '$analysis.environmental_impact.breakdown.utility_type',
+                    {'$cond': [
+                        {'$ifNull': ['$analysis.bill_summary.utility_type', False]},
+                        ['$analysis.bill_summary.utility_type'],
+                        []
+                    ]}
+                ]},
+                'carbon_emissions': '$analysis.environmental_impact.carbon_emissions',
+            }}]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {result.modified_count} bills"))
@@ -0,0 +1,126 @@
+import datetime
+import json
+import re
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from OCR.extraction import bill_extractor
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / 'fixtures' / 'bill_texts.json'
+BENCHMARK_FIELDS = ('amount', 'date', 'consumption', 'utility_type')
+
+
+def legacy_extract(text):
+    """The previous per-call regex extraction, kept as the benchmark baseline"""
+    bill_info = {'amount': None, 'date': None, 'consumption': None, 'utility_type': None}
+    text_lower = text.lower()
+
+    amount_matches = re.findall(r'(?:rs\.?|inr|₹)\s*(\d+(?:,\d+)*(?:\.\d{2})?)', text_lower)
+    if amount_matches:
+        bill_info['amount'] = float(amount_matches[0].replace(',', ''))
+
+    date_patterns = [
+        r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}',
+        r'\d{1,2}\s(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s?\d{2,4}'
+    ]
+    for pattern in date_patterns:
+        date_matches = re.findall(pattern, text_lower)
+        if date_matches:
+            try:
+                bill_info['date'] = datetime.datetime.strptime(date_matches[0], '%d/%m/%Y')
+                break
+            except ValueError:
+                continue
+
+    consumption_patterns = {
+        'electricity': r'(\d+(?:\.\d+)?)\s*(?:kwh|units)',
+        'water': r'(\d+(?:\.\d+)?)\s*(?:kl|kilolitres|litres)',
+        'gas': r'(\d+(?:\.\d+)?)\s*(?:mmbtu|cubic\s*meters|scm)'
+    }
+    for utility, pattern in consumption_patterns.items():
+        consumption_matches = re.findall(pattern, text_lower)
+        if consumption_matches:
+            bill_info['consumption'] = float(consumption_matches[0])
+            bill_info['utility_type'] = utility
+            break
+
+    return bill_info if any(bill_info.values()) else None
+
+
+def comparable(bill_info):
+    if bill_info is None:
+        return None
+    return {
+        field: bill_info[field].strftime('%Y-%m-%d') if isinstance(bill_info[field], datetime.datetime)
+        else bill_info[field]
+        for field in BENCHMARK_FIELDS
+    }
+
+
+def line_item_pairs(bill_info):
+    """(utility_type, consumption) per line item; the legacy extractor only ever finds one"""
+    if bill_info is None:
+        return []
+    if 'line_items' not in bill_info:
+        return [(bill_info['utility_type'], bill_info['consumption'])] if bill_info['consumption'] is not None else []
+    return [(item['utility_type'], item['consumption']) for item in bill_info['line_items']]
+
+
+class Command(BaseCommand):
+    help = 'Measure accuracy and throughput of bill field extraction over a corpus of bill texts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=str(DEFAULT_CORPUS), help='JSON list of {name, text, expected}')
+        parser.add_argument('--iterations', type=int, default=200, help='Passes over the corpus for timing')
+        parser.add_argument('--verbose', action='store_true', help='Print every mismatching field')
+
+    def handle(self, *args, **options):
+        with open(options['corpus'], encoding='utf-8') as f:
+            corpus = json.load(f)
+
+        for label, extract in (('legacy', legacy_extract), ('compiled', bill_extractor.extract)):
+            correct = {field: 0 for field in BENCHMARK_FIELDS}
+            documents_correct = 0
+            line_item_samples = line_items_correct = 0
+            for sample in corpus:
+                expected = sample['expected']
+                bill_info = extract(sample['text'])
+                if 'expected_line_items' in sample:
+                    line_item_samples += 1
+                    line_items_correct += line_item_pairs(bill_info) == [
+                        (item['utility_type'], item['consumption']) for item in sample['expected_line_items']
+                    ]
+                actual = comparable(bill_info)
+                if expected is None or actual is None:
+                    hit = expected == actual
+                    documents_correct += hit
+                    for field in BENCHMARK_FIELDS:
+                        correct[field] += hit
+                    continue
+                all_fields = True
+                for field in BENCHMARK_FIELDS:
+                    if actual[field] == expected[field]:
+                        correct[field] += 1
+                    else:
+                        all_fields = False
+                        if options['verbose']:
+                            self.stdout.write(f"  {label} {sample['name']}.{field}: "
+                                              f"expected {expected[field]!r}, got {actual[field]!r}")
+                documents_correct += all_fields
+
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                for sample in corpus:
+                    extract(sample['text'])
+            elapsed = time.perf_counter() - started
+            texts = options['iterations'] * len(corpus)
+
+            accuracy = ', '.join(f"{field} {correct[field] / len(corpus):.0%}" for field in BENCHMARK_FIELDS)
+            if line_item_samples:
+                accuracy += f", line items {line_items_correct}/{line_item_samples}"
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {documents_correct}/{len(corpus)} bills fully correct ({accuracy}); "
+                f"{texts / elapsed:,.0f} texts/s, {elapsed / texts * 1e6:.1f} us/text"
+            ))
@@ -1,3 +1,212 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import mongomock
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory
+
+from .bills import build_bill_filter, decode_cursor, fetch_bills
+from .emission_factors import EmissionFactorTable, emission_factor_table
+from .extraction import bill_extractor
+from .views import CarbonFootprintViews
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+
+class BillExtractionTests(SimpleTestCase):
+    """Runs the extractor over the saved OCR texts in fixtures/bill_texts.json"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cases = json.loads((FIXTURES_DIR / 'bill_texts.json').read_text(encoding='utf-8'))
+
+    def test_fixture_bills(self):
+        for case in self.cases:
+            with self.subTest(case['name']):
+                bill_info = bill_extractor.extract(case['text'])
+                expected = case['expected']
+                if expected is None:
+                    self.assertIsNone(bill_info)
+                    continue
+                self.assertEqual(bill_info['amount'], expected['amount'])
+                self.assertEqual(bill_info['date'], datetime.datetime.strptime(expected['date'], '%Y-%m-%d'))
+                self.assertEqual(bill_info['consumption'], expected['consumption'])
+                self.assertEqual(bill_info['utility_type'], expected['utility_type'])
+
+    def test_fixture_line_items(self):
+        for case in self.cases:
+            if case['expected'] is None:
+                continue
+            with self.subTest(case['name']):
+                line_items = bill_extractor.extract(case['text'])['line_items']
+                # Single-utility bills have one line item, the bill's own consumption
+                expected = case.get('expected_line_items') or [
+                    {'utility_type': case['expected']['utility_type'], 'consumption': case['expected']['consumption']}
+                ]
+                self.assertEqual(
+                    [{'utility_type': item['utility_type'], 'consumption': item['consumption']} for item in line_items],
+                    expected
+                )
+
+
+class EmissionFactorTableTests(SimpleTestCase):
+    def setUp(self):
+        self.table = EmissionFactorTable({
+            'version': 'test',
+            'default_region': 'IN',
+            'factors': {
+                'IN': {
+                    '2020': {'electricity': {'factor': 0.9, 'unit': 'kwh'}, 'water': {'factor': 0.4, 'unit': 'kl'}},
+                    '2023': {'electricity': {'factor': 0.8, 'unit': 'kwh'}, 'water': {'factor': 0.3, 'unit': 'kl'}},
+                },
+                'UK': {
+                    '2023': {'electricity': {'factor': 0.2, 'unit': 'kwh'}},
+                },
+            },
+            'unit_conversions': {
+                'units': {'to': 'kwh', 'multiplier': 1.0},
+                'litres': {'to': 'kl', 'multiplier': 0.001},
+                'cubic metres': {'to': 'kl', 'multiplier': 1.0},
+            },
+        })
+
+    def test_units_are_normalised(self):
+        result = self.table.compute([
+            {'utility_type': 'water', 'consumption': 12000, 'unit': ' Litres '},
+            {'utility_type': 'water', 'consumption': 5, 'unit': 'Cubic   Metres'},
+            # Unknown and missing units are taken as the factor's own unit
+            {'utility_type': 'electricity', 'consumption': 10, 'unit': 'furlongs'},
+            {'utility_type': 'electricity', 'consumption': 10},
+        ], year=2023)
+
+        self.assertEqual(
+            [item['normalised_consumption'] for item in result['breakdown']], [12.0, 5.0, 10.0, 10.0]
+        )
+        self.assertAlmostEqual(result['breakdown'][0]['carbon_emissions'], 3.6)
+
+    def test_unknown_region_falls_back_to_default(self):
+        self.assertEqual(self.table.resolve('UK', 2024)[:2], ('UK', 2023))
+        self.assertEqual(self.table.resolve('FR', 2024)[:2], ('IN', 2023))
+        self.assertEqual(self.table.resolve(None, 2024)[:2], ('IN', 2023))
+
+    def test_table_year_is_latest_not_after_bill(self):
+        self.assertEqual(self.table.resolve('IN', 2022)[1], 2020)
+        self.assertEqual(self.table.resolve('IN', 2023)[1], 2023)
+        self.assertEqual(self.table.resolve('IN', 2030)[1], 2023)
+        # Bills older than every table use the earliest one
+        self.assertEqual(self.table.resolve('IN', 2015)[1], 2020)
+        self.assertEqual(self.table.resolve('IN', None)[1], 2023)
+        self.assertEqual(self.table.compute([], 'IN', 2021)['emission_factors'], {
+            'version': 'test', 'region': 'IN', 'year': 2020
+        })
+
+    def test_multi_utility_bill_is_itemised(self):
+        text = next(
+            case['text'] for case in json.loads((FIXTURES_DIR / 'bill_texts.json').read_text(encoding='utf-8'))
+            if case['name'] == 'combined_electricity_water_litres'
+        )
+        bill_info = bill_extractor.extract(text)
+
+        result = emission_factor_table.compute(bill_info['line_items'], year=bill_info['date'].year)
+
+        breakdown = {item['utility_type']: item for item in result['breakdown']}
+        self.assertEqual(set(breakdown), {'electricity', 'water'})
+        self.assertEqual(breakdown['water']['normalised_consumption'], 12.0)
+        self.assertEqual(breakdown['water']['normalised_unit'], 'kl')
+        self.assertAlmostEqual(result['carbon_emissions'], sum(item['carbon_emissions'] for item in result['breakdown']))
+        self.assertAlmostEqual(sum(item['share'] for item in result['breakdown']), 1.0, places=3)
+
+    def test_items_without_factor_or_consumption_are_skipped(self):
+        skipped = [{'utility_type': 'gas', 'consumption': 3}, {'utility_type': 'electricity', 'consumption': None}]
+
+        result = self.table.compute([{'utility_type': 'electricity', 'consumption': 1}, *skipped], year=2023)
+
+        self.assertEqual(result['skipped'], skipped)
+        self.assertEqual(len(result['breakdown']), 1)
+
+
+class BillListingTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = mongomock.MongoClient().db.carbon_footprint_bills
+        start = datetime.datetime(2024, 1, 1)
+        # Five bills share each timestamp, so paging has to break ties on _id
+        self.collection.insert_many([
+            {
+                '_id': ObjectId(),
+                'user': 'alice' if i % 2 else 'bob',
+                'utility_types': ['electricity', 'water'] if i % 3 == 0 else ['electricity'],
+                'created_at': start + datetime.timedelta(days=i // 5),
+                'extracted_text': 'raw OCR text',
+                'analysis': {'analysis': 'long LLM text', 'carbon_emissions': float(i)},
+            }
+            for i in range(23)
+        ])
+        patcher = mock.patch('OCR.bills.get_bills_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def page_through(self, query, limit):
+        ids, cursor = [], None
+        while True:
+            bills, cursor = fetch_bills(query, limit=limit, cursor=cursor)
+            ids += [bill['_id'] for bill in bills]
+            if cursor is None:
+                return ids
+
+    def newest_first_ids(self, query):
+        bills = self.collection.find(query).sort([('created_at', -1), ('_id', -1)])
+        return [str(bill['_id']) for bill in bills]
+
+    def test_pages_have_no_duplicates_or_gaps_on_equal_timestamps(self):
+        for limit in (1, 4, 5, 23, 50):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.page_through({}, limit), self.newest_first_ids({}))
+
+    def test_filters_apply_across_pages(self):
+        query = build_bill_filter(
+            user='alice', utility='water',
+            created_from=datetime.datetime(2024, 1, 2), created_to=datetime.datetime(2024, 1, 5)
+        )
+
+        ids = self.page_through(query, limit=2)
+
+        self.assertEqual(ids, self.newest_first_ids(query))
+        self.assertTrue(ids)
+        for bill in self.collection.find({'_id': {'$in': [ObjectId(bill_id) for bill_id in ids]}}):
+            self.assertEqual(bill['user'], 'alice')
+            self.assertIn('water', bill['utility_types'])
+            self.assertTrue(datetime.datetime(2024, 1, 2) <= bill['created_at'] < datetime.datetime(2024, 1, 5))
+
+    def test_summary_projection_leaves_out_text_fields(self):
+        summary, _ = fetch_bills({}, limit=1)
+        full, _ = fetch_bills({}, limit=1, full=True)
+
+        self.assertNotIn('extracted_text', summary[0])
+        self.assertEqual(summary[0]['analysis'], {'carbon_emissions': 22.0})
+        self.assertEqual(full[0]['extracted_text'], 'raw OCR text')
+        self.assertEqual(full[0]['analysis']['analysis'], 'long LLM text')
+
+    def test_malformed_cursor_is_rejected(self):
+        malformed = [
+            'not a cursor',
+            base64.urlsafe_b64encode(b'2024-01-01T00:00:00|not-an-id').decode(),
+            base64.urlsafe_b64encode(b'yesterday|' + str(ObjectId()).encode()).decode(),
+        ]
+        for cursor in malformed:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises((ValueError, InvalidId)):
+                    decode_cursor(cursor)
+
+        with mock.patch('OCR.views.get_bills_collection', return_value=self.collection), \
+                mock.patch('OCR.views.get_database'), mock.patch('OCR.views.model_cache'):
+            request = APIRequestFactory().get('/bills/', {'cursor': malformed[0]})
+            response = CarbonFootprintViews.as_view()(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Invalid cursor')
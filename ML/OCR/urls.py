@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('carbon-footprintimage/', views.CarbonFootprintViews.as_view(), name='carbon-footprintimage'),
+    path('bill-cache-status/', views.bill_cache_status, name='bill-cache-status'),
 ]
\ No newline at end of file
@@ -1,38 +1,61 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.decorators import api_view
 from paddleocr import PaddleOCR
 from langchain_google_genai import ChatGoogleGenerativeAI
-from pymongo import MongoClient
 from bson import ObjectId
+from bson.errors import InvalidId
 import os
 import datetime
 import json
 import logging
 import tempfile
+import queue
+import threading
+import numpy as np
 from PIL import Image
-import re
-from pdf2image import convert_from_path
 import magic  # for file type detection
 import fitz  # PyMuPDF for text extraction from PDF
 
+from ML.jobs import JobError, QueueFull, job_queue, wants_async
+from ML.model_cache import model_cache
+from ML.mongo import get_database
+
+from .bills import build_bill_filter, count_bills, fetch_bills, get_bills_collection, parse_date, serialise_bill
+from .bill_cache import BILL_PIPELINE_VERSION, OCR_STAGE_VERSION, HashingWriter, bill_cache
+from .emission_factors import emission_factor_table
+from .extraction import bill_extractor
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Scanned PDF pages are rendered at this DPI, with a few pages rendered ahead of OCR
+OCR_PDF_DPI = int(os.getenv('OCR_PDF_DPI', '200'))
+OCR_PREFETCH_PAGES = int(os.getenv('OCR_PREFETCH_PAGES', '2'))
+
+# A page is read from its text layer when it has at least this many characters.
+# Otherwise its embedded images (ignoring ones smaller than OCR_MIN_IMAGE_SIZE
+# points) are OCR'd, or the whole page when images cover most of it.
+OCR_PAGE_MIN_CHARS = int(os.getenv('OCR_PAGE_MIN_CHARS', '50'))
+OCR_MIN_IMAGE_SIZE = float(os.getenv('OCR_MIN_IMAGE_SIZE', '32'))
+OCR_FULL_PAGE_COVERAGE = float(os.getenv('OCR_FULL_PAGE_COVERAGE', '0.6'))
+
+# PaddleOCR is loaded once per worker instead of once per request
+model_cache.register('paddleocr', lambda: PaddleOCR(use_angle_cls=True, lang='en'))
+# The shared PaddleOCR predictor is not thread-safe; request threads and job workers take turns
+_ocr_lock = threading.Lock()
+
 class CarbonFootprintViews(APIView):
     def __init__(self):
         try:
-            # MongoDB connection with error handling
-            self.client = MongoClient('mongodb://localhost:27017/', 
-                                    serverSelectionTimeoutMS=5000)
-            # Test the connection
-            self.client.server_info()
-            self.db = self.client['Techonovate']
-            self.bills_collection = self.db['carbon_footprint_bills']
+            # Shared, pooled MongoDB client; connections are made lazily on first use
+            self.db = get_database()
+            self.bills_collection = get_bills_collection()
             
-            # Initialize PaddleOCR
-            self.ocr = PaddleOCR(use_angle_cls=True, lang='en')
+            # Shared PaddleOCR instance from the per-process model cache
+            self.ocr = model_cache.get('paddleocr')
             logger.info("Successfully initialized CarbonFootprintViews")
         except Exception as e:
             logger.error(f"Initialization error: {str(e)}")
@@ -70,55 +93,11 @@ class CarbonFootprintViews(APIView):
     def extract_bill_info(self, text):
         """Extract relevant information from bill text"""
         try:
-            # Initialize dictionary to store extracted information
-            bill_info = {
-                'amount': None,
-                'date': None,
-                'consumption': None,
-                'utility_type': None
-            }
-
-            # Convert text to lowercase for easier matching
-            text_lower = text.lower()
-
-            # Extract amount (looking for currency patterns)
-            amount_pattern = r'(?:rs\.?|inr|₹)\s*(\d+(?:,\d+)*(?:\.\d{2})?)'
-            amount_matches = re.findall(amount_pattern, text_lower)
-            if amount_matches:
-                # Remove commas and convert to float
-                bill_info['amount'] = float(amount_matches[0].replace(',', ''))
-
-            # Extract date
-            date_patterns = [
-                r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}',  # DD/MM/YYYY or DD-MM-YYYY
-                r'\d{1,2}\s(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s?\d{2,4}'  # DD Mon YYYY
-            ]
-            for pattern in date_patterns:
-                date_matches = re.findall(pattern, text_lower)
-                if date_matches:
-                    try:
-                        # Convert the first found date to datetime object
-                        bill_info['date'] = datetime.datetime.strptime(date_matches[0], '%d/%m/%Y')
-                        break
-                    except ValueError:
-                        continue
-
-            # Extract consumption (looking for kWh, units, etc.)
-            consumption_patterns = {
-                'electricity': r'(\d+(?:\.\d+)?)\s*(?:kwh|units)',
-                'water': r'(\d+(?:\.\d+)?)\s*(?:kl|kilolitres|litres)',
-                'gas': r'(\d+(?:\.\d+)?)\s*(?:mmbtu|cubic\s*meters|scm)'
-            }
-
-            for utility, pattern in consumption_patterns.items():
-                consumption_matches = re.findall(pattern, text_lower)
-                if consumption_matches:
-                    bill_info['consumption'] = float(consumption_matches[0])
-                    bill_info['utility_type'] = utility
-                    break
+            # One scan over the text with the precompiled field rules
+            bill_info = bill_extractor.extract(text)
 
             # Validate extracted information
-            if not any(bill_info.values()):
+            if not bill_info:
                 logger.warning("No information could be extracted from the bill")
                 return None
 
@@ -130,31 +109,39 @@ class CarbonFootprintViews(APIView):
             return None
 
     def calculate_carbon_footprint(self, bill_info):
-        """Calculate carbon footprint based on bill information"""
+        """Calculate carbon footprint of every consumption line item on the bill"""
         try:
-            if not bill_info or 'consumption' not in bill_info or 'utility_type' not in bill_info:
+            if not bill_info or bill_info.get('consumption') is None or not bill_info.get('utility_type'):
                 return None
 
-            # Carbon emission factors (kg CO2e per unit)
-            emission_factors = {
-                'electricity': 0.82,  # kg CO2e per kWh (India average)
-                'water': 0.376,      # kg CO2e per kilolitre
-                'gas': 2.02         # kg CO2e per cubic meter
-            }
-
-            utility_type = bill_info['utility_type']
-            consumption = bill_info['consumption']
+            line_items = bill_info.get('line_items') or [{
+                'utility_type': bill_info['utility_type'],
+                'consumption': bill_info['consumption'],
+                'unit': None
+            }]
+            year = bill_info['date'].year if bill_info.get('date') else None
 
-            if utility_type not in emission_factors:
-                logger.error(f"Unknown utility type: {utility_type}")
+            # Versioned factors for the region and bill year, applied to all lines at once
+            footprint = emission_factor_table.compute(line_items, year=year)
+            for item in footprint['skipped']:
+                logger.error(f"Unknown utility type: {item.get('utility_type')}")
+            if not footprint['breakdown']:
                 return None
 
+            # The main line keeps the single-utility fields for existing clients
+            primary = next(
+                (line for line in footprint['breakdown'] if line['utility_type'] == bill_info['utility_type']),
+                footprint['breakdown'][0]
+            )
             carbon_footprint = {
-                'carbon_emissions': consumption * emission_factors[utility_type],
-                'unit': 'kg CO2e',
-                'utility_type': utility_type,
-                'consumption': consumption,
-                'emission_factor': emission_factors[utility_type]
+                'carbon_emissions': footprint['carbon_emissions'],
+                'unit': footprint['unit'],
+                'utility_type': primary['utility_type'],
+                'consumption': primary['consumption'],
+                'emission_factor': primary['emission_factor'],
+                'utility_types': [line['utility_type'] for line in footprint['breakdown']],
+                'breakdown': footprint['breakdown'],
+                'emission_factors': footprint['emission_factors']
             }
 
             logger.info(f"Calculated carbon footprint: {carbon_footprint}")
@@ -164,46 +151,115 @@ class CarbonFootprintViews(APIView):
             logger.error(f"Error calculating carbon footprint: {str(e)}")
             return None
     
+    def iter_rendered_regions(self, doc, regions, dpi=OCR_PDF_DPI):
+        """Render (page_number, clip) regions one at a time as BGR numpy arrays, ready for PaddleOCR"""
+        for index, (number, clip) in enumerate(regions):
+            pix = doc[number].get_pixmap(dpi=dpi, clip=clip, alpha=False)
+            image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            # PyMuPDF renders RGB, PaddleOCR expects OpenCV's BGR order
+            yield index, np.ascontiguousarray(image[:, :, ::-1])
+
+    def ocr_regions(self, doc, regions, dpi=OCR_PDF_DPI, prefetch=OCR_PREFETCH_PAGES):
+        """
+        OCR (page_number, clip) regions, rendering the next ones in a background
+        thread. A clip of None means the whole page.
+
+        At most `prefetch` rendered regions wait in memory, so peak memory does
+        not grow with the page count. Returns the texts in region order.
+        """
+        rendered = queue.Queue(maxsize=max(prefetch, 1))
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    rendered.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def render():
+            try:
+                for item in self.iter_rendered_regions(doc, regions, dpi):
+                    if stop.is_set():
+                        return
+                    put(item)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        renderer = threading.Thread(target=render, name='pdf-render', daemon=True)
+        renderer.start()
+        texts = [""] * len(regions)
+        try:
+            while True:
+                item = rendered.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                index, image = item
+                texts[index] = self.process_image_ocr(image)
+        finally:
+            stop.set()
+            renderer.join()
+        return texts
+
+    def plan_pdf_page(self, page):
+        """
+        Decide how to read one page. Returns (text_layer, clips): the text
+        layer worth keeping, and the regions still to OCR ([None] means the
+        whole page).
+        """
+        text = page.get_text().strip()
+        if len(text) >= OCR_PAGE_MIN_CHARS:
+            return text, []
+
+        page_area = abs(page.rect)
+        clips = []
+        for info in page.get_image_info():
+            clip = fitz.Rect(info['bbox']) & page.rect
+            if clip.width >= OCR_MIN_IMAGE_SIZE and clip.height >= OCR_MIN_IMAGE_SIZE:
+                clips.append(clip)
+
+        # Mostly-image pages (typical scans) are rendered whole, which also
+        # picks up any sparse text; otherwise only the embedded images are OCR'd
+        if not clips or sum(abs(clip) for clip in clips) >= OCR_FULL_PAGE_COVERAGE * page_area:
+            return "", [None]
+        return text, clips
+
     def extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF using both PyMuPDF and OCR"""
+        """Extract text from PDF page by page, using the text layer and OCR only where needed"""
+        doc = None
         try:
-            # First try direct text extraction
             doc = fitz.open(pdf_path)
-            text = ""
+            text_layers = []
+            regions = []
             for page in doc:
-                text += page.get_text()
-            
-            # If substantial text was extracted, return it
-            if len(text.strip()) > 100:
-                logger.info("Successfully extracted text directly from PDF")
-                return text
-            
-            # If little text was found, use OCR on converted images
-            logger.info("PDF appears to be scanned, using OCR")
-            images = convert_from_path(pdf_path)
-            extracted_texts = []
-            
-            for i, image in enumerate(images):
-                # Save each page temporarily
-                temp_image_path = f"{pdf_path}_page_{i}.png"
-                try:
-                    image.save(temp_image_path)
-                    # Process with OCR
-                    page_text = self.process_image_ocr(temp_image_path)
-                    extracted_texts.append(page_text)
-                finally:
-                    # Clean up temporary image
-                    if os.path.exists(temp_image_path):
-                        os.unlink(temp_image_path)
-            
-            return " ".join(extracted_texts)
+                text, clips = self.plan_pdf_page(page)
+                text_layers.append(text)
+                regions.extend((page.number, clip) for clip in clips)
+
+            ocr_page_count = len({number for number, _ in regions})
+            logger.info(f"PDF has {doc.page_count} pages: {doc.page_count - ocr_page_count} read from the text layer, "
+                        f"{len(regions)} regions on {ocr_page_count} pages sent to OCR")
+
+            ocr_texts = self.ocr_regions(doc, regions) if regions else []
+            page_parts = [[text] if text else [] for text in text_layers]
+            for (number, _), ocr_text in zip(regions, ocr_texts):
+                if ocr_text:
+                    page_parts[number].append(ocr_text)
+            return "\n".join(" ".join(parts) for parts in page_parts if parts)
             
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             raise
         finally:
-            if 'doc' in locals():
+            if doc is not None:
                 doc.close()
+
     def generate_analysis(self, bill_info, carbon_impact):
         """Generate comprehensive analysis of the bill and its environmental impact"""
         try:
@@ -213,12 +269,19 @@ class CarbonFootprintViews(APIView):
             # Initialize Google's GenerativeAI
             llm = ChatGoogleGenerativeAI(model="gemini-pro")
             
+            line_summary = "\n".join(
+                f"              - {line['utility_type']}: {line['consumption']} {line['billed_unit'] or line['normalised_unit']}, "
+                f"{line['carbon_emissions']:.2f} {carbon_impact['unit']}"
+                for line in carbon_impact['breakdown']
+            )
+            
             # Prepare the prompt for analysis
             prompt = f"""
             Analyze this utility bill and its environmental impact:
-            - Utility Type: {carbon_impact['utility_type']}
-            - Consumption: {carbon_impact['consumption']} units
-            - Carbon Emissions: {carbon_impact['carbon_emissions']:.2f} {carbon_impact['unit']}
+            - Utility Types: {', '.join(carbon_impact['utility_types'])}
+            - Consumption by utility:
+{line_summary}
+            - Total Carbon Emissions: {carbon_impact['carbon_emissions']:.2f} {carbon_impact['unit']}
             - Bill Amount: {'Rs. ' + str(bill_info['amount']) if bill_info.get('amount') else 'Not available'}
             - Bill Date: {bill_info['date'].strftime('%Y-%m-%d') if bill_info.get('date') else 'Not available'}
 
@@ -237,12 +300,15 @@ class CarbonFootprintViews(APIView):
                 'bill_summary': {
                     'utility_type': carbon_impact['utility_type'],
                     'consumption': carbon_impact['consumption'],
+                    'line_items': bill_info.get('line_items', []),
                     'amount': bill_info.get('amount'),
                     'date': bill_info.get('date')
                 },
                 'environmental_impact': {
                     'carbon_emissions': carbon_impact['carbon_emissions'],
-                    'unit': carbon_impact['unit']
+                    'unit': carbon_impact['unit'],
+                    'breakdown': carbon_impact['breakdown'],
+                    'emission_factors': carbon_impact['emission_factors']
                 },
                 'analysis': analysis
             }
@@ -253,10 +319,11 @@ class CarbonFootprintViews(APIView):
         except Exception as e:
             logger.error(f"Error generating analysis: {str(e)}")
             return None
-    def process_image_ocr(self, image_path):
-        """Process image with PaddleOCR"""
+    def process_image_ocr(self, image):
+        """Process an image file path or BGR numpy array with PaddleOCR"""
         try:
-            result = self.ocr.ocr(image_path)
+            with _ocr_lock:
+                result = self.ocr.ocr(image)
             
             if not result or not result[0]:
                 logger.warning("No text detected in image")
@@ -275,12 +342,13 @@ class CarbonFootprintViews(APIView):
             raise
 
     def save_uploaded_file(self, upload):
-        """Safely save uploaded file to temp directory"""
+        """Safely save uploaded file to temp directory; returns (path, sha256 of the contents)"""
         try:
             with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(upload.name)[1]) as temp_file:
+                writer = HashingWriter(temp_file)
                 for chunk in upload.chunks():
-                    temp_file.write(chunk)
-                return temp_file.name
+                    writer.write(chunk)
+                return temp_file.name, writer.hexdigest()
         except Exception as e:
             logger.error(f"File save error: {str(e)}")
             raise
@@ -301,12 +369,88 @@ class CarbonFootprintViews(APIView):
             logger.error(f"Error processing bill file: {str(e)}")
             raise
 
+    def process_bill_upload(self, temp_file_path, bill_type, file_metadata, user_id=None):
+        """Run OCR, extraction, carbon calculation and analysis; returns (payload, http status)"""
+        file_hash = file_metadata.get('sha256')
+        analysis_version = f"{OCR_STAGE_VERSION}/{BILL_PIPELINE_VERSION}/{emission_factor_table.version}"
+        
+        # The same bytes were analysed before: reuse the text and analysis
+        cached = bill_cache.get('analysis', analysis_version, file_hash)
+        if cached:
+            return self.save_bill(bill_type, cached['extracted_text'], cached['analysis'], file_metadata,
+                                  user_id=user_id, cached=True)
+        
+        extracted_text = bill_cache.get('text', OCR_STAGE_VERSION, file_hash)
+        if extracted_text is None:
+            extracted_text = self.process_bill_file(temp_file_path)
+            bill_cache.set('text', OCR_STAGE_VERSION, file_hash, extracted_text)
+        logger.info(f"Extracted text: {extracted_text}")
+        
+        # Extract bill information
+        bill_info = self.extract_bill_info(extracted_text)
+        if not bill_info:
+            return {
+                "error": "Could not extract bill information",
+                "extracted_text": extracted_text
+            }, status.HTTP_422_UNPROCESSABLE_ENTITY
+        
+        # Calculate carbon impact
+        carbon_impact = self.calculate_carbon_footprint(bill_info)
+        if not carbon_impact:
+            return {
+                "error": "Could not calculate carbon impact",
+                "bill_info": bill_info
+            }, status.HTTP_422_UNPROCESSABLE_ENTITY
+        
+        # Generate complete analysis
+        analysis_result = self.generate_analysis(bill_info, carbon_impact)
+        if not analysis_result:
+            return {
+                "error": "Could not generate analysis",
+                "carbon_impact": carbon_impact
+            }, status.HTTP_422_UNPROCESSABLE_ENTITY
+        
+        bill_cache.set('analysis', analysis_version, file_hash, {
+            "extracted_text": extracted_text,
+            "analysis": analysis_result
+        })
+        return self.save_bill(bill_type, extracted_text, analysis_result, file_metadata, user_id=user_id)
+
+    def save_bill(self, bill_type, extracted_text, analysis_result, file_metadata, user_id=None, cached=False):
+        """Store a processed bill in MongoDB; returns (payload, http status)"""
+        now = datetime.datetime.utcnow()
+        environmental_impact = analysis_result.get('environmental_impact', {})
+        bill_doc = {
+            "bill_type": bill_type,
+            # user, created_at and utility_types back the listing indexes
+            "user": user_id,
+            "created_at": now,
+            "utility_types": [line['utility_type'] for line in environmental_impact.get('breakdown', [])],
+            "carbon_emissions": environmental_impact.get('carbon_emissions'),
+            "uploaded_at": now,
+            "extracted_text": extracted_text,
+            "analysis": analysis_result,
+            "metadata": file_metadata,
+            # True when the analysis was reused from an earlier upload of the same file
+            "cached": cached
+        }
+        
+        inserted_bill = self.bills_collection.insert_one(bill_doc)
+        
+        return {
+            "message": "Bill processed successfully",
+            "bill_id": str(inserted_bill.inserted_id),
+            "analysis": analysis_result,
+            "cached": cached
+        }, status.HTTP_200_OK
+
     def post(self, request):
         temp_file_path = None
         try:
             # Validate request
             bill_file = request.FILES.get('bill_file')  # Changed from bill_image
             bill_type = request.data.get('bill_type')
+            user_id = request.data.get('user_id')
             
             if not all([bill_file, bill_type]):
                 return Response({
@@ -323,54 +467,37 @@ class CarbonFootprintViews(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Save and process file
-            temp_file_path = self.save_uploaded_file(bill_file)
-            extracted_text = self.process_bill_file(temp_file_path)
-            logger.info(f"Extracted text: {extracted_text}")
-            
-            # Extract bill information
-            bill_info = self.extract_bill_info(extracted_text)
-            if not bill_info:
-                return Response({
-                    "error": "Could not extract bill information",
-                    "extracted_text": extracted_text
-                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            
-            # Calculate carbon impact
-            carbon_impact = self.calculate_carbon_footprint(bill_info)
-            if not carbon_impact:
-                return Response({
-                    "error": "Could not calculate carbon impact",
-                    "bill_info": bill_info
-                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            temp_file_path, file_hash = self.save_uploaded_file(bill_file)
+            file_metadata = {
+                "file_name": bill_file.name,
+                "file_size": bill_file.size,
+                "content_type": bill_file.content_type,
+                "sha256": file_hash
+            }
             
-            # Generate complete analysis
-            analysis_result = self.generate_analysis(bill_info, carbon_impact)
-            if not analysis_result:
+            if wants_async(request):
+                # The job now owns the temporary file and deletes it when done
+                try:
+                    job_id = job_queue.submit('bill', {
+                        "file_path": temp_file_path,
+                        "bill_type": bill_type,
+                        "metadata": file_metadata,
+                        "user_id": user_id
+                    })
+                except QueueFull:
+                    return Response({
+                        "error": "Bill processing queue is full",
+                        "details": "Please retry later"
+                    }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "30"})
+                temp_file_path = None
                 return Response({
-                    "error": "Could not generate analysis",
-                    "carbon_impact": carbon_impact
-                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                    "message": "Bill queued for processing",
+                    "job_id": job_id,
+                    "status_url": f"/api/jobs/{job_id}/"
+                }, status=status.HTTP_202_ACCEPTED)
             
-            # Save to MongoDB
-            bill_doc = {
-                "bill_type": bill_type,
-                "uploaded_at": datetime.datetime.utcnow(),
-                "extracted_text": extracted_text,
-                "analysis": analysis_result,
-                "metadata": {
-                    "file_name": bill_file.name,
-                    "file_size": bill_file.size,
-                    "content_type": bill_file.content_type
-                }
-            }
-            
-            inserted_bill = self.bills_collection.insert_one(bill_doc)
-            
-            return Response({
-                "message": "Bill processed successfully",
-                "bill_id": str(inserted_bill.inserted_id),
-                "analysis": analysis_result
-            }, status=status.HTTP_200_OK)
+            payload, status_code = self.process_bill_upload(temp_file_path, bill_type, file_metadata, user_id)
+            return Response(payload, status=status_code)
             
         except Exception as e:
             logger.error(f"Bill processing error: {str(e)}", exc_info=True)
@@ -389,6 +516,16 @@ class CarbonFootprintViews(APIView):
                     logger.error(f"Failed to delete temporary file: {str(e)}")
 
     def get(self, request):
+        """
+        One bill by bill_id, or a newest-first listing.
+
+        Listing params: user_id, utility and from/to (ISO dates, to exclusive).
+        By default bills are offset paged with page/per_page, in the response
+        shape existing clients expect. mode=cursor, or a cursor from the
+        previous window's next_cursor, switches to keyset paging with limit
+        (max 100), fields=full to include extracted_text and the analysis
+        text, and count=exact|estimated|none.
+        """
         try:
             bill_id = request.query_params.get('bill_id')
             
@@ -410,24 +547,65 @@ class CarbonFootprintViews(APIView):
                     logger.error(f"Error retrieving bill {bill_id}: {str(e)}")
                     raise
             
-            # Get all bills with pagination
-            page = int(request.query_params.get('page', 1))
-            per_page = int(request.query_params.get('per_page', 10))
-            
-            total_bills = self.bills_collection.count_documents({})
-            bills = list(self.bills_collection
-                        .find({})
-                        .skip((page - 1) * per_page)
-                        .limit(per_page))
+            params = request.query_params
+            try:
+                query = build_bill_filter(
+                    user=params.get('user_id'),
+                    utility=params.get('utility'),
+                    created_from=parse_date(params.get('from')),
+                    created_to=parse_date(params.get('to'))
+                )
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid query parameters",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            keyset = params.get('mode') == 'cursor' or 'cursor' in params
+            try:
+                if keyset:
+                    limit = max(1, min(int(params.get('limit', 10)), 100))
+                else:
+                    page = max(1, int(params.get('page', 1)))
+                    per_page = max(1, int(params.get('per_page', 10)))
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid query parameters",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            for bill in bills:
-                bill['_id'] = str(bill['_id'])
+            if not keyset:
+                # Offset paging of whole documents, as existing clients expect
+                total_bills = self.bills_collection.count_documents(query)
+                bills = list(self.bills_collection
+                            .find(query)
+                            .skip((page - 1) * per_page)
+                            .limit(per_page))
+                
+                return Response({
+                    "total_bills": total_bills,
+                    "page": page,
+                    "per_page": per_page,
+                    "total_pages": (total_bills + per_page - 1) // per_page,
+                    "bills": [serialise_bill(bill) for bill in bills]
+                }, status=status.HTTP_200_OK)
+            
+            try:
+                bills, next_cursor = fetch_bills(
+                    query, limit=limit, cursor=params.get('cursor'), full=params.get('fields') == 'full'
+                )
+            except (ValueError, InvalidId) as e:
+                return Response({
+                    "error": "Invalid cursor",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            total_bills, lower_bound = count_bills(self.bills_collection, query, params.get('count', 'none'))
             
             return Response({
                 "total_bills": total_bills,
-                "page": page,
-                "per_page": per_page,
-                "total_pages": (total_bills + per_page - 1) // per_page,
+                "total_is_lower_bound": lower_bound,
+                "limit": limit,
+                "count": len(bills),
+                "next_cursor": next_cursor,
                 "bills": bills
             }, status=status.HTTP_200_OK)
             
@@ -436,4 +614,24 @@ class CarbonFootprintViews(APIView):
             return Response({
                 "error": str(e),
                 "message": "Failed to retrieve bills"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def bill_cache_status(request):
+    """Hit/miss counters of the bill cache for this worker"""
+    return Response(bill_cache.stats())
+
+def run_bill_job(payload):
+    """Job handler: process a queued bill upload and delete its temporary file"""
+    try:
+        result, status_code = CarbonFootprintViews().process_bill_upload(
+            payload['file_path'], payload['bill_type'], payload['metadata'], payload.get('user_id')
+        )
+    finally:
+        if os.path.exists(payload['file_path']):
+            os.unlink(payload['file_path'])
+    if status_code >= 400:
+        raise JobError(result)
+    return result
+
+job_queue.register('bill', run_bill_job)
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
 
+from ML.model_cache import model_cache, warmup_enabled
+
 
 class AudioprocessingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'audioprocessing'
+
+    def ready(self):
+        # Optionally load Whisper and spaCy at startup instead of on the first upload
+        if warmup_enabled():
+            from . import views  # noqa: F401 registers the loaders
+            model_cache.warm_up(['whisper_small', 'spacy_en_core_web_trf', 'audio_analyzer'])
@@ -0,0 +1,79 @@
+import re
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+
+def iter_audio_blocks(audio_path, target_sr=16000, block_seconds=10.0):
+    """Read an audio file incrementally as mono float32 blocks at target_sr"""
+    with sf.SoundFile(audio_path) as f:
+        native_sr = f.samplerate
+        blocksize = max(int(block_seconds * native_sr), 1)
+        for block in f.blocks(blocksize=blocksize, dtype='float32', always_2d=True):
+            mono = block.mean(axis=1)
+            if native_sr != target_sr:
+                mono = librosa.resample(mono, orig_sr=native_sr, target_sr=target_sr)
+            yield mono.astype(np.float32, copy=False)
+
+
+def quietest_cut(window, sr, search_seconds=3.0, frame_seconds=0.02):
+    """Sample index of the quietest frame within the last search_seconds of window"""
+    frame = max(int(frame_seconds * sr), 1)
+    start = max(window.size - int(search_seconds * sr), 0)
+    region = window[start:start + (window.size - start) // frame * frame]
+    if region.size == 0:
+        return window.size
+    rms = np.sqrt(np.mean(region.reshape(-1, frame) ** 2, axis=1))
+    return start + int(np.argmin(rms)) * frame + frame // 2
+
+
+def iter_audio_windows(audio_path, target_sr=16000, window_seconds=30.0, overlap_seconds=2.0,
+                       split_at_silence=False, silence_search_seconds=3.0):
+    """
+    Yield windows of at most window_seconds, reading the file incrementally.
+
+    Consecutive windows share overlap_seconds of audio so words cut at a
+    boundary appear whole in one of them. With split_at_silence the cut is
+    moved to the quietest point near the end of the window instead and no
+    overlap is kept. Only one window plus one read block is held in memory.
+    """
+    window = int(window_seconds * target_sr)
+    overlap = 0 if split_at_silence else int(overlap_seconds * target_sr)
+    buffer = np.zeros(0, dtype=np.float32)
+    yielded = False
+
+    for block in iter_audio_blocks(audio_path, target_sr):
+        buffer = np.concatenate([buffer, block])
+        while buffer.size >= window:
+            cut = quietest_cut(buffer[:window], target_sr, silence_search_seconds) if split_at_silence else window
+            yield buffer[:cut]
+            yielded = True
+            buffer = buffer[max(cut - overlap, 0):]
+
+    # The tail is only worth transcribing if it holds audio beyond the shared overlap
+    if buffer.size > (overlap if yielded else 0):
+        yield buffer
+
+
+def _normalise_word(word):
+    return re.sub(r'[^\w]', '', word.lower())
+
+
+def stitch_transcripts(texts, max_overlap_words=12):
+    """Join window transcripts, dropping words repeated across the window overlap"""
+    words = []
+    for text in texts:
+        new_words = text.split()
+        if not new_words:
+            continue
+        best = 0
+        limit = min(max_overlap_words, len(words), len(new_words))
+        tail = [_normalise_word(w) for w in words[-limit:]] if limit else []
+        head = [_normalise_word(w) for w in new_words[:limit]]
+        for k in range(limit, 0, -1):
+            if tail[-k:] == head[:k]:
+                best = k
+                break
+        words.extend(new_words[best:])
+    return ' '.join(words)
@@ -0,0 +1,80 @@
+import json
+import os
+from bisect import bisect_right
+from collections import Counter
+
+from spacy.matcher import PhraseMatcher
+
+# Keyword table: label -> phrases. Lifestyle labels bucket sentences for the
+# category prompts, impact labels are counted for the impact category.
+# Matching is token based and case-insensitive, so inflections are listed.
+DEFAULT_KEYWORD_TABLE = {
+    'transport_details': [
+        'car', 'cars', 'transit', 'travel', 'travels', 'travelled', 'traveled', 'travelling', 'traveling',
+        'drive', 'drives', 'driving', 'drove', 'air', 'flight', 'flights', 'fly', 'flying',
+        'bus', 'train', 'commute', 'commuting', 'carpool', 'carpooling',
+    ],
+    'diet_details': [
+        'diet', 'food', 'foods', 'eat', 'eats', 'eating', 'ate', 'meat', 'meats',
+        'plant', 'plants', 'plant-based', 'vegetarian', 'vegan', 'dairy',
+    ],
+    'energy_details': [
+        'energy', 'electricity', 'electric', 'heating', 'heater', 'power', 'air conditioning',
+        'air conditioner', 'solar',
+    ],
+    'waste_details': [
+        'waste', 'wasted', 'garbage', 'trash', 'recycle', 'recycles', 'recycled', 'recycling',
+        'dispose', 'disposed', 'disposal', 'compost', 'composting',
+    ],
+    'shopping_details': [
+        'shopping', 'shop', 'shops', 'purchase', 'purchases', 'purchased', 'buy', 'buys', 'buying',
+        'bought', 'grocery', 'groceries',
+    ],
+    'impact_positive': ['efficient', 'efficiently', 'reduce', 'reduced', 'reducing', 'conscious', 'sustainable'],
+    'impact_negative': ['high usage', 'frequent', 'frequently', 'excessive'],
+}
+
+
+def load_keyword_table():
+    """Keyword table from AUDIO_KEYWORDS_PATH (JSON) if set, otherwise the defaults"""
+    path = os.getenv('AUDIO_KEYWORDS_PATH')
+    if not path:
+        return DEFAULT_KEYWORD_TABLE
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class KeywordMatcher:
+    """
+    Compiled phrase matcher over the keyword table.
+
+    One pass over a Doc finds every keyword and multi-word phrase, whatever
+    the size of the table, and maps each hit to its sentence.
+    """
+
+    def __init__(self, nlp, table=None):
+        self.table = table or load_keyword_table()
+        self.matcher = PhraseMatcher(nlp.vocab, attr='LOWER')
+        for label, phrases in self.table.items():
+            self.matcher.add(label, [nlp.make_doc(phrase) for phrase in phrases])
+
+    def match(self, doc):
+        """
+        Return (sentences, counts): the sorted sentence indices hit by each
+        label and the number of hits per label. Memoised on the Doc.
+        """
+        cached = doc.user_data.get('keyword_matches')
+        if cached is not None:
+            return cached
+
+        sentence_starts = [sent.start for sent in doc.sents]
+        sentences = {label: set() for label in self.table}
+        counts = Counter()
+        for match_id, start, _ in self.matcher(doc):
+            label = doc.vocab.strings[match_id]
+            sentences[label].add(bisect_right(sentence_starts, start) - 1)
+            counts[label] += 1
+
+        result = ({label: sorted(hits) for label, hits in sentences.items()}, counts)
+        doc.user_data['keyword_matches'] = result
+        return result
@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+
+class _Call:
+    """One LLM call; records when a worker actually starts it"""
+
+    def __init__(self, llm, messages, queue_deadline):
+        self.llm = llm
+        self.messages = messages
+        self.queue_deadline = queue_deadline
+        self.started = threading.Event()
+        self.start_time = None
+
+    def run(self):
+        # The request has given up on calls that waited too long for a worker, so don't spend one on it
+        if time.monotonic() > self.queue_deadline:
+            return None
+        self.start_time = time.monotonic()
+        self.started.set()
+        return self.llm.invoke(self.messages)
+
+
+class ConcurrentLLMCalls:
+    """
+    Runs a request's LLM calls on a pool shared by all requests.
+
+    Each call gets call_timeout seconds from the moment a worker starts it,
+    so time spent queued behind other requests does not count against it.
+    A call that has not started within queue_timeout of being submitted is
+    dropped before it reaches the LLM. A call that overruns its timeout
+    cannot be interrupted; its result is ignored and its worker is busy
+    until the LLM client returns.
+    """
+
+    def __init__(self, llm, max_concurrency, call_timeout, queue_timeout=None):
+        self.llm = llm
+        self.call_timeout = call_timeout
+        self.queue_timeout = call_timeout if queue_timeout is None else queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='gemini')
+
+    def submit(self, messages_by_key):
+        """Queue one call per key; pass the result to collect()"""
+        queue_deadline = time.monotonic() + self.queue_timeout
+        pending = {}
+        for key, messages in messages_by_key.items():
+            call = _Call(self.llm, messages, queue_deadline)
+            pending[key] = (call, self.executor.submit(call.run))
+        return queue_deadline, pending
+
+    def _result(self, call, future, queue_deadline):
+        if not call.started.wait(max(queue_deadline - time.monotonic(), 0)):
+            # A worker may have picked the call up right at the deadline
+            if not call.started.is_set():
+                future.cancel()
+                raise FuturesTimeoutError(f'Not started within {self.queue_timeout}s')
+        remaining = call.start_time + self.call_timeout - time.monotonic()
+        try:
+            return future.result(timeout=max(remaining, 0))
+        except FuturesTimeoutError:
+            raise FuturesTimeoutError(f'Timed out after {self.call_timeout}s')
+
+    def collect(self, submitted):
+        """{key: (response content, error)}; one failing or slow call does not drop the others"""
+        queue_deadline, pending = submitted
+        results = {}
+        for key, (call, future) in pending.items():
+            try:
+                results[key] = (self._result(call, future, queue_deadline).content, None)
+            except Exception as e:
+                results[key] = (None, str(e))
+        return results
+
+    def invoke_all(self, messages_by_key):
+        return self.collect(self.submit(messages_by_key))
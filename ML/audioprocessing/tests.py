@@ -1,3 +1,86 @@
-from django.test import TestCase
+import threading
+import time
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .llm_calls import ConcurrentLLMCalls
+
+
+class StubLLM:
+    """invoke() sleeps for the delay of the message's category, then answers or raises"""
+
+    def __init__(self, delays, failures=()):
+        self.delays = delays
+        self.failures = set(failures)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def invoke(self, messages):
+        category = messages[0]['content']
+        with self.lock:
+            self.calls.append(category)
+        time.sleep(self.delays.get(category, 0))
+        if category in self.failures:
+            raise RuntimeError(f'{category} failed')
+        return SimpleNamespace(content=f'{category} advice')
+
+
+def category_messages(categories, suffix=''):
+    return {category + suffix: [{'role': 'user', 'content': category}] for category in categories}
+
+
+class ConcurrentLLMCallsTests(SimpleTestCase):
+    def test_partial_results_within_the_call_timeout(self):
+        llm = StubLLM(
+            delays={'transportation': 0.1, 'diet': 0.05, 'energy': 2.0, 'waste': 0.1, 'shopping': 0.1},
+            failures={'diet'},
+        )
+        calls = ConcurrentLLMCalls(llm, max_concurrency=2, call_timeout=0.5, queue_timeout=1.0)
+
+        started = time.monotonic()
+        results = calls.invoke_all(category_messages(['transportation', 'diet', 'energy', 'waste', 'shopping']))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(results['transportation'], ('transportation advice', None))
+        self.assertEqual(results['waste'], ('waste advice', None))
+        self.assertEqual(results['shopping'], ('shopping advice', None))
+        self.assertEqual(results['diet'], (None, 'diet failed'))
+        self.assertEqual(results['energy'], (None, 'Timed out after 0.5s'))
+        # Bounded by the slow call's timeout, not by its 2s delay
+        self.assertLess(elapsed, 1.0)
+
+    def test_queueing_behind_other_requests_does_not_use_up_the_timeout(self):
+        llm = StubLLM(delays={'transportation': 0.3, 'diet': 0.3})
+        calls = ConcurrentLLMCalls(llm, max_concurrency=2, call_timeout=0.5, queue_timeout=2.0)
+        results = []
+
+        def request(i):
+            results.append(calls.invoke_all(category_messages(['transportation', 'diet'], suffix=str(i))))
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(3)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        # The last request waits ~0.6s for a slot, longer than the call timeout, and still succeeds
+        self.assertGreater(elapsed, 0.8)
+        self.assertEqual(len(results), 3)
+        for result in results:
+            for content, error in result.values():
+                self.assertIsNone(error)
+                self.assertIsNotNone(content)
+
+    def test_calls_not_started_within_the_queue_timeout_are_dropped(self):
+        llm = StubLLM(delays={'transportation': 0.5, 'diet': 0.0})
+        calls = ConcurrentLLMCalls(llm, max_concurrency=1, call_timeout=1.0, queue_timeout=0.1)
+
+        results = calls.invoke_all(category_messages(['transportation', 'diet']))
+
+        self.assertEqual(results['transportation'], ('transportation advice', None))
+        self.assertEqual(results['diet'], (None, 'Not started within 0.1s'))
+        calls.executor.shutdown(wait=True)
+        self.assertEqual(llm.calls, ['transportation'])
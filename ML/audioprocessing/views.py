@@ -1,8 +1,8 @@
 import os
-from datetime import datetime
+import threading
+import uuid
 import torch
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
-import librosa
 from pydub import AudioSegment
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -10,17 +10,68 @@ from rest_framework import status
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 import spacy
+from spacy.tokens import Doc
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 
+from ML.jobs import QueueFull, job_queue, wants_async
+from ML.model_cache import model_cache
+
+from .chunking import iter_audio_windows, stitch_transcripts
+from .keywords import KeywordMatcher
+from .llm_calls import ConcurrentLLMCalls
+
 load_dotenv()
 import google.generativeai as genai
 # Configure Google Generative AI
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+def load_whisper():
+    """Load the Whisper processor and model, on GPU when available"""
+    processor = WhisperProcessor.from_pretrained("openai/whisper-small")
+    model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-small")
+    if torch.cuda.is_available():
+        model = model.to("cuda")
+    return processor, model
+
+# Long recordings are transcribed as overlapping windows, a few per generate call
+TRANSCRIBE_WINDOW_SECONDS = float(os.getenv('TRANSCRIBE_WINDOW_SECONDS', '30'))
+TRANSCRIBE_OVERLAP_SECONDS = float(os.getenv('TRANSCRIBE_OVERLAP_SECONDS', '2'))
+TRANSCRIBE_BATCH_SIZE = int(os.getenv('TRANSCRIBE_BATCH_SIZE', '4'))
+TRANSCRIBE_SPLIT_AT_SILENCE = os.getenv('TRANSCRIBE_SPLIT_AT_SILENCE', '').lower() in ('1', 'true', 'yes')
+
+# Heavy models are loaded once per worker instead of once per request
+# Topics, sentences and entities need the tagger, parser and NER; lemmas are never read
+model_cache.register('spacy_en_core_web_trf', lambda: spacy.load('en_core_web_trf', disable=['lemmatizer']))
+model_cache.register('whisper_small', load_whisper)
+# The shared Whisper model and spaCy pipeline are not thread-safe; request threads and job workers take turns
+_whisper_lock = threading.Lock()
+_nlp_lock = threading.Lock()
+
+# Per-category Gemini calls run concurrently, each bounded by a timeout counted from when it starts
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '5'))
+GEMINI_CALL_TIMEOUT = float(os.getenv('GEMINI_CALL_TIMEOUT', '30'))
+# How long a call may wait for a free slot when other requests are using the pool
+GEMINI_QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', '30'))
+
 class EnhancedAudioAnalysisSystem:
-    def __init__(self):
-        self.nlp = spacy.load('en_core_web_trf')
-        self.model = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.3)
+    def __init__(self, llm=None, max_concurrency=GEMINI_MAX_CONCURRENCY, call_timeout=GEMINI_CALL_TIMEOUT,
+                 queue_timeout=GEMINI_QUEUE_TIMEOUT, keyword_table=None):
+        self.nlp = model_cache.get('spacy_en_core_web_trf')
+        # Compiled once from the keyword table; see keywords.py
+        self.keyword_matcher = KeywordMatcher(self.nlp, keyword_table)
+        # Any object with invoke(messages) -> response.content works, e.g. a local stub in tests
+        self.model = llm or ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.3)
+        self.llm_calls = ConcurrentLLMCalls(self.model, max_concurrency, call_timeout, queue_timeout)
+        
+        # Lifestyle details used by each category prompt
+        self.category_details_keys = {
+            'transportation': 'transport_details',
+            'diet': 'diet_details',
+            'energy': 'energy_details',
+            'waste': 'waste_details',
+            'shopping': 'shopping_details'
+        }
         
         # Category-specific prompts
         self.category_prompts = {
@@ -65,68 +116,62 @@ class EnhancedAudioAnalysisSystem:
             """
         }
 
-    def _extract_lifestyle_details(self, transcript):
-        """Extract relevant lifestyle details from transcript"""
-        details = {
-            'transport_details': '',
-            'diet_details': '',
-            'energy_details': '',
-            'waste_details': '',
-            'shopping_details': ''
-        }
-        
-        doc = self.nlp(transcript)
+    def _as_doc(self, transcript):
+        """Accept a transcript string or an already parsed Doc"""
+        if isinstance(transcript, Doc):
+            return transcript
+        with _nlp_lock:
+            return self.nlp(transcript)
+
+    def _extract_lifestyle_details(self, doc):
+        """Extract relevant lifestyle details from the parsed transcript"""
+        sentence_hits, _ = self.keyword_matcher.match(doc)
+        sents = list(doc.sents)
         
-        for sent in doc.sents:
-            sent_text = sent.text.lower()
-            
-            if any(word in sent_text for word in ['car', 'transit', 'travel', 'drive', 'air']):
-                details['transport_details'] += sent.text + ' '
-                
-            if any(word in sent_text for word in ['diet', 'food', 'eat', 'meat', 'plant']):
-                details['diet_details'] += sent.text + ' '
-                
-            if any(word in sent_text for word in ['energy', 'electricity', 'heating', 'power']):
-                details['energy_details'] += sent.text + ' '
-                
-            if any(word in sent_text for word in ['waste', 'garbage', 'recycle', 'dispose']):
-                details['waste_details'] += sent.text + ' '
-                
-            if any(word in sent_text for word in ['shopping', 'purchase', 'buy', 'grocery']):
-                details['shopping_details'] += sent.text + ' '
+        details = {}
+        for details_key in self.category_details_keys.values():
+            details[details_key] = ''.join(sents[i].text + ' ' for i in sentence_hits.get(details_key, []))
         
         return details
 
     def get_gemini_suggestions(self, transcript):
-        """Get personalized suggestions from Gemini for each category"""
-        lifestyle_details = self._extract_lifestyle_details(transcript)
-        suggestions = {}
+        """Get personalized suggestions from Gemini for each category, one concurrent call per category"""
+        doc = self._as_doc(transcript)
+        lifestyle_details = self._extract_lifestyle_details(doc)
+        behaviour = {}
+        messages = {}
         
         for category, prompt_template in self.category_prompts.items():
-            details_key = f"{category}_details"
+            details_key = self.category_details_keys[category]
             details = lifestyle_details.get(details_key, '')
             
             if details:
                 prompt = prompt_template.format(**{details_key: details})
-                messages = [{"role": "user", "content": prompt}]
-                response = self.model.invoke(messages)
-                
-                suggestions[category] = {
-                    'current_behavior': details,
-                    'recommendations': response.content,
-                    'impact_category': self._calculate_impact_category(category, transcript)
-                }
+                behaviour[category] = details
+                messages[category] = [{"role": "user", "content": prompt}]
+        
+        submitted = self.llm_calls.submit(messages)
+        # Impact is scored over the whole transcript, so it is the same for every category
+        impact_category = self._calculate_impact_category(doc) if messages else None
+        
+        suggestions = {}
+        for category, (recommendations, error) in self.llm_calls.collect(submitted).items():
+            suggestion = {
+                'current_behavior': behaviour[category],
+                'recommendations': recommendations,
+                'impact_category': impact_category
+            }
+            if error is not None:
+                suggestion['error'] = error
+            suggestions[category] = suggestion
         
         return suggestions
 
-    def _calculate_impact_category(self, category, transcript):
+    def _calculate_impact_category(self, doc):
         """Calculate impact category based on user behavior"""
-        doc = self.nlp(transcript)
-        positive_indicators = ['efficient', 'reduce', 'conscious', 'sustainable']
-        negative_indicators = ['high usage', 'frequent', 'excessive']
-        
-        positive_count = sum(1 for token in doc if token.text.lower() in positive_indicators)
-        negative_count = sum(1 for token in doc if token.text.lower() in negative_indicators)
+        _, counts = self.keyword_matcher.match(doc)
+        positive_count = counts['impact_positive']
+        negative_count = counts['impact_negative']
         
         if positive_count > negative_count:
             return 'LOW_IMPACT'
@@ -137,10 +182,11 @@ class EnhancedAudioAnalysisSystem:
         
     def analyze_transcript(self, transcript):
         """Main analysis pipeline for processing transcripts"""
-        suggestions = self.get_gemini_suggestions(transcript)
+        # Parse once and share the Doc across suggestions, impact scoring and topics
+        doc = self._as_doc(transcript)
+        suggestions = self.get_gemini_suggestions(doc)
         
         # Extract topics using spaCy
-        doc = self.nlp(transcript)
         topics = []
         seen = set()
         
@@ -160,65 +206,91 @@ class EnhancedAudioAnalysisSystem:
             'suggestions': suggestions
         }
 
+model_cache.register('audio_analyzer', EnhancedAudioAnalysisSystem)
+
 class AudioTranscriptionView(APIView):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.processor = WhisperProcessor.from_pretrained("openai/whisper-small")
-        self.model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-small")
-        self.analyzer = EnhancedAudioAnalysisSystem()
-        
-        if torch.cuda.is_available():
-            self.model = self.model.to("cuda")
+        # DRF builds a view per request, so only cheap lookups into the shared cache happen here
+        self.processor, self.model = model_cache.get('whisper_small')
+        self.analyzer = model_cache.get('audio_analyzer')
         self.target_sr = 16000
 
     def _save_audio_file(self, audio_file):
         upload_dir = 'temp_uploads'
         os.makedirs(upload_dir, exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"audio_{timestamp}.{audio_file.name.split('.')[-1]}"
+        # Unique per upload, since queued uploads in the same second must not share a file
+        filename = f"audio_{uuid.uuid4().hex}.{audio_file.name.split('.')[-1]}"
         filepath = os.path.join(upload_dir, filename)
         
         content = audio_file.read()
-        default_storage.save(filepath, ContentFile(content))
-        return filepath
+        # Storage may rename the file if the name is taken, so use the name it returns
+        return default_storage.save(filepath, ContentFile(content))
 
     def _convert_to_wav(self, audio_path):
         if not audio_path.endswith('.wav'):
             audio = AudioSegment.from_file(audio_path)
             wav_path = audio_path.rsplit('.', 1)[0] + '.wav'
-            audio.export(wav_path, format='wav')
+            # Export mono at Whisper's sample rate so windows need no resampling
+            audio.set_channels(1).set_frame_rate(self.target_sr).export(wav_path, format='wav')
             os.remove(audio_path)
             return wav_path
         return audio_path
 
+    def _transcribe_windows(self, windows):
+        """Transcribe a batch of audio windows with one generate call"""
+        with _whisper_lock:
+            input_features = self.processor(
+                windows, 
+                sampling_rate=self.target_sr, 
+                return_tensors="pt",
+                language='en'
+            ).input_features
+            
+            if torch.cuda.is_available():
+                input_features = input_features.to("cuda")
+            
+            # Generate transcription
+            predicted_ids = self.model.generate(
+                input_features,
+                language='en',
+                task='transcribe'
+            )
+            
+            # Decode the transcription
+            return self.processor.batch_decode(
+                predicted_ids, 
+                skip_special_tokens=True
+            )
+
     def _transcribe_audio(self, audio_path):
-        """Transcribe audio file using Whisper"""
-        # Load and process audio
-        audio, sr = librosa.load(audio_path, sr=self.target_sr)
-        
-        # Process with Whisper
-        input_features = self.processor(
-            audio, 
-            sampling_rate=sr, 
-            return_tensors="pt",
-            language='en'
-        ).input_features
+        """Transcribe audio file using Whisper, 30s windows at a time"""
+        # Whisper only sees 30 seconds per input, so longer recordings are
+        # streamed from disk as overlapping windows and decoded in batches
+        split_at_silence = TRANSCRIBE_SPLIT_AT_SILENCE
+        windows = iter_audio_windows(
+            audio_path,
+            target_sr=self.target_sr,
+            window_seconds=TRANSCRIBE_WINDOW_SECONDS,
+            overlap_seconds=TRANSCRIBE_OVERLAP_SECONDS,
+            split_at_silence=split_at_silence
+        )
         
-        if torch.cuda.is_available():
-            input_features = input_features.to("cuda")
+        window_texts = []
+        batch = []
+        for window in windows:
+            batch.append(window)
+            if len(batch) == TRANSCRIBE_BATCH_SIZE:
+                window_texts.extend(self._transcribe_windows(batch))
+                batch = []
+        if batch:
+            window_texts.extend(self._transcribe_windows(batch))
         
-        # Generate transcription
-        predicted_ids = self.model.generate(
-            input_features,
-            language='en',
-            task='transcribe'
+        # Windows cut at silence share no audio, so there is nothing to de-duplicate
+        transcription = stitch_transcripts(
+            window_texts,
+            max_overlap_words=0 if split_at_silence else 12
         )
-        
-        # Decode the transcription
-        transcription = self.processor.batch_decode(
-            predicted_ids, 
-            skip_special_tokens=True
-        )[0]
 
         print("transcription:",transcription)
         if torch.cuda.is_available():
@@ -249,6 +321,21 @@ class AudioTranscriptionView(APIView):
 
             # Process the audio file
             audio_path = self._save_audio_file(audio_file)
+            if wants_async(request):
+                try:
+                    job_id = job_queue.submit('transcribe', {'audio_path': audio_path})
+                except QueueFull:
+                    os.remove(audio_path)
+                    return Response(
+                        {'error': 'Transcription queue is full, please retry later'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={'Retry-After': '30'}
+                    )
+                return Response(
+                    {'job_id': job_id, 'status': 'queued', 'status_url': f'/api/jobs/{job_id}/'},
+                    status=status.HTTP_202_ACCEPTED
+                )
+            
             wav_path = self._convert_to_wav(audio_path)
             results = self._transcribe_audio(wav_path)
             print("Results:",results)
@@ -262,6 +349,22 @@ class AudioTranscriptionView(APIView):
                 {'error': f'Error processing audio file: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+def run_transcription_job(payload):
+    """Job handler: transcribe and analyse a queued upload, then delete it"""
+    audio_path = payload['audio_path']
+    wav_path = None
+    try:
+        view = AudioTranscriptionView()
+        wav_path = view._convert_to_wav(audio_path)
+        return view._transcribe_audio(wav_path)
+    finally:
+        # The upload is left behind when conversion fails on a corrupt file
+        for path in {audio_path, wav_path}:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+job_queue.register('transcribe', run_transcription_job)
+
 from rest_framework.decorators import api_view   
 from django.http import JsonResponse
 from langchain.schema import AIMessage
@@ -1,6 +1,23 @@
+import logging
+
 from django.apps import AppConfig
 
+from ML.model_cache import warmup_enabled
+
+logger = logging.getLogger(__name__)
+
 
 class CalculatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'calculator'
+
+    def ready(self):
+        # Optionally build the model and population index at startup instead of on the first request
+        if not warmup_enabled():
+            return
+        from .views import encoder_registry, model_registry, population_registry
+        for registry in (model_registry, encoder_registry, population_registry):
+            try:
+                registry.get()
+            except Exception as e:
+                logger.error(f"Warm-up of {registry.name} failed: {str(e)}")
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Shared by temp/train.py and the calculator views, so keep it free of Django imports
+
+ARRAY_NAMES = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+META_FILE = 'meta.json'
+
+
+class CompactForest:
+    """
+    A fitted RandomForestRegressor flattened into contiguous NumPy arrays.
+
+    All trees share one node table. Leaves point to themselves, so every
+    tree can be walked for a fixed `max_depth` steps in lock-step, which
+    turns prediction into a handful of vectorised gathers over
+    (rows x trees). Arrays are stored as .npy files and can be memory-mapped,
+    so many workers on one box share the same pages.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features, version=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.version = version
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten the trees of a fitted sklearn forest regressor"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count, dtype=np.int32) + offset
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+            n_features=model.n_features_in_,
+        )
+
+    def predict(self, X, block_size=4096):
+        """Average leaf value over all trees, matching RandomForestRegressor.predict"""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        predictions = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], block_size):
+            block = X[start:start + block_size]
+            rows = np.arange(block.shape[0])[:, None]
+            nodes = np.repeat(self.roots[None, :], block.shape[0], axis=0)
+            for _ in range(self.max_depth):
+                go_left = block[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            predictions[start:start + block_size] = self.value[nodes].mean(axis=1)
+        return predictions
+
+    def save(self, directory, keep=2):
+        """
+        Write the arrays to a new <version>/ subdirectory, then point
+        meta.json at it with an atomic replace. Workers that memory-mapped an
+        earlier export keep reading unchanged files, and the registry picks
+        up the new export when meta.json changes. Only the newest `keep`
+        versions are kept.
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = {name: np.ascontiguousarray(getattr(self, name)) for name in ARRAY_NAMES}
+        digest = hashlib.sha256()
+        for array in arrays.values():
+            digest.update(array.tobytes())
+        version = digest.hexdigest()[:12]
+
+        version_dir = os.path.join(directory, version)
+        if not os.path.exists(os.path.join(version_dir, ARRAY_NAMES[-1] + '.npy')):
+            temp_dir = os.path.join(directory, f'.{version}.{os.getpid()}.tmp')
+            os.makedirs(temp_dir, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_dir, f'{name}.npy'), array)
+            try:
+                os.replace(temp_dir, version_dir)
+            except OSError:
+                # Another export of the same version won the race
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        # Re-exporting an existing version makes it the newest again for pruning
+        os.utime(version_dir)
+
+        meta = {
+            'max_depth': self.max_depth,
+            'n_features': self.n_features,
+            'n_trees': int(self.roots.size),
+            'n_nodes': int(self.feature.size),
+            'version': version,
+            'arrays': version,
+        }
+        temp_path = os.path.join(directory, f'{META_FILE}.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temp_path, os.path.join(directory, META_FILE))
+        self.version = version
+        self._prune(directory, keep)
+
+    @staticmethod
+    def _prune(directory, keep):
+        """Remove all but the newest `keep` version directories"""
+        versions = sorted(
+            (entry for entry in os.scandir(directory)
+             if entry.is_dir() and not entry.name.startswith('.') and os.path.exists(os.path.join(entry.path, ARRAY_NAMES[-1] + '.npy'))),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in versions[keep:]:
+            # Removing mapped files is safe on POSIX; Windows refuses while a worker maps them
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load from an export directory (or its meta.json), memory-mapping the arrays"""
+        directory = os.path.dirname(path) if os.path.basename(path) == META_FILE else path
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        # Exports from before versioned subdirectories kept the arrays next to meta.json
+        array_dir = os.path.join(directory, meta.get('arrays', ''))
+        arrays = {
+            name: np.load(os.path.join(array_dir, f'{name}.npy'), mmap_mode='r' if mmap else None)
+            for name in ARRAY_NAMES
+        }
+        return cls(
+            max_depth=meta['max_depth'],
+            n_features=meta['n_features'],
+            version=meta['version'],
+            **arrays,
+        )
+
+
+def check_parity(model, compact, X, atol=1e-6):
+    """Compare CompactForest against sklearn on X and return the max absolute difference"""
+    expected = model.predict(X)
+    actual = compact.predict(np.asarray(X))
+    max_diff = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    if max_diff > atol:
+        raise ValueError(f"Compact model differs from sklearn by up to {max_diff}")
+    return max_diff
@@ -0,0 +1,131 @@
+import json
+
+import numpy as np
+
+# Shared by temp/train.py and the calculator views, so keep it free of Django imports
+
+# API field -> CSV column, in the column order the model is trained on
+FEATURE_COLUMNS = {
+    'bodyType': 'Body Type',
+    'sex': 'Sex',
+    'diet': 'Diet',
+    'howOftenShower': 'How Often Shower',
+    'heatingEnergySource': 'Heating Energy Source',
+    'transport': 'Transport',
+    'vehicleType': 'Vehicle Type',
+    'socialActivity': 'Social Activity',
+    'monthlyGroceryBill': 'Monthly Grocery Bill',
+    'frequencyOfTravelingByAir': 'Frequency of Traveling by Air',
+    'vehicleMonthlyDistanceKm': 'Vehicle Monthly Distance Km',
+    'wasteBagSize': 'Waste Bag Size',
+    'wasteBagWeeklyCount': 'Waste Bag Weekly Count',
+    'howLongTvpCDailyHour': 'How Long TV PC Daily Hour',
+    'howManyNewClothesMonthly': 'How Many New Clothes Monthly',
+    'howLongInternetDailyHour': 'How Long Internet Daily Hour',
+    'energyEfficiency': 'Energy efficiency',
+    'recycling': 'Recycling_Count',
+    'cookingWith': 'Cooking_Methods_Count',
+}
+
+CATEGORICAL_COLUMNS = ['bodyType', 'sex', 'diet', 'howOftenShower', 'heatingEnergySource',
+                       'transport', 'vehicleType', 'socialActivity', 'frequencyOfTravelingByAir',
+                       'wasteBagSize', 'energyEfficiency']
+
+# Code used for categories that were not present in the training data
+UNKNOWN_CODE = -1
+
+# Marks a field absent from the payload, as opposed to sent as null
+MISSING = object()
+
+NUMERICAL_COLUMNS = ['monthlyGroceryBill', 'vehicleMonthlyDistanceKm', 'wasteBagWeeklyCount',
+                     'howLongTvpCDailyHour', 'howManyNewClothesMonthly', 'howLongInternetDailyHour']
+
+# Feature order of models trained before the encoder was persisted
+LEGACY_FEATURE_ORDER = CATEGORICAL_COLUMNS + NUMERICAL_COLUMNS + ['recycling', 'cookingWith']
+
+
+def normalise_category(value):
+    """Normalise a raw category the same way for training rows and API payloads"""
+    if value is None or value is MISSING or (isinstance(value, float) and np.isnan(value)):
+        # pandas' astype(str) turns missing values into 'nan' during training
+        return 'nan'
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    return str(value).strip().lower()
+
+
+class CategoricalEncoder:
+    """Fitted per-column vocabularies with dictionary lookups for encoding"""
+
+    def __init__(self, vocabularies, feature_order=None):
+        self.vocabularies = {col: list(vocab) for col, vocab in vocabularies.items()}
+        self.feature_order = list(feature_order or FEATURE_COLUMNS)
+        self._lookups = {
+            col: {category: code for code, category in enumerate(vocab)}
+            for col, vocab in self.vocabularies.items()
+        }
+
+    @classmethod
+    def fit(cls, df):
+        """Fit vocabularies from a DataFrame with the CSV column names"""
+        vocabularies = {
+            col: sorted(set(df[FEATURE_COLUMNS[col]].map(normalise_category)))
+            for col in CATEGORICAL_COLUMNS
+        }
+        return cls(vocabularies)
+
+    def encode_values(self, col, values):
+        """Encode an iterable of raw values for one API column"""
+        lookup = self._lookups[col]
+        return np.array([lookup.get(normalise_category(v), UNKNOWN_CODE) for v in values], dtype=np.float64)
+
+    def encode_value(self, col, value):
+        return self._lookups[col].get(normalise_category(value), UNKNOWN_CODE)
+
+    def transform_frame(self, df):
+        """Return a copy of a CSV-shaped DataFrame with its categorical columns encoded"""
+        df = df.copy()
+        for col in CATEGORICAL_COLUMNS:
+            csv_col = FEATURE_COLUMNS[col]
+            df[csv_col] = df[csv_col].map(normalise_category).map(self._lookups[col]).fillna(UNKNOWN_CODE).astype(int)
+        return df
+
+    def training_columns(self):
+        """CSV column names of the model features, in feature order"""
+        return [FEATURE_COLUMNS[col] for col in self.feature_order]
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'vocabularies': self.vocabularies,
+                'feature_order': self.feature_order,
+                'unknown_code': UNKNOWN_CODE,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['vocabularies'], data.get('feature_order'))
+
+
+class LegacyCategoricalEncoder:
+    """
+    The per-request encoding used before vocabularies were persisted, for
+    models trained without carbon_footprint_encoder.json: every category
+    encodes to 0, booleans to 0/1, null to 12.678 and absent fields to 0.
+    """
+
+    feature_order = LEGACY_FEATURE_ORDER
+
+    def encode_value(self, col, value):
+        if value is MISSING:
+            return 0
+        if value is None:
+            return 12.678
+        if isinstance(value, bool):
+            return int(value)
+        return 0
+
+    def encode_values(self, col, values):
+        return np.array([self.encode_value(col, v) for v in values], dtype=np.float64)
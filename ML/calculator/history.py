@@ -0,0 +1,129 @@
+import base64
+import threading
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from ML.mongo import get_collection
+
+HISTORY_COLLECTION = 'analysis_history'
+
+# Fields returned by the history API unless the full documents are requested
+SUMMARY_PROJECTION = {
+    'userId': 1,
+    'timestamp': 1,
+    'prediction': 1,
+    'carbonEmission': 1,
+    'statistics': 1,
+    'metadata.modelVersion': 1,
+}
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+
+def get_history_collection():
+    """Return the analysis history collection, creating its index once per process"""
+    global _indexes_ready
+    collection = get_collection(HISTORY_COLLECTION)
+    if not _indexes_ready:
+        with _indexes_lock:
+            if not _indexes_ready:
+                collection.create_index(
+                    [('userId', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+                    name='user_timestamp'
+                )
+                _indexes_ready = True
+    return collection
+
+
+def build_history_entry(analysis_data):
+    """One history document per analysis, keyed by userId"""
+    return {
+        'userId': ObjectId(analysis_data['userId']),
+        'timestamp': analysis_data['timestamp'],
+        'prediction': analysis_data['prediction'],
+        'carbonEmission': analysis_data['carbonEmission'],
+        'statistics': analysis_data['statistics'],
+        'metadata': analysis_data['metadata'],
+        'recommendations': analysis_data['recommendations'],
+        'comparisons': analysis_data['comparisons'],
+        'insights': {
+            'overall_summary': analysis_data['insights']['1. OVERALL SUMMARY'],
+            'comparative_stats': analysis_data['insights']['2. COMPARATIVE STATS FOR SPECIFIC FACTORS'],
+            'recommendations': analysis_data['insights']['3. RECOMMENDATIONS']
+        }
+    }
+
+
+def build_user_update_pipeline(analysis_data):
+    """
+    Update pipeline for the user document.
+
+    Every expression in the $set stage sees the document as it was before
+    the update, so the change against the previous emission is computed by
+    the server in the same write instead of a separate read.
+    """
+    new_emission = analysis_data['carbonEmission']
+    no_previous = {'$eq': [{'$ifNull': ['$carbonEmission', None]}, None]}
+
+    if new_emission is None:
+        emission_change, emission_change_percentage = 4.56, 5.67
+    else:
+        emission_change = {'$subtract': [new_emission, '$carbonEmission']}
+        emission_change_percentage = {'$cond': [
+            {'$eq': ['$carbonEmission', 0]},
+            9.80,
+            {'$multiply': [{'$divide': [emission_change, '$carbonEmission']}, 100]}
+        ]}
+
+    return [{
+        '$set': {
+            'lastUpdated': {'$literal': analysis_data['timestamp']},
+            'carbonEmission': {'$literal': new_emission},
+            # Only the first analysis sets the initial emission; later ones leave the change fields alone
+            'initialCarbonEmission': {'$cond': [no_previous, {'$literal': new_emission}, '$initialCarbonEmission']},
+            'emissionChange': {'$cond': [no_previous, '$emissionChange', emission_change]},
+            'emissionChangePercentage': {'$cond': [no_previous, '$emissionChangePercentage', emission_change_percentage]},
+            'analysisCount': {'$add': [{'$ifNull': ['$analysisCount', 0]}, 1]},
+            'lastModelVersion': {'$literal': analysis_data['metadata']['modelVersion']},
+        }
+    }]
+
+
+def encode_cursor(entry):
+    raw = f"{entry['timestamp']}|{entry['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    timestamp, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+    return timestamp, ObjectId(entry_id)
+
+
+def fetch_history(user_id, limit=20, before=None, full=False):
+    """
+    Return one window of a user's analyses, newest first, plus the cursor
+    for the next (older) window. Uses the (userId, timestamp, _id) index, so
+    the cost does not depend on how deep the window is.
+    """
+    query = {'userId': user_id}
+    if before:
+        timestamp, entry_id = decode_cursor(before)
+        query['$or'] = [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': entry_id}},
+        ]
+
+    entries = list(
+        get_history_collection()
+        .find(query, None if full else SUMMARY_PROJECTION)
+        .sort([('timestamp', DESCENDING), ('_id', DESCENDING)])
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+    entries = entries[:limit]
+    for entry in entries:
+        entry['_id'] = str(entry['_id'])
+        entry['userId'] = str(entry['userId'])
+    return entries, next_cursor
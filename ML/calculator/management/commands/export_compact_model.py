@@ -0,0 +1,40 @@
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from calculator.compact_forest import CompactForest, check_parity
+from calculator.views import COMPACT_MODEL_DIR, MODEL_PATH
+
+
+class Command(BaseCommand):
+    help = 'Export the RandomForest pickle to memory-mappable arrays and check prediction parity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=MODEL_PATH, help='Path of the sklearn model pickle')
+        parser.add_argument('--output', default=COMPACT_MODEL_DIR, help='Directory to write the compact model to')
+        parser.add_argument('--samples', type=int, default=1000, help='Random rows used for the parity check')
+
+    def handle(self, *args, **options):
+        model = joblib.load(options['model'])
+        compact = CompactForest.from_sklearn(model)
+
+        # Random rows spanning the range of every split threshold
+        rng = np.random.default_rng(42)
+        low = np.full(compact.n_features, -1.0)
+        high = np.full(compact.n_features, 1.0)
+        for f in range(compact.n_features):
+            thresholds = compact.threshold[(compact.feature == f) & (compact.left != np.arange(compact.feature.size))]
+            if thresholds.size:
+                low[f], high[f] = thresholds.min() - 1, thresholds.max() + 1
+        X = rng.uniform(low, high, size=(options['samples'], compact.n_features))
+
+        try:
+            max_diff = check_parity(model, compact, X)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        compact.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {compact.roots.size} trees ({compact.feature.size} nodes) to {options['output']} "
+            f"as version {compact.version}, max parity difference {max_diff:.2e}"
+        ))
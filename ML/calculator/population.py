@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+# Map user data keys to CSV columns
+COLUMN_MAPPING = {
+    'monthlyGroceryBill': 'Monthly Grocery Bill',
+    'vehicleMonthlyDistanceKm': 'Vehicle Monthly Distance Km',
+    'wasteBagWeeklyCount': 'Waste Bag Weekly Count',
+    'howLongTvpCDailyHour': 'How Long TV PC Daily Hour',
+    'howManyNewClothesMonthly': 'How Many New Clothes Monthly'
+}
+
+EMISSION_COLUMN = 'CarbonEmission'
+
+
+class ColumnStats:
+    """Sorted, NaN-free values of one population column with cached moments"""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.sorted_values = np.sort(values[~np.isnan(values)])
+        self.size = int(self.sorted_values.size)
+        self.mean = float(np.mean(self.sorted_values)) if self.size else None
+        self.std = float(np.std(self.sorted_values)) if self.size else None
+
+    def percentile_ranks(self, values):
+        """Share of the population strictly below each value, in percent (O(log n) each)"""
+        values = np.asarray(values, dtype=np.float64)
+        below = np.searchsorted(self.sorted_values, values, side='left')
+        return np.round(below / self.size * 100, 2)
+
+    def percentile_rank(self, value):
+        if value is None or not self.size:
+            return None
+        return float(self.percentile_ranks([value])[0])
+
+
+class PopulationStatsIndex:
+    """Precomputed statistics over Carbon Emission.csv used by the insights"""
+
+    def __init__(self, df):
+        self.row_count = len(df)
+        self.emissions = ColumnStats(df[EMISSION_COLUMN].values)
+        self.columns = {
+            user_key: ColumnStats(df[csv_col].values)
+            for user_key, csv_col in COLUMN_MAPPING.items()
+        }
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        return cls(pd.read_csv(csv_path, usecols=[EMISSION_COLUMN, *COLUMN_MAPPING.values()]))
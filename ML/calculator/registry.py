@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from ML.model_cache import rss_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactRegistry:
+    """
+    Process-wide holder for an artifact loaded from disk (model, dataset index, ...).
+
+    The artifact is loaded once per worker and shared by every request. The
+    backing file is re-checked at most every `check_interval` seconds; when its
+    mtime/size changed and the content hash differs, the new artifact is loaded
+    outside the lock and swapped in atomically, so in-flight requests keep
+    using the object they already hold.
+    """
+
+    def __init__(self, name, path, loader, check_interval=30.0):
+        self.name = name
+        self.path = os.path.normpath(path)
+        self.loader = loader
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._artifact = None
+        self._info = None
+        self._stat_key = None
+        self._last_check = 0.0
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self, stat_key, version=None):
+        """
+        Load the artifact and collect load time, version and memory footprint.
+        version is the file's content hash when the caller already computed it.
+        """
+        version = version or file_fingerprint(self.path)[:12]
+
+        # RSS is per process, so concurrent loads in other threads can inflate the delta
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        artifact = self.loader(self.path)
+        load_seconds = time.perf_counter() - started
+        rss_after = rss_bytes()
+
+        info = {
+            'name': self.name,
+            'path': self.path,
+            'version': version,
+            'loadedAt': datetime.now().isoformat(),
+            'loadTimeMs': round(load_seconds * 1000, 2),
+            'rssDeltaBytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'fileSizeBytes': stat_key[1],
+        }
+        logger.info(f"Loaded {self.name} version {version} in {info['loadTimeMs']} ms")
+        return artifact, info
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._artifact is not None and now - self._last_check < self.check_interval:
+            return
+
+        stat_key = self._stat()
+        with self._lock:
+            self._last_check = now
+            unchanged = stat_key == self._stat_key and self._artifact is not None
+        if unchanged and not force:
+            return
+
+        version = None
+        if not force and self._info is not None:
+            version = file_fingerprint(self.path)[:12]
+            if version == self._info['version']:
+                # Touched but identical content, nothing to swap
+                with self._lock:
+                    self._stat_key = stat_key
+                return
+
+        with self._load_lock:
+            # Another thread may have loaded this exact file while we waited
+            if not force and stat_key == self._stat_key and self._artifact is not None:
+                return
+            artifact, info = self._load(stat_key, version)
+            with self._lock:
+                self._artifact = artifact
+                self._info = info
+                self._stat_key = stat_key
+
+    def get(self):
+        """Return (artifact, info), loading or hot-swapping it if needed"""
+        try:
+            self._refresh()
+        except Exception as e:
+            # A missing, half-written or corrupt new file must not take down a loaded artifact
+            if self._artifact is None:
+                raise
+            logger.error(f"Could not reload {self.path}, serving cached {self.name}: {str(e)}")
+        with self._lock:
+            return self._artifact, dict(self._info)
+
+    def reload(self):
+        """Force a reload from disk regardless of mtime"""
+        self._refresh(force=True)
+        return self.info()
+
+    def info(self):
+        with self._lock:
+            return dict(self._info) if self._info else None
@@ -1,3 +1,368 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import mongomock
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder
+
+from .compact_forest import CompactForest, check_parity
+from .encoding import (
+    CATEGORICAL_COLUMNS, FEATURE_COLUMNS, MISSING, UNKNOWN_CODE, CategoricalEncoder, LegacyCategoricalEncoder,
+    normalise_category
+)
+from .population import COLUMN_MAPPING, EMISSION_COLUMN, PopulationStatsIndex
+from .registry import ArtifactRegistry
+from .views import analysis_history, analyze_carbon_footprint_batch, generate_insights_batch
+
+
+class CompactForestTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(300, 6))
+        y = self.X[:, 0] * 3 + np.sin(self.X[:, 1]) - self.X[:, 2] ** 2
+        self.model = RandomForestRegressor(n_estimators=8, max_depth=6, random_state=0).fit(self.X, y)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_predict_matches_sklearn(self):
+        compact = CompactForest.from_sklearn(self.model)
+        self.assertLessEqual(check_parity(self.model, compact, self.X), 1e-6)
+
+    def test_saved_model_matches_sklearn_with_and_without_mmap(self):
+        CompactForest.from_sklearn(self.model).save(self.directory.name)
+        expected = self.model.predict(self.X)
+        for mmap in (True, False):
+            with self.subTest(mmap=mmap):
+                loaded = CompactForest.load(self.directory.name, mmap=mmap)
+                np.testing.assert_allclose(loaded.predict(self.X), expected, atol=1e-6)
+
+    def test_resave_leaves_mapped_export_intact(self):
+        CompactForest.from_sklearn(self.model).save(self.directory.name)
+        mapped = CompactForest.load(self.directory.name, mmap=True)
+        before = mapped.predict(self.X)
+
+        other = RandomForestRegressor(n_estimators=4, max_depth=4, random_state=1).fit(self.X, -self.X[:, 3])
+        CompactForest.from_sklearn(other).save(self.directory.name)
+
+        np.testing.assert_array_equal(mapped.predict(self.X), before)
+        reloaded = CompactForest.load(self.directory.name)
+        self.assertNotEqual(reloaded.version, mapped.version)
+        np.testing.assert_allclose(reloaded.predict(self.X), other.predict(self.X), atol=1e-6)
+
+
+class AnalysisHistoryViewTests(SimpleTestCase):
+    def setUp(self):
+        self.user_id = ObjectId()
+        self.collection = mongomock.MongoClient().db.analysis_history
+        self.collection.insert_many([
+            {
+                'userId': self.user_id,
+                'timestamp': f'2024-01-0{day}T00:00:00',
+                'prediction': 100.0 + day,
+                'carbonEmission': 100.0 + day,
+                'statistics': {},
+                'metadata': {'modelVersion': 'v1'},
+                'recommendations': ['walk more'],
+                'insights': {'overall_summary': 'summary'},
+            }
+            for day in range(1, 4)
+        ])
+        patcher = mock.patch('calculator.history.get_history_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        request = APIRequestFactory().get('/analysis-history/', params)
+        response = analysis_history(request, str(self.user_id))
+        return response.status_code, json.loads(response.content)
+
+    def test_summary_mode_projects_summary_fields(self):
+        status, body = self.get(limit=2)
+        self.assertEqual(status, 200)
+        self.assertEqual(body['count'], 2)
+        self.assertIsNotNone(body['next_cursor'])
+        for entry in body['analyses']:
+            self.assertEqual(entry['userId'], str(self.user_id))
+            self.assertNotIn('recommendations', entry)
+            self.assertNotIn('insights', entry)
+        self.assertEqual([entry['carbonEmission'] for entry in body['analyses']], [103.0, 102.0])
+
+        status, body = self.get(limit=2, before=body['next_cursor'])
+        self.assertEqual(status, 200)
+        self.assertEqual([entry['carbonEmission'] for entry in body['analyses']], [101.0])
+
+    def test_full_mode_returns_whole_documents(self):
+        status, body = self.get(fields='full')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['count'], 3)
+        self.assertEqual(body['analyses'][0]['recommendations'], ['walk more'])
+
+
+class ArtifactRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'artifact.txt')
+        self.write('v1')
+        self.loads = []
+        # check_interval=0 re-checks the file on every get
+        self.registry = ArtifactRegistry('artifact', self.path, self.load, check_interval=0)
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as f:
+            content = f.read()
+        if content == 'corrupt':
+            raise ValueError('Unreadable artifact')
+        self.loads.append(content)
+        return content
+
+    def write(self, content):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        self.bump_mtime()
+
+    def bump_mtime(self):
+        # Filesystem mtime resolution can be coarse, so move it forward explicitly
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_loads_once(self):
+        for _ in range(3):
+            artifact, info = self.registry.get()
+        self.assertEqual(artifact, 'v1')
+        self.assertEqual(self.loads, ['v1'])
+        self.assertEqual(info['fileSizeBytes'], 2)
+
+    def test_swaps_when_content_changes(self):
+        _, before = self.registry.get()
+        self.write('v2 with more bytes')
+
+        artifact, after = self.registry.get()
+
+        self.assertEqual(artifact, 'v2 with more bytes')
+        self.assertEqual(self.loads, ['v1', 'v2 with more bytes'])
+        self.assertNotEqual(after['version'], before['version'])
+
+    def test_touched_file_is_not_reloaded(self):
+        _, before = self.registry.get()
+        self.bump_mtime()
+
+        artifact, after = self.registry.get()
+
+        self.assertEqual(artifact, 'v1')
+        self.assertEqual(self.loads, ['v1'])
+        self.assertEqual(after['loadedAt'], before['loadedAt'])
+
+    def test_failed_reload_keeps_serving_cached_artifact(self):
+        self.registry.get()
+        self.write('corrupt')
+
+        with self.assertLogs('calculator.registry', level='ERROR'):
+            artifact, _ = self.registry.get()
+
+        self.assertEqual(artifact, 'v1')
+
+
+class ConstantModel:
+    def predict(self, X):
+        return np.full(len(X), 1500.0)
+
+
+class BatchAnalysisViewTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        population = PopulationStatsIndex(pd.DataFrame({
+            column: rng.uniform(0, 3000, size=50) for column in [EMISSION_COLUMN, *COLUMN_MAPPING.values()]
+        }))
+        client = mongomock.MongoClient()
+        self.users, self.history = client.db.users, client.db.analysis_history
+        patches = [
+            mock.patch('calculator.views.load_model', return_value=(ConstantModel(), {'version': 'v1', 'loadedAt': 'now'})),
+            mock.patch('calculator.views.load_encoder', return_value=LegacyCategoricalEncoder()),
+            mock.patch('calculator.views.load_csv_data', return_value=population),
+            mock.patch('calculator.views.get_db_connection', return_value=self.users),
+            mock.patch('calculator.views.get_history_collection', return_value=self.history),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user_ids = [str(ObjectId()) for _ in range(3)]
+
+    def post(self, body, content_type='application/json', **params):
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        request = APIRequestFactory().post(f'/analyze-carbon-footprint/batch/?{query}', body, content_type=content_type)
+        response = analyze_carbon_footprint_batch(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_bad_ndjson_line_fails_only_its_index(self):
+        lines = [json.dumps({'_id': self.user_ids[0]}), '{not json', json.dumps({'_id': self.user_ids[1]})]
+
+        status, body = self.post('\n'.join(lines), content_type='application/x-ndjson', store='false')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['failed'], 1)
+        self.assertEqual([result['index'] for result in body['results']], [0, 1, 2])
+        self.assertIn('Invalid JSON', body['results'][1]['error'])
+        self.assertEqual(body['results'][2]['userId'], self.user_ids[1])
+
+    def test_summary_and_full_detail(self):
+        users = [{'_id': user_id} for user_id in self.user_ids]
+
+        _, summary = self.post(json.dumps(users), store='false')
+        _, full = self.post(json.dumps({'users': users}), store='false', detail='full')
+
+        self.assertEqual(
+            set(summary['results'][0]),
+            {'index', 'userId', 'carbonEmission', 'statistics', 'stored', 'modelVersion'}
+        )
+        self.assertIn('insights', full['results'][0])
+        self.assertIn('recommendations', full['results'][0])
+        self.assertEqual([result['carbonEmission'] for result in full['results']], [1500.0] * 3)
+
+    def test_store_false_writes_nothing(self):
+        status, body = self.post(json.dumps([{'_id': user_id} for user_id in self.user_ids]), store='false')
+
+        self.assertEqual(status, 200)
+        self.assertFalse(any(result['stored'] for result in body['results']))
+        self.assertEqual(self.users.count_documents({}), 0)
+        self.assertEqual(self.history.count_documents({}), 0)
+
+    def test_scalar_body_is_rejected(self):
+        for body in ('42', '"users"', '{"users": 3}'):
+            with self.subTest(body=body):
+                status, _ = self.post(body)
+                self.assertEqual(status, 400)
+
+
+def legacy_percentile_rank(value, population_values):
+    """The per-request percentile rank the population index replaced"""
+    return round(np.sum(population_values < value) / population_values.size * 100, 2)
+
+
+def legacy_insights(user_data, prediction, csv_data):
+    """Summary and factor stats as computed per request from the DataFrame before the index"""
+    carbon_emissions = csv_data[EMISSION_COLUMN].dropna().values
+    mean_emission = np.mean(carbon_emissions)
+    std_emission = np.std(carbon_emissions)
+    factors = {}
+    for user_key, csv_col in COLUMN_MAPPING.items():
+        population_values = csv_data[csv_col].dropna().values
+        value = user_data.get(user_key, 0)
+        if value is None:
+            factors[user_key.lower()] = {'percentile': 20.98, 'population_mean': 15.498, 'difference_from_mean': 15.3267}
+            continue
+        factors[user_key.lower()] = {
+            'percentile': legacy_percentile_rank(value, population_values),
+            'population_mean': round(float(np.mean(population_values)), 2),
+            'difference_from_mean': round(float(value - np.mean(population_values)), 2),
+        }
+    return {
+        'percentile_rank': float(legacy_percentile_rank(prediction, carbon_emissions)),
+        'comparison_to_mean': float((prediction - mean_emission) / mean_emission * 100),
+        'standard_deviations_from_mean': float((prediction - mean_emission) / std_emission),
+        'population_statistics': {
+            'mean': float(mean_emission), 'std_dev': float(std_emission), 'sample_size': len(carbon_emissions)
+        },
+        'factors': factors,
+    }
+
+
+class PopulationIndexParityTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        columns = {column: rng.integers(0, 40, size=200).astype(float) for column in COLUMN_MAPPING.values()}
+        columns[EMISSION_COLUMN] = rng.normal(2200, 600, size=200).round(1)
+        df = pd.DataFrame(columns)
+        # Missing values, which both paths drop
+        df.iloc[::17, :] = np.nan
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = os.path.join(directory.name, 'population.csv')
+        df.to_csv(self.csv_path, index=False)
+
+    def test_index_matches_per_request_pandas_path(self):
+        csv_data = pd.read_csv(self.csv_path)
+        population = PopulationStatsIndex.from_csv(self.csv_path)
+        records = [
+            {'monthlyGroceryBill': 12, 'vehicleMonthlyDistanceKm': 0.5, 'wasteBagWeeklyCount': 39},
+            {'monthlyGroceryBill': None, 'howLongTvpCDailyHour': 20, 'howManyNewClothesMonthly': -3},
+            {'vehicleMonthlyDistanceKm': 1e6, 'wasteBagWeeklyCount': 7.0},
+        ]
+        # Includes a prediction that ties with a population value
+        predictions = [1500.0, float(csv_data[EMISSION_COLUMN].dropna().iloc[5]), 3400.0]
+
+        insights = generate_insights_batch(records, predictions, population)
+
+        for record, prediction, insight in zip(records, predictions, insights):
+            expected = legacy_insights(record, prediction, csv_data)
+            summary = insight['1. OVERALL SUMMARY']
+            self.assertEqual(summary['percentile_rank'], expected['percentile_rank'])
+            self.assertAlmostEqual(summary['comparison_to_mean'], expected['comparison_to_mean'], places=9)
+            self.assertAlmostEqual(
+                summary['standard_deviations_from_mean'], expected['standard_deviations_from_mean'], places=9
+            )
+            statistics, expected_statistics = summary['population_statistics'], expected['population_statistics']
+            self.assertEqual(statistics['sample_size'], expected_statistics['sample_size'])
+            self.assertAlmostEqual(statistics['mean'], expected_statistics['mean'], places=9)
+            self.assertAlmostEqual(statistics['std_dev'], expected_statistics['std_dev'], places=9)
+            self.assertEqual(insight['2. COMPARATIVE STATS FOR SPECIFIC FACTORS'], expected['factors'])
+
+
+class CategoricalEncoderTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        choices = {
+            'diet': ['Omnivore', 'vegan', 'Vegetarian', 'pescatarian'],
+            'vehicleType': ['petrol', 'Diesel', 'electric', np.nan],
+            'energyEfficiency': ['Yes', 'No', 'Sometimes'],
+        }
+        self.df = pd.DataFrame({
+            FEATURE_COLUMNS[col]: rng.choice(np.array(choices.get(col, ['a', 'B', ' c ']), dtype=object), size=40)
+            for col in CATEGORICAL_COLUMNS
+        })
+        self.encoder = CategoricalEncoder.fit(self.df)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'encoder.json')
+
+    def test_save_load_round_trip(self):
+        self.encoder.save(self.path)
+        loaded = CategoricalEncoder.load(self.path)
+
+        self.assertEqual(loaded.vocabularies, self.encoder.vocabularies)
+        self.assertEqual(loaded.feature_order, self.encoder.feature_order)
+        values = ['vegan', 'OMNIVORE', 'keto', None, MISSING]
+        np.testing.assert_array_equal(loaded.encode_values('diet', values), self.encoder.encode_values('diet', values))
+
+    def test_unknown_and_missing_categories(self):
+        self.assertEqual(self.encoder.encode_value('diet', 'keto'), UNKNOWN_CODE)
+        # Absent and null both encode like the NaN the training frame had, when it had one
+        nan_code = self.encoder.vocabularies['vehicleType'].index('nan')
+        self.assertEqual(self.encoder.encode_value('vehicleType', MISSING), nan_code)
+        self.assertEqual(self.encoder.encode_value('vehicleType', None), nan_code)
+        self.assertEqual(self.encoder.encode_value('diet', MISSING), UNKNOWN_CODE)
+
+    def test_known_categories_match_label_encoder_fitted_on_the_column(self):
+        encoded = self.encoder.transform_frame(self.df)
+        for col in CATEGORICAL_COLUMNS:
+            with self.subTest(col=col):
+                normalised = self.df[FEATURE_COLUMNS[col]].map(normalise_category)
+                expected = LabelEncoder().fit_transform(normalised)
+                np.testing.assert_array_equal(encoded[FEATURE_COLUMNS[col]].values, expected)
+                np.testing.assert_array_equal(self.encoder.encode_values(col, self.df[FEATURE_COLUMNS[col]]), expected)
+
+    def test_legacy_encoder_matches_per_request_label_encoder(self):
+        legacy = LegacyCategoricalEncoder()
+        for value in ['Omnivore', 'vegan', 'Yes']:
+            # The old request path fitted a fresh LabelEncoder on the single value
+            self.assertEqual(legacy.encode_value('diet', value), LabelEncoder().fit_transform([str(value)])[0])
+        self.assertEqual(legacy.encode_value('energyEfficiency', True), 1)
+        self.assertEqual(legacy.encode_value('diet', None), 12.678)
+        self.assertEqual(legacy.encode_value('diet', MISSING), 0)
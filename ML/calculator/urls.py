@@ -3,4 +3,7 @@ from . import views
 
 urlpatterns = [
     path('analyze-carbon-footprint/', views.analyze_carbon_footprint, name='analyze_carbon_footprint'),
+    path('analyze-carbon-footprint/batch/', views.analyze_carbon_footprint_batch, name='analyze_carbon_footprint_batch'),
+    path('analysis-history/<str:user_id>/', views.analysis_history, name='analysis_history'),
+    path('model-status/', views.model_status, name='model_status'),
 ]
\ No newline at end of file
@@ -7,25 +7,46 @@ import joblib
 from bson import ObjectId
 from bson.errors import InvalidId
 import json
+import logging
 import traceback
 from datetime import datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import UpdateOne
 import os
 
+from ML.mongo import get_collection
+
+from .compact_forest import META_FILE, CompactForest
+from .encoding import (
+    CATEGORICAL_COLUMNS, MISSING, NUMERICAL_COLUMNS, CategoricalEncoder, LegacyCategoricalEncoder
+)
+from .history import build_history_entry, build_user_update_pipeline, fetch_history, get_history_collection
+from .population import COLUMN_MAPPING, PopulationStatsIndex
+from .registry import ArtifactRegistry
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
 def get_db_connection():
-    """Establish connection to MongoDB"""
-    client = MongoClient(os.getenv('DATABASE_URL'))
-    db2 = client['Techonovate']
-    db = db2['users']
-    return db
+    """Return the users collection on the shared, pooled MongoDB client"""
+    return get_collection('users')
+
+CSV_PATH = os.getenv('CARBON_CSV_PATH', 'C:/Users/vinay/Desktop/technovate/Technovate/Carbon Emission.csv')
+
+# Population statistics are built once per worker and rebuilt only when the CSV changes
+population_registry = ArtifactRegistry(
+    'population_stats',
+    CSV_PATH,
+    loader=PopulationStatsIndex.from_csv,
+    check_interval=float(os.getenv('CARBON_CSV_CHECK_INTERVAL', '300')),
+)
 
-def load_csv_data(csv_path='C:/Users/vinay/Desktop/technovate/Technovate/Carbon Emission.csv'):
-    """Load and return the CSV data"""
-    return pd.read_csv(csv_path)
+def load_csv_data():
+    """Return the shared population statistics index for the CSV data"""
+    population, _ = population_registry.get()
+    return population
 
 def convert_to_python_types(obj):
     """Convert NumPy types to Python native types"""
@@ -41,121 +62,147 @@ def convert_to_python_types(obj):
         return [convert_to_python_types(item) for item in obj]
     return obj
 
-def load_model(model_path='C:/Users/vinay/Desktop/technovate/Technovate/temp/carbon_footprint_model.pkl'):
-    """Load the trained model"""
-    import os
-    model_path = os.path.normpath(model_path)
-    return joblib.load(model_path)
+MODEL_PATH = os.getenv('CARBON_MODEL_PATH', 'C:/Users/vinay/Desktop/technovate/Technovate/temp/carbon_footprint_model.pkl')
 
-def preprocess_data(data):
-    """Preprocess single user data for model prediction"""
-    from sklearn.preprocessing import LabelEncoder
-    
-    categorical_cols = ['bodyType', 'sex', 'diet', 'howOftenShower', 'heatingEnergySource',
-                       'transport', 'vehicleType', 'socialActivity', 'frequencyOfTravelingByAir',
-                       'wasteBagSize', 'energyEfficiency']
-    
-    processed_data = {}
-    le = LabelEncoder()
+COMPACT_MODEL_DIR = os.getenv('CARBON_COMPACT_MODEL_DIR', os.path.join(os.path.dirname(MODEL_PATH), 'carbon_footprint_model_compact'))
+
+# 'compact' serves the memory-mapped export, 'pickle' the sklearn model, 'auto' the export when present
+MODEL_FORMAT = os.getenv('CARBON_MODEL_FORMAT', 'auto')
+if MODEL_FORMAT == 'compact' or (MODEL_FORMAT == 'auto' and os.path.exists(os.path.join(COMPACT_MODEL_DIR, META_FILE))):
+    model_source, model_loader = os.path.join(COMPACT_MODEL_DIR, META_FILE), CompactForest.load
+else:
+    model_source, model_loader = MODEL_PATH, joblib.load
+
+# Loaded once per worker and hot-swapped when the model on disk changes
+model_registry = ArtifactRegistry(
+    'carbon_footprint_model',
+    model_source,
+    loader=model_loader,
+    check_interval=float(os.getenv('CARBON_MODEL_CHECK_INTERVAL', '30')),
+)
+
+def load_model():
+    """Return the shared trained model and its registry info"""
+    return model_registry.get()
+
+ENCODER_PATH = os.getenv('CARBON_ENCODER_PATH', os.path.join(os.path.dirname(MODEL_PATH), 'carbon_footprint_encoder.json'))
+
+# Category vocabularies fitted by temp/train.py, saved next to the model
+encoder_registry = ArtifactRegistry(
+    'carbon_footprint_encoder',
+    ENCODER_PATH,
+    loader=CategoricalEncoder.load,
+    check_interval=float(os.getenv('CARBON_MODEL_CHECK_INTERVAL', '30')),
+)
+
+legacy_encoder = LegacyCategoricalEncoder()
+_legacy_encoder_warned = False
+
+def load_encoder():
+    """
+    Return the shared fitted categorical encoder. Models trained before the
+    encoder was saved have no encoder file; they keep the legacy encoding
+    until temp/train.py is re-run.
+    """
+    global _legacy_encoder_warned
+    try:
+        encoder, _ = encoder_registry.get()
+    except FileNotFoundError:
+        if not _legacy_encoder_warned:
+            logger.warning(f"{ENCODER_PATH} not found, using the legacy categorical encoding. "
+                           f"Re-run temp/train.py to save the encoder with the model.")
+            _legacy_encoder_warned = True
+        return legacy_encoder
+    return encoder
+
+# Array fields and the default count used when they are sent as null
+ARRAY_COLS = {'recycling': 3.49, 'cookingWith': 2.98}
+
+def _numerical_feature(value):
+    if value is None:
+        return 20.497
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 13.67
+
+def preprocess_batch(records, encoder=None):
+    """Preprocess many user records into one feature matrix for model prediction"""
+    if encoder is None:
+        encoder = load_encoder()
+    columns = {}
     
-    # Process categorical columns
-    for col in categorical_cols:
-        if col in data:
-            value = data[col]
-            if value is None:
-                processed_data[col] = 12.678
-            elif isinstance(value, bool):
-                processed_data[col] = int(value)
-            else:
-                processed_data[col] = le.fit_transform([str(value)])[0]
+    # Process categorical columns with the vocabularies fitted at training time
+    for col in CATEGORICAL_COLUMNS:
+        columns[col] = encoder.encode_values(col, [r.get(col, MISSING) for r in records])
     
     # Process numerical columns
-    numerical_cols = ['monthlyGroceryBill', 'vehicleMonthlyDistanceKm', 'wasteBagWeeklyCount',
-                     'howLongTvpCDailyHour', 'howManyNewClothesMonthly', 'howLongInternetDailyHour']
-    
-    for col in numerical_cols:
-        if col in data:
-            value = data[col]
-            if value is None:
-                processed_data[col] = 20.497
-            else:
-                try:
-                    processed_data[col] = float(value)
-                except (ValueError, TypeError):
-                    processed_data[col] = 13.67
+    for col in NUMERICAL_COLUMNS:
+        columns[col] = [_numerical_feature(r[col]) if col in r else 0 for r in records]
     
     # Process array fields
-    if 'recycling' in data:
-        recycling_data = data['recycling']
-        processed_data['recycling_count'] = len(recycling_data) if recycling_data is not None else 3.49
-    
-    if 'cookingWith' in data:
-        cooking_data = data['cookingWith']
-        processed_data['cooking_methods_count'] = len(cooking_data) if cooking_data is not None else 2.98
+    for col, default in ARRAY_COLS.items():
+        columns[col] = [
+            (len(r[col]) if r[col] is not None else default) if col in r else 0
+            for r in records
+        ]
     
-    # Ensure consistent order of features
-    all_features = categorical_cols + numerical_cols + ['recycling_count', 'cooking_methods_count']
-    ordered_data = [processed_data.get(feature, 0) for feature in all_features]
-    
-    return ordered_data
+    # Ensure the same feature order as the training data
+    return np.array([columns[col] for col in encoder.feature_order], dtype=np.float64).T
 
-def calculate_stats(value, population_values):
-    """Calculate statistical metrics for a value compared to population"""
-    # Convert population_values to numpy array if it isn't already
-    population_values = np.array(population_values)
-    
-    # Check if value is None or if population is empty
-    if value is None or population_values.size == 0:
-        return {
+def preprocess_data(data, encoder=None):
+    """Preprocess single user data for model prediction"""
+    return preprocess_batch([data], encoder)[0].tolist()
+
+def calculate_stats_batch(values, column_stats):
+    """Calculate statistical metrics for many values compared to one population column"""
+    # Check if population is empty
+    if column_stats.size == 0:
+        return [{
             'percentile': 20.98,
                 'population_mean': 15.498,
                 'difference_from_mean': 15.3267
-        }
+        } for _ in values]
     
-    try:
-        # Handle NaN values in population
-        valid_population = population_values[~np.isnan(population_values)]
-        
-        if valid_population.size == 0:
-            return {
+    numeric = np.full(len(values), np.nan)
+    valid = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            numeric[i] = float(value)
+            valid[i] = True
+        except (TypeError, ValueError):
+            continue
+    
+    # One vectorised binary search for every value
+    percentiles = column_stats.percentile_ranks(numeric)
+    differences = numeric - column_stats.mean
+    population_mean = round(column_stats.mean, 2)
+    
+    results = []
+    for i, value in enumerate(values):
+        if value is None:
+            results.append({
                 'percentile': 20.98,
                 'population_mean': 15.498,
                 'difference_from_mean': 15.3267
-            }
-        
-        percentile = calculate_percentile_rank(value, valid_population)
-        population_mean = float(np.mean(valid_population))
-        difference_from_mean = float(value - population_mean)
-        
-        return {
-            'percentile': round(percentile, 2) if percentile is not None else None,
-            'population_mean': round(population_mean, 2),
-            'difference_from_mean': round(difference_from_mean, 2)
-        }
-    except (TypeError, ZeroDivisionError):
-        return {
-            'percentile': None,
-            'population_mean': None,
-            'difference_from_mean': None
-        }
+            })
+        elif not valid[i]:
+            results.append({
+                'percentile': None,
+                'population_mean': None,
+                'difference_from_mean': None
+            })
+        else:
+            results.append({
+                'percentile': float(percentiles[i]),
+                'population_mean': population_mean,
+                'difference_from_mean': round(float(differences[i]), 2)
+            })
+    return results
 
-def calculate_percentile_rank(value, population_values):
-    """Calculate percentile rank of a value within a population"""
-    if value is None:
-        return None
-    
-    # Convert to numpy array and handle NaN values
-    population_values = np.array(population_values)
-    valid_population = population_values[~np.isnan(population_values)]
-    
-    if valid_population.size == 0:
-        return None
-    
-    try:
-        result = np.sum(valid_population < value) / valid_population.size * 100
-        return round(result, 2)
-    except TypeError:
-        return None
+def calculate_stats(value, column_stats):
+    """Calculate statistical metrics for a value compared to a population column"""
+    return calculate_stats_batch([value], column_stats)[0]
 
 def get_emission_category(prediction):
     """Determine emission category based on prediction value"""
@@ -282,116 +329,70 @@ def generate_detailed_recommendations(user_data):
     
     return recommendations
 
-def generate_insights_from_csv(user_data, prediction, csv_data):
-    """Generate comprehensive insights using CSV data"""
+def generate_insights_batch(records, predictions, population):
+    """Generate comprehensive insights for many users at once using the CSV population index"""
+    predictions = np.asarray(predictions, dtype=np.float64)
     
-    # Map user data keys to CSV columns
-    column_mapping = {
-        'monthlyGroceryBill': 'Monthly Grocery Bill',
-        'vehicleMonthlyDistanceKm': 'Vehicle Monthly Distance Km',
-        'wasteBagWeeklyCount': 'Waste Bag Weekly Count',
-        'howLongTvpCDailyHour': 'How Long TV PC Daily Hour',
-        'howManyNewClothesMonthly': 'How Many New Clothes Monthly'
-    }
+    # Overall statistics come from the cached carbon emission column
+    emissions = population.emissions
+    mean_emission = emissions.mean
+    std_emission = emissions.std
+    percentile_ranks = emissions.percentile_ranks(predictions)
+    if mean_emission != 0:
+        diff_from_mean_percent = (predictions - mean_emission) / mean_emission * 100
+    else:
+        diff_from_mean_percent = np.full(predictions.shape, 4.56)
+    if std_emission != 0:
+        std_from_mean = (predictions - mean_emission) / std_emission
+    else:
+        std_from_mean = np.full(predictions.shape, 7.89)
     
-    # Calculate overall statistics using carbon emissions from CSV
-    carbon_emissions = csv_data['CarbonEmission'].dropna().values
-    mean_emission = np.mean(carbon_emissions)
-    std_emission = np.std(carbon_emissions)
-    percentile_rank = calculate_percentile_rank(prediction, carbon_emissions)
-    diff_from_mean_percent = ((prediction - mean_emission) / mean_emission) * 100 if mean_emission != 0 else 4.56
-    std_from_mean = (prediction - mean_emission) / std_emission if std_emission != 0 else 7.89
-    
-    # Calculate comparative stats for each factor
-    comparative_stats = {}
-    for user_key, csv_col in column_mapping.items():
-        population_values = csv_data[csv_col].dropna().values
-        user_value = user_data.get(user_key, 0)
-        comparative_stats[user_key.lower()] = calculate_stats(user_value, population_values)
-    
-    return {
-        '1. OVERALL SUMMARY': {
-            'predicted_emission': float(prediction),
-            'percentile_rank': float(percentile_rank) if percentile_rank is not None else None,
-            'comparison_to_mean': float(diff_from_mean_percent),
-            'standard_deviations_from_mean': float(std_from_mean),
-            'category': get_emission_category(prediction),
-            'population_statistics': {
-                'mean': float(mean_emission),
-                'std_dev': float(std_emission),
-                'sample_size': len(carbon_emissions)
-            }
-        },
-        '2. COMPARATIVE STATS FOR SPECIFIC FACTORS': comparative_stats,
-        '3. RECOMMENDATIONS': generate_detailed_recommendations(user_data)
+    # Calculate comparative stats for each factor, one column at a time
+    factor_stats = {
+        user_key.lower(): calculate_stats_batch(
+            [user_data.get(user_key, 0) for user_data in records],
+            population.columns[user_key]
+        )
+        for user_key in COLUMN_MAPPING
     }
+    
+    insights = []
+    for i, user_data in enumerate(records):
+        prediction = float(predictions[i])
+        insights.append({
+            '1. OVERALL SUMMARY': {
+                'predicted_emission': prediction,
+                'percentile_rank': float(percentile_ranks[i]),
+                'comparison_to_mean': float(diff_from_mean_percent[i]),
+                'standard_deviations_from_mean': float(std_from_mean[i]),
+                'category': get_emission_category(prediction),
+                'population_statistics': {
+                    'mean': float(mean_emission),
+                    'std_dev': float(std_emission),
+                    'sample_size': emissions.size
+                }
+            },
+            '2. COMPARATIVE STATS FOR SPECIFIC FACTORS': {
+                key: stats[i] for key, stats in factor_stats.items()
+            },
+            '3. RECOMMENDATIONS': generate_detailed_recommendations(user_data)
+        })
+    return insights
+
+def generate_insights_from_csv(user_data, prediction, population):
+    """Generate comprehensive insights using the precomputed CSV population index"""
+    return generate_insights_batch([user_data], [prediction], population)[0]
+
 def store_analysis_results(db, analysis_data):
-    """Store all analysis results in MongoDB and append to existing user fields"""
+    """Append the analysis to the user's history and update the summary fields on the user"""
     try:
-        # Get the user's document
         user_id = ObjectId(analysis_data['userId'])
-        user_doc = db.find_one({'_id': user_id})
-        
-        # Initialize update data structure
-        update_data = {
-            '$set': {
-                'lastUpdated': analysis_data['timestamp'],
-                'carbonEmission': analysis_data['carbonEmission'],
-            },
-            '$push': {
-                'analyses': {
-                    'prediction': analysis_data['prediction'],
-                    'carbonEmission': analysis_data['carbonEmission'],
-                    'timestamp': analysis_data['timestamp'],
-                    'statistics': analysis_data['statistics'],
-                    'metadata': analysis_data['metadata']
-                },
-                'recommendations': {
-                    'timestamp': analysis_data['timestamp'],
-                    'immediate_actions': analysis_data['recommendations']['immediate_actions'],
-                    'medium_term_goals': analysis_data['recommendations']['medium_term_goals'],
-                    'long_term_changes': analysis_data['recommendations']['long_term_changes']
-                },
-                'comparisons': {
-                    'timestamp': analysis_data['timestamp'],
-                    'grocery': analysis_data['comparisons']['grocery'],
-                    'vehicleDistance': analysis_data['comparisons']['vehicleDistance'],
-                    'wasteBags': analysis_data['comparisons']['wasteBags'],
-                    'screenTime': analysis_data['comparisons']['screenTime'],
-                    'clothingPurchases': analysis_data['comparisons']['clothingPurchases']
-                },
-                'insights': {
-                    'timestamp': analysis_data['timestamp'],
-                    'overall_summary': analysis_data['insights']['1. OVERALL SUMMARY'],
-                    'comparative_stats': analysis_data['insights']['2. COMPARATIVE STATS FOR SPECIFIC FACTORS'],
-                    'recommendations': analysis_data['insights']['3. RECOMMENDATIONS']
-                }
-            }
-        }
-        
-        # Handle initial carbon emission
-        if not user_doc or user_doc.get('carbonEmission') is None:
-            update_data['$set']['initialCarbonEmission'] = analysis_data['carbonEmission']
-        else:
-            previous_emission = user_doc.get('carbonEmission')
-            if previous_emission is not None and analysis_data['carbonEmission'] is not None:
-                emission_change = analysis_data['carbonEmission'] - previous_emission
-                emission_change_percentage = (emission_change / previous_emission * 100) if previous_emission != 0 else 9.80
-                
-                update_data['$set'].update({
-                    'emissionChange': emission_change,
-                    'emissionChangePercentage': emission_change_percentage
-                })
-            else:
-                update_data['$set'].update({
-                    'emissionChange': 4.56,
-                    'emissionChangePercentage': 5.67
-                })
+        get_history_collection().insert_one(build_history_entry(analysis_data))
         
-        # Update the user document and append new data
+        # The change against the previous emission is computed inside the update
         result = db.update_one(
             {'_id': user_id},
-            update_data,
+            build_user_update_pipeline(analysis_data),
             upsert=True
         )
         
@@ -401,6 +402,59 @@ def store_analysis_results(db, analysis_data):
         traceback.print_exc()
         return False
 
+def store_analysis_results_bulk(db, analyses):
+    """Store many analysis results with one history insert and one bulk user update"""
+    if not analyses:
+        return True
+    try:
+        get_history_collection().insert_many([build_history_entry(analysis_data) for analysis_data in analyses])
+        
+        # Ordered, so repeated users compare against the analysis written just before
+        operations = [
+            UpdateOne({'_id': ObjectId(analysis_data['userId'])}, build_user_update_pipeline(analysis_data), upsert=True)
+            for analysis_data in analyses
+        ]
+        result = db.bulk_write(operations, ordered=True)
+        return bool(result.acknowledged)
+    except Exception as e:
+        print(f"Error storing batch analysis results: {str(e)}")
+        traceback.print_exc()
+        return False
+
+def build_analysis_response(object_id, prediction, insights, model_info, population):
+    """Assemble the API response / stored document for one analysed user"""
+    return {
+        'success': True,
+        'userId': str(object_id),
+        'carbonEmission': prediction,
+        'prediction': prediction,
+        'timestamp': datetime.now().isoformat(),
+        'insights': insights,
+        'recommendations': insights['3. RECOMMENDATIONS'],
+        'statistics': {
+            'percentileRank': float(insights['1. OVERALL SUMMARY']['percentile_rank']),
+            'comparisonToMean': float(insights['1. OVERALL SUMMARY']['comparison_to_mean']),
+            'standardDeviationsFromMean': float(insights['1. OVERALL SUMMARY']['standard_deviations_from_mean']),
+            'emissionCategory': insights['1. OVERALL SUMMARY']['category'],
+            'populationStats': insights['1. OVERALL SUMMARY']['population_statistics']
+        },
+        'comparisons': {
+            'grocery': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['monthlygrocerybill'],
+            'vehicleDistance': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['vehiclemonthlydistancekm'],
+            'wasteBags': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['wastebagweeklycount'],
+            'screenTime': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['howlongtvpcdailyhour'],
+            'clothingPurchases': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['howmanynewclothesmonthly']
+        },
+        'metadata': {
+            'modelVersion': model_info['version'],
+            'modelLoadedAt': model_info['loadedAt'],
+            'lastUpdated': datetime.now().isoformat(),
+            'dataVersion': '1.0',
+            'dataSource': 'CSV',
+            'sampleSize': population.row_count
+        }
+    }
+
 @api_view(['POST'])
 def analyze_carbon_footprint(request):
     """Main API endpoint for carbon footprint analysis"""
@@ -408,8 +462,8 @@ def analyze_carbon_footprint(request):
         # Get database connection
         db = get_db_connection()
         
-        # Load CSV data
-        csv_data = load_csv_data()
+        # Shared population statistics built from the CSV data
+        population = load_csv_data()
         
         # Parse request data
         data = json.loads(request.body) if isinstance(request.body, bytes) else request.data
@@ -433,47 +487,15 @@ def analyze_carbon_footprint(request):
         # Process data and make prediction
         processed_data = preprocess_data(data)
         print(processed_data)
-        model = load_model()
+        model, model_info = load_model()
         prediction = float(model.predict([processed_data])[0])
         print("\n",prediction)
         # Generate insights and recommendations
-        insights = generate_insights_from_csv(data, prediction, csv_data)
-        recommendations = generate_detailed_recommendations(data)
+        insights = generate_insights_from_csv(data, prediction, population)
         print("Insights",insights)
-        print("recommendations",recommendations)
-        
         
         # Prepare response
-        response_data = {
-            'success': True,
-            'userId': str(object_id),
-            'carbonEmission': prediction,
-            'prediction': prediction,
-            'timestamp': datetime.now().isoformat(),
-            'insights': insights,
-            'recommendations': recommendations,
-            'statistics': {
-                'percentileRank': float(insights['1. OVERALL SUMMARY']['percentile_rank']),
-                'comparisonToMean': float(insights['1. OVERALL SUMMARY']['comparison_to_mean']),
-                'standardDeviationsFromMean': float(insights['1. OVERALL SUMMARY']['standard_deviations_from_mean']),
-                'emissionCategory': insights['1. OVERALL SUMMARY']['category'],
-                'populationStats': insights['1. OVERALL SUMMARY']['population_statistics']
-            },
-            'comparisons': {
-                'grocery': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['monthlygrocerybill'],
-                'vehicleDistance': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['vehiclemonthlydistancekm'],
-                'wasteBags': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['wastebagweeklycount'],
-                'screenTime': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['howlongtvpcdailyhour'],
-                'clothingPurchases': insights['2. COMPARATIVE STATS FOR SPECIFIC FACTORS']['howmanynewclothesmonthly']
-            },
-            'metadata': {
-                'modelVersion': '1.0',
-                'lastUpdated': datetime.now().isoformat(),
-                'dataVersion': '1.0',
-                'dataSource': 'CSV',
-                'sampleSize': len(csv_data)
-            }
-        }
+        response_data = build_analysis_response(object_id, prediction, insights, model_info, population)
         
         # Store results in MongoDB
         storage_success = store_analysis_results(db, convert_to_python_types(response_data))
@@ -489,4 +511,197 @@ def analyze_carbon_footprint(request):
         return JsonResponse({
             'error': str(e),
             'traceback': traceback.format_exc()
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@api_view(['GET'])
+def model_status(request):
+    """Report the currently served model version, load time and memory footprint"""
+    try:
+        _, model_info = load_model()
+        return JsonResponse(model_info)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+BATCH_CHUNK_SIZE = int(os.getenv('CARBON_BATCH_CHUNK_SIZE', '500'))
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def analyze_batch(records, chunk_size=BATCH_CHUNK_SIZE, store=True, db=None):
+    """
+    Analyse many user payloads in-process.
+
+    Records are scored a chunk at a time: one feature matrix and one
+    model.predict call per chunk, vectorised percentile lookups, and one
+    bulk write to MongoDB. Yields (index, result) pairs chunk by chunk,
+    where result is either the full analysis or an error dict.
+    """
+    if store and db is None:
+        db = get_db_connection()
+    model, model_info = load_model()
+    encoder = load_encoder()
+    population = load_csv_data()
+    
+    for chunk in _chunked(enumerate(records), chunk_size):
+        valid = []
+        for index, data in chunk:
+            if isinstance(data, json.JSONDecodeError):
+                yield index, {'error': f'Invalid JSON: {str(data)}'}
+                continue
+            user_id_str = data.get('_id') if isinstance(data, dict) else None
+            if not user_id_str:
+                yield index, {'error': 'userID is required'}
+                continue
+            try:
+                valid.append((index, data, ObjectId(user_id_str)))
+            except (InvalidId, TypeError):
+                yield index, {
+                    'error': 'Invalid ID format',
+                    'received_id': str(user_id_str),
+                    'expected_format': '24-character hex string'
+                }
+        if not valid:
+            continue
+        
+        chunk_records = [data for _, data, _ in valid]
+        predictions = model.predict(preprocess_batch(chunk_records, encoder))
+        insights = generate_insights_batch(chunk_records, predictions, population)
+        
+        analyses = [
+            convert_to_python_types(build_analysis_response(object_id, float(prediction), chunk_insights, model_info, population))
+            for (_, _, object_id), prediction, chunk_insights in zip(valid, predictions, insights)
+        ]
+        stored = store_analysis_results_bulk(db, analyses) if store else False
+        if store and not stored:
+            print("Warning: Failed to store batch analysis results in database")
+        
+        for (index, _, _), analysis in zip(valid, analyses):
+            analysis['stored'] = stored
+            yield index, analysis
+
+def _iter_ndjson_records(request):
+    """
+    Yield user payloads from an NDJSON stream. A line that is not valid JSON
+    is yielded as its JSONDecodeError, so it fails on its own instead of the
+    rest of the stream.
+    """
+    # Read line by line so large uploads are never held as one parsed document
+    for line in iter(request.readline, b''):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield e
+
+def _request_records(request):
+    """
+    User payloads of a batch request: an NDJSON stream, or a JSON array or
+    {"users": [...]} body. None when a JSON body has neither shape.
+    """
+    content_type = request.content_type or ''
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        return _iter_ndjson_records(request)
+    
+    body = json.loads(request.body)
+    if isinstance(body, dict):
+        body = body.get('users')
+    return body if isinstance(body, list) else None
+
+@api_view(['POST'])
+def analyze_carbon_footprint_batch(request):
+    """
+    Batch API endpoint for carbon footprint analysis.
+
+    Accepts a JSON array (or {"users": [...]}) or an application/x-ndjson body.
+    Each NDJSON line succeeds or fails on its own, so earlier lines are
+    stored even when a later one is malformed. Pass ?detail=full to get the
+    full per-user analysis instead of a summary, and ?store=false to score
+    without writing to MongoDB.
+    """
+    try:
+        detail = request.query_params.get('detail', 'summary')
+        store = request.query_params.get('store', 'true').lower() != 'false'
+        records = _request_records(request)
+        if records is None:
+            return JsonResponse({'error': 'Expected a JSON array of users or {"users": [...]}'}, status=400)
+        
+        results = []
+        failed = 0
+        for index, analysis in analyze_batch(records, store=store):
+            if 'error' in analysis:
+                failed += 1
+                results.append({'index': index, **analysis})
+            elif detail == 'full':
+                results.append({'index': index, **analysis})
+            else:
+                results.append({
+                    'index': index,
+                    'userId': analysis['userId'],
+                    'carbonEmission': analysis['carbonEmission'],
+                    'statistics': analysis['statistics'],
+                    'stored': analysis['stored'],
+                    'modelVersion': analysis['metadata']['modelVersion']
+                })
+        results.sort(key=lambda r: r['index'])
+        
+        return JsonResponse({
+            'success': True,
+            'count': len(results),
+            'failed': failed,
+            'results': results
+        })
+    
+    except json.JSONDecodeError as e:
+        return JsonResponse({'error': f'Invalid JSON payload: {str(e)}'}, status=400)
+    except Exception as e:
+        print("Error:", str(e))
+        print("Traceback:", traceback.format_exc())
+        return JsonResponse({
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }, status=500)
+
+@api_view(['GET'])
+def analysis_history(request, user_id):
+    """
+    Paginated analysis history for one user, newest first.
+
+    Query params: limit (max 100), before (cursor from a previous page),
+    fields=full to include insights and recommendations.
+    """
+    try:
+        try:
+            object_id = ObjectId(user_id)
+        except InvalidId:
+            return JsonResponse({
+                'error': 'Invalid ID format',
+                'received_id': user_id,
+                'expected_format': '24-character hex string'
+            }, status=400)
+        
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        entries, next_cursor = fetch_history(
+            object_id,
+            limit=limit,
+            before=request.query_params.get('before'),
+            full=request.query_params.get('fields') == 'full'
+        )
+        return JsonResponse({
+            'userId': user_id,
+            'count': len(entries),
+            'next_cursor': next_cursor,
+            'analyses': entries
+        })
+    except (ValueError, InvalidId) as e:
+        return JsonResponse({'error': f'Invalid query parameters: {str(e)}'}, status=400)
+    except Exception as e:
+        print("Error:", str(e))
+        return JsonResponse({'error': str(e)}, status=500)
@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Results are fresh for SCRAPE_CACHE_TTL seconds, then served stale (while a
+# background refresh runs) until SCRAPE_CACHE_STALE_TTL seconds old
+SCRAPE_CACHE_TTL = float(os.getenv('SCRAPE_CACHE_TTL', '600'))
+SCRAPE_CACHE_STALE_TTL = float(os.getenv('SCRAPE_CACHE_STALE_TTL', '3600'))
+SCRAPE_CACHE_MAX_ENTRIES = int(os.getenv('SCRAPE_CACHE_MAX_ENTRIES', '256'))
+# Name of a Django cache alias (e.g. a Redis cache in settings.CACHES) shared by all workers
+SCRAPE_CACHE_BACKEND = os.getenv('SCRAPE_CACHE_BACKEND', '')
+
+
+class ScrapeResultCache:
+    """
+    Query-keyed cache of scrape results.
+
+    An in-process LRU sits in front of an optional shared Django cache.
+    Stale entries are returned immediately while one background refresh
+    reloads them, and concurrent misses for the same key wait on a single
+    load instead of each scraping. Empty results are never cached, so a
+    failed scrape is retried on the next request.
+    """
+
+    def __init__(self, ttl=SCRAPE_CACHE_TTL, stale_ttl=SCRAPE_CACHE_STALE_TTL,
+                 max_entries=SCRAPE_CACHE_MAX_ENTRIES, shared_alias=SCRAPE_CACHE_BACKEND):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_entries = max_entries
+        self.shared_alias = shared_alias
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='scrape-refresh')
+        self.counters = Counter()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def make_key(*parts):
+        return 'scrape:' + ':'.join(str(part).strip().lower() for part in parts)
+
+    def _shared(self):
+        if not self.shared_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.shared_alias]
+
+    def _remember(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key):
+        """(value, stored_at) from the local LRU, then the shared cache, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        shared = self._shared()
+        if shared is None:
+            return None
+        try:
+            entry = shared.get(key)
+        except Exception as e:
+            logger.error(f"Shared scrape cache read failed: {str(e)}")
+            return None
+        if entry is None:
+            return None
+        self._remember(key, entry['value'], entry['stored_at'])
+        return entry['value'], entry['stored_at']
+
+    def _store(self, key, value):
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, {'value': value, 'stored_at': stored_at}, timeout=int(self.stale_ttl))
+            except Exception as e:
+                logger.error(f"Shared scrape cache write failed: {str(e)}")
+
+    def _load(self, key, loader):
+        """Run loader once per key at a time; other callers wait for its result"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            self._count('coalesced')
+            return future.result()
+
+        try:
+            value = loader()
+            if value:
+                self._store(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _refresh(self, key, loader):
+        with self._lock:
+            if key in self._inflight:
+                return
+        self._count('refreshes')
+        self._refresher.submit(self._background_load, key, loader)
+
+    def _background_load(self, key, loader):
+        try:
+            self._load(key, loader)
+        except Exception as e:
+            logger.error(f"Background refresh of {key} failed: {str(e)}")
+
+    def peek(self, key):
+        """Cached value (fresh or stale) without loading, or None"""
+        entry = self._lookup(key)
+        if entry is None or time.time() - entry[1] > self.stale_ttl:
+            return None
+        return entry[0]
+
+    def get_or_load(self, key, loader):
+        """Return (value, state) where state is 'fresh', 'stale' or 'miss'"""
+        entry = self._lookup(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age <= self.ttl:
+                self._count('fresh')
+                return value, 'fresh'
+            if age <= self.stale_ttl:
+                self._count('stale')
+                self._refresh(key, loader)
+                return value, 'stale'
+
+        self._count('miss')
+        return self._load(key, loader), 'miss'
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            counters = dict(self.counters)
+        return {
+            'entries': entries,
+            'maxEntries': self.max_entries,
+            'ttlSeconds': self.ttl,
+            'staleTtlSeconds': self.stale_ttl,
+            'sharedBackend': self.shared_alias or None,
+            'pid': os.getpid(),
+            **{name: counters.get(name, 0) for name in ('fresh', 'stale', 'miss', 'coalesced', 'refreshes')},
+        }
+
+
+scrape_cache = ScrapeResultCache()
@@ -0,0 +1,134 @@
+import logging
+import os
+import random
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+}
+
+# SCRAPER_BASE_URL can point at a local fixture server (manage.py serve_scraper_fixtures)
+SCRAPER_BASE_URL = os.getenv('SCRAPER_BASE_URL', 'https://www.amazon.com')
+SCRAPER_TIMEOUT = float(os.getenv('SCRAPER_TIMEOUT', '10'))
+SCRAPER_RETRIES = int(os.getenv('SCRAPER_RETRIES', '2'))
+SCRAPER_BACKOFF = float(os.getenv('SCRAPER_BACKOFF', '0.5'))
+SCRAPER_POOL_SIZE = int(os.getenv('SCRAPER_POOL_SIZE', '10'))
+SCRAPER_MAX_WORKERS = int(os.getenv('SCRAPER_MAX_WORKERS', '4'))
+SCRAPER_MAX_PAGES = int(os.getenv('SCRAPER_MAX_PAGES', '3'))
+
+# Debug dumps of fetched pages are off by default; when on, only a sample is written
+SCRAPER_DEBUG_DUMP = os.getenv('SCRAPER_DEBUG_DUMP', '').lower() in ('1', 'true', 'yes')
+SCRAPER_DEBUG_SAMPLE_RATE = float(os.getenv('SCRAPER_DEBUG_SAMPLE_RATE', '0.05'))
+SCRAPER_DEBUG_DIR = os.getenv('SCRAPER_DEBUG_DIR', os.path.join(tempfile.gettempdir(), 'scraper_dumps'))
+
+
+class ScraperClient:
+    """
+    HTTP client for search result pages.
+
+    One keep-alive session per worker process with a bounded connection
+    pool and retries with exponential backoff on connection errors, 429s
+    and 5xx responses. fetch_many() fetches several queries or result
+    pages concurrently on a small thread pool.
+    """
+
+    def __init__(self, base_url=SCRAPER_BASE_URL, timeout=SCRAPER_TIMEOUT, retries=SCRAPER_RETRIES,
+                 backoff=SCRAPER_BACKOFF, pool_size=SCRAPER_POOL_SIZE, max_workers=SCRAPER_MAX_WORKERS,
+                 headers=None, debug_dump=SCRAPER_DEBUG_DUMP, debug_sample_rate=SCRAPER_DEBUG_SAMPLE_RATE,
+                 debug_dir=SCRAPER_DEBUG_DIR):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.max_workers = max_workers
+        self.headers = headers or DEFAULT_HEADERS
+        self.debug_dump = debug_dump
+        self.debug_sample_rate = debug_sample_rate
+        self.debug_dir = Path(debug_dir)
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        # Sessions hold sockets, so each forked worker process builds its own
+        if self._session is not None and self._session_pid == os.getpid():
+            return self._session
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                retry = Retry(
+                    total=self.retries,
+                    backoff_factor=self.backoff,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET']),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.headers.update(self.headers)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+        return self._session
+
+    def fetch(self, query, page=1):
+        """Body of one search results page, or None when it could not be fetched"""
+        params = {'k': query}
+        if page > 1:
+            params['page'] = page
+        url = f"{self.base_url}/s"
+        logger.info(f"Searching with URL: {url} params={params}")
+
+        try:
+            response = self.session().get(url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.error(f"Request for {query!r} page {page} failed: {str(e)}")
+            return None
+
+        logger.info(f"Response status code: {response.status_code}")
+        if response.status_code != 200:
+            logger.error(f"Failed to get response. Status code: {response.status_code}")
+            return None
+
+        self.maybe_dump(query, page, response.content)
+        return response.content
+
+    def fetch_many(self, requests_to_fetch):
+        """Fetch [(query, page), ...] concurrently; bodies (or None) come back in the same order"""
+        requests_to_fetch = list(requests_to_fetch)
+        if len(requests_to_fetch) <= 1 or self.max_workers <= 1:
+            return [self.fetch(query, page) for query, page in requests_to_fetch]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(requests_to_fetch))) as executor:
+            return list(executor.map(lambda request: self.fetch(*request), requests_to_fetch))
+
+    def maybe_dump(self, query, page, content):
+        """Write a sample of fetched pages to uniquely named files for debugging"""
+        if not self.debug_dump or random.random() >= self.debug_sample_rate:
+            return
+        try:
+            self.debug_dir.mkdir(parents=True, exist_ok=True)
+            slug = ''.join(c if c.isalnum() else '_' for c in query)[:40]
+            path = self.debug_dir / f"{slug}_p{page}_{uuid.uuid4().hex[:8]}.html"
+            path.write_bytes(content)
+            logger.debug(f"Saved response for {query!r} to {path}")
+        except OSError as e:
+            logger.error(f"Could not save debug dump: {str(e)}")
+
+
+scraper_client = ScraperClient()
@@ -0,0 +1,275 @@
+import atexit
+import hashlib
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from .file_lock import try_lock
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORE_ENABLED = os.getenv('EMBEDDING_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+EMBEDDING_STORE_DIR = os.getenv(
+    'EMBEDDING_STORE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'embedding_store')
+)
+EMBEDDING_STORE_MAX_ENTRIES = int(os.getenv('EMBEDDING_STORE_MAX_ENTRIES', '50000'))
+# The JSON index is rewritten after this many write batches (and at exit) rather than on every one
+EMBEDDING_STORE_FLUSH_EVERY = int(os.getenv('EMBEDDING_STORE_FLUSH_EVERY', '20'))
+
+# Bumped when the on-disk layout changes; stores in another format are ignored
+STORE_FORMAT = 2
+
+
+def embedding_key(text, asin=None):
+    """Products are keyed by ASIN when they have one, otherwise by a hash of their text"""
+    if asin and asin != 'N/A':
+        return f"asin:{asin}"
+    return 'text:' + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def key_hash(key):
+    """Non-zero 64-bit hash of a key, stored next to its vector; 0 marks a row being written"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class EmbeddingStore:
+    """
+    On-disk embeddings of one model, keyed by product.
+
+    Each row of a memory-mapped file holds a vector and a hash of its key,
+    and a JSON index maps each key to its row and last use. Once the file
+    is full the least recently used rows are overwritten. A new process
+    warm-loads the index, so products embedded before a restart are not
+    embedded again.
+
+    Only the process holding the store's lock file writes; it takes the
+    lock on its first write. Other processes read the rows and pick up the
+    index when the writer rewrites it. A row is only served when its stored
+    hash matches the key, so an index older than the rows (after a crash, or
+    while the writer reuses rows) gives misses, not another product's vector.
+    """
+
+    def __init__(self, model_name, directory=EMBEDDING_STORE_DIR, max_entries=EMBEDDING_STORE_MAX_ENTRIES,
+                 flush_every=EMBEDDING_STORE_FLUSH_EVERY):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.directory = Path(directory)
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.index_path = self.directory / f"{slug}.json"
+        self.rows_path = self.directory / f"{slug}.rows"
+        self.lock_path = self.directory / f"{slug}.lock"
+        self.dim = None
+        self._rows = None
+        self._entries = {}  # key -> [row, last used tick, key hash]
+        self._free = []
+        self._tick = 0
+        self._unflushed = 0
+        self._index_mtime = None
+        self._writer_lock = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self._load()
+        atexit.register(self.flush)
+
+    def _open_rows(self, mode, path=None):
+        dtype = np.dtype([('key', '<u8'), ('vector', '<f4', (self.dim,))])
+        self._rows = np.memmap(path or self.rows_path, dtype=dtype, mode=mode, shape=(self.max_entries,))
+
+    def _create_rows(self):
+        # Built beside the old file and swapped in, so readers still mapping that file are not cut short
+        tmp_path = self.rows_path.with_suffix(f'.rows.{os.getpid()}.tmp')
+        self._open_rows('w+', tmp_path)
+        os.replace(tmp_path, self.rows_path)
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _is_writer(self):
+        # A forked child shares its parent's lock, but only the process that took it writes
+        return self._writer_lock is not None and self._writer_pid == os.getpid()
+
+    def _load(self):
+        """Read the index and map the rows, read-write when this process is the writer"""
+        try:
+            mtime = self.index_path.stat().st_mtime_ns
+            index = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read embedding index {self.index_path}: {str(e)}")
+            return
+        self._index_mtime = mtime
+        if (index.get('format') != STORE_FORMAT or index.get('model') != self.model_name
+                or index.get('max_entries') != self.max_entries or not self.rows_path.exists()):
+            logger.info(f"Ignoring embedding store {self.index_path} built with different settings")
+            return
+
+        self.dim = index['dim']
+        self._open_rows('r+' if self._is_writer() else 'r')
+        self._tick = index['tick']
+        entries = {key: list(entry) for key, entry in index['entries'].items()}
+        # Rows rewritten after the index was last saved no longer hold their indexed key
+        stored = self._rows['key'][[row for row, _, _ in entries.values()]]
+        self._entries = {
+            key: entry for (key, entry), stored_hash in zip(entries.items(), stored) if stored_hash == entry[2]
+        }
+        self.counters['stale'] += len(entries) - len(self._entries)
+        used = {row for row, _, _ in self._entries.values()}
+        self._free = [row for row in range(self.max_entries - 1, -1, -1) if row not in used]
+        logger.info(f"Loaded {len(self._entries)} {self.model_name} embeddings from {self.directory}")
+
+    def _reload_if_changed(self):
+        """Readers pick up the entries the writer has saved since they last looked"""
+        if self._is_writer():
+            return
+        try:
+            mtime = self.index_path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._index_mtime:
+            self._load()
+
+    def _become_writer(self):
+        """Take the store's lock and reload read-write; False while another process holds it"""
+        if self._is_writer():
+            return True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        handle = try_lock(self.lock_path)
+        if handle is None:
+            return False
+        self._writer_lock, self._writer_pid = handle, os.getpid()
+        self._rows, self._entries, self._free, self._unflushed = None, {}, [], 0
+        # The previous writer may have saved entries this process has not seen
+        self._load()
+        return True
+
+    def _touch(self, entry):
+        self._tick += 1
+        entry[1] = self._tick
+
+    def get_many(self, keys):
+        """(positions, vectors): which of keys are stored, and their vectors in the same order"""
+        positions, rows, hashes = [], [], []
+        with self._lock:
+            self._reload_if_changed()
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    positions.append(i)
+                    rows.append(entry[0])
+                    hashes.append(entry[2])
+            vectors = None
+            if rows:
+                hashes = np.array(hashes, dtype=np.uint64)
+                valid = self._rows['key'][rows] == hashes
+                vectors = np.array(self._rows['vector'][rows])
+                # Checked again after the copy, seqlock-style: the writer clears a row's
+                # hash before rewriting its vector, so a row changed mid-copy fails here
+                valid &= self._rows['key'][rows] == hashes
+                if not valid.all():
+                    # The writer has reused these rows since this index was saved
+                    for i in np.flatnonzero(~valid):
+                        self._entries.pop(keys[positions[i]], None)
+                    positions = [position for position, ok in zip(positions, valid) if ok]
+                    vectors = vectors[valid]
+                    self.counters['stale'] += int((~valid).sum())
+                for position in positions:
+                    self._touch(self._entries[keys[position]])
+                if not positions:
+                    vectors = None
+            self.counters['hits'] += len(positions)
+            self.counters['misses'] += len(keys) - len(positions)
+        return positions, vectors
+
+    def _evict(self, count, keep):
+        """Free the rows of the count least recently used keys not in keep"""
+        candidates = ((entry[1], key) for key, entry in self._entries.items() if key not in keep)
+        for _, key in heapq.nsmallest(count, candidates):
+            self._free.append(self._entries.pop(key)[0])
+        self.counters['evictions'] += count
+
+    def put_many(self, keys, vectors):
+        """Store vectors under keys; skipped while another process is the store's writer"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        # A batch larger than the store keeps only its last max_entries vectors
+        keys, vectors = list(keys)[-self.max_entries:], vectors[-self.max_entries:]
+        with self._lock:
+            if not self._become_writer():
+                self.counters['skipped_writes'] += len(keys)
+                return
+            if self._rows is None:
+                self.dim = vectors.shape[1]
+                self._create_rows()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional {self.model_name} embeddings, got {vectors.shape[1]}")
+
+            shortfall = len({key for key in keys if key not in self._entries}) - len(self._free)
+            if shortfall > 0:
+                self._evict(shortfall, keep=set(keys))
+            for key, vector in zip(keys, vectors):
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = [self._free.pop(), 0, key_hash(key)]
+                self._touch(entry)
+                # Cleared first, so a row left half written by a crash matches no key
+                self._rows['key'][entry[0]] = 0
+                self._rows['vector'][entry[0]] = vector
+                self._rows['key'][entry[0]] = entry[2]
+
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if not self._is_writer() or self._rows is None or not self._unflushed:
+            return
+        self._rows.flush()
+        index = {
+            'format': STORE_FORMAT,
+            'model': self.model_name,
+            'dim': self.dim,
+            'max_entries': self.max_entries,
+            'tick': self._tick,
+            'entries': self._entries,
+        }
+        tmp_path = self.index_path.with_suffix(f'.json.{os.getpid()}.tmp')
+        try:
+            tmp_path.write_text(json.dumps(index), encoding='utf-8')
+            os.replace(tmp_path, self.index_path)
+            self._unflushed = 0
+        except OSError as e:
+            logger.error(f"Could not write embedding index {self.index_path}: {str(e)}")
+
+    def flush(self):
+        """Write the rows and the index to disk"""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Flush, release the memory map and give up the writer lock (e.g. before removing the store directory)"""
+        with self._lock:
+            self._flush()
+            self._rows = None
+            self._entries, self._free = {}, []
+            if self._writer_lock is not None:
+                self._writer_lock.close()
+                self._writer_lock = self._writer_pid = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'model': self.model_name,
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'writer': self._is_writer(),
+                **{name: self.counters.get(name, 0) for name in ('hits', 'misses', 'evictions', 'stale', 'skipped_writes')},
+            }
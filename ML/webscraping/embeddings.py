@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+
+from .embedding_store import EMBEDDING_STORE_ENABLED, EmbeddingStore, embedding_key
+
+# Share of the combined search score given to query similarity; the rest is the green score
+SIMILARITY_WEIGHT = 0.6
+# GREEN_SEARCH_EMBEDDINGS: 'all' uses sentence-transformers and OpenAI, 'local' sentence-transformers only
+GREEN_SEARCH_EMBEDDINGS = os.getenv('GREEN_SEARCH_EMBEDDINGS', 'all')
+SENTENCE_TRANSFORMER_MODEL = os.getenv('SENTENCE_TRANSFORMER_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+
+
+def normalise(vectors):
+    """L2-normalise rows (or a single vector) as float32, leaving zero vectors at zero"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingBackend:
+    """
+    One embedding model. embed_documents() encodes a whole batch of texts in
+    one call and returns an (n, dim) matrix of unit vectors, so cosine
+    similarity against a query is a single matrix-vector product. keys
+    optionally identify the texts (e.g. by ASIN) for backends that cache.
+    """
+
+    name = None
+
+    @property
+    def model_name(self):
+        raise NotImplementedError
+
+    def embed_documents(self, texts, keys=None):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    name = 'sentence_transformer'
+
+    def __init__(self, model_name=SENTENCE_TRANSFORMER_MODEL, batch_size=EMBEDDING_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+        self._model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name)
+
+    @property
+    def model_name(self):
+        return self._model_name
+
+    def embed_documents(self, texts, keys=None):
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        embeddings = self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True)
+        return normalise(embeddings)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    name = 'openai'
+
+    def __init__(self, openai_api_key):
+        from langchain.embeddings import OpenAIEmbeddings
+        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+
+    @property
+    def model_name(self):
+        return self.embeddings.model
+
+    def embed_documents(self, texts, keys=None):
+        # One request per chunk of texts (langchain batches by its chunk_size)
+        return normalise(self.embeddings.embed_documents(list(texts)))
+
+    def embed_query(self, text):
+        return normalise(self.embeddings.embed_query(text))
+
+
+class StoredEmbeddingBackend(EmbeddingBackend):
+    """Serves document embeddings from an EmbeddingStore and only encodes the texts it has not seen"""
+
+    def __init__(self, backend, store=None):
+        self.backend = backend
+        self.name = backend.name
+        self.store = store or EmbeddingStore(backend.model_name)
+
+    @property
+    def model_name(self):
+        return self.backend.model_name
+
+    def embed_documents(self, texts, keys=None):
+        texts = list(texts)
+        if not texts:
+            return self.backend.embed_documents(texts)
+        keys = list(keys) if keys is not None else [embedding_key(text) for text in texts]
+
+        found, stored = self.store.get_many(keys)
+        if len(found) == len(texts):
+            return stored
+        missing = sorted(set(range(len(texts))) - set(found))
+        computed = self.backend.embed_documents([texts[i] for i in missing])
+        self.store.put_many([keys[i] for i in missing], computed)
+
+        embeddings = np.empty((len(texts), computed.shape[1]), dtype=np.float32)
+        embeddings[missing] = computed
+        if found:
+            embeddings[found] = stored
+        return embeddings
+
+    def embed_query(self, text):
+        return self.backend.embed_query(text)
+
+
+def build_embedding_backends(openai_api_key=None, mode=GREEN_SEARCH_EMBEDDINGS, use_store=EMBEDDING_STORE_ENABLED):
+    """
+    Backends for the configured mode; OpenAI is skipped in 'local' mode or
+    without a key. With use_store, document embeddings are kept on disk.
+    """
+    backends = [SentenceTransformerBackend()]
+    if mode != 'local' and openai_api_key:
+        backends.append(OpenAIEmbeddingBackend(openai_api_key))
+    if use_store:
+        backends = [StoredEmbeddingBackend(backend) for backend in backends]
+    return backends
+
+
+def similarity_scores(backends, query, texts, keys=None, query_vectors=None):
+    """
+    Cosine similarity of every text to the query, as {backend name: (n,) array}.
+    query_vectors holds query embeddings the caller already has, by backend name.
+    """
+    query_vectors = query_vectors or {}
+    scores = {}
+    for backend in backends:
+        documents = backend.embed_documents(texts, keys)
+        query_vector = query_vectors.get(backend.name)
+        if query_vector is None:
+            query_vector = backend.embed_query(query)
+        scores[backend.name] = documents @ query_vector
+    return scores
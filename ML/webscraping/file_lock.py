@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock(handle, blocking):
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+
+def try_lock(path):
+    """Open path and take an exclusive lock without waiting; the open file while it is held, else None"""
+    handle = open(path, 'a+b')
+    try:
+        _lock(handle, blocking=False)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+@contextmanager
+def locked(path):
+    """Hold an exclusive lock on path, shared with other processes and threads, for the block"""
+    with open(path, 'a+b') as handle:
+        _lock(handle, blocking=True)
+        yield
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from webscraping.embedding_store import EmbeddingStore
+from webscraping.embeddings import StoredEmbeddingBackend, build_embedding_backends, similarity_scores
+from webscraping.parsing import product_parser
+
+DEFAULT_FIXTURES_DIR = Path(__file__).resolve().parents[2] / 'fixtures'
+
+
+def legacy_similarity_scores(backends, query, texts):
+    """The previous per-product encode and 1x1 cosine_similarity loop, kept as the benchmark baseline"""
+    from sklearn.metrics.pairwise import cosine_similarity
+    scores = {}
+    for backend in backends:
+        query_embedding = backend.embed_query(query)
+        scores[backend.name] = np.array([
+            cosine_similarity([query_embedding], [backend.embed_documents([text])[0]])[0][0]
+            for text in texts
+        ])
+    return scores
+
+
+class Command(BaseCommand):
+    help = ('Time query-product similarity scoring per product, in one batched call and from a warm '
+            'embedding store, on saved search pages')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', default=str(DEFAULT_FIXTURES_DIR), help='Directory of saved pages')
+        parser.add_argument('--query', default='energy efficient laptop')
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--openai', action='store_true',
+                            help='Also benchmark OpenAI embeddings (needs OPENAI_API_KEY and network access)')
+
+    def handle(self, *args, **options):
+        texts = [
+            f"{product['title']} {product.get('description', '')}"
+            for path in sorted(Path(options['fixtures']).glob('*.html'))
+            for product in product_parser.parse(path.read_bytes())
+        ]
+        if not texts:
+            self.stderr.write(f"No products parsed from {options['fixtures']}")
+            return
+
+        backends = build_embedding_backends(
+            os.getenv('OPENAI_API_KEY'), mode='all' if options['openai'] else 'local', use_store=False
+        )
+        self.stdout.write(f"{len(texts)} products, backends: {', '.join(b.name for b in backends)}")
+
+        with tempfile.TemporaryDirectory() as store_dir:
+            stored_backends = [
+                StoredEmbeddingBackend(backend, EmbeddingStore(backend.model_name, directory=store_dir))
+                for backend in backends
+            ]
+            runs = (
+                ('per product', legacy_similarity_scores, backends, texts[:2]),
+                ('batched', similarity_scores, backends, texts[:2]),
+                # Warming up with every product leaves the store holding all of them
+                ('stored (warm)', similarity_scores, stored_backends, texts),
+            )
+            results = {}
+            for label, score, run_backends, warm_up_texts in runs:
+                score(run_backends, options['query'], warm_up_texts)
+                started = time.perf_counter()
+                for _ in range(options['iterations']):
+                    results[label] = score(run_backends, options['query'], texts)
+                elapsed = (time.perf_counter() - started) / options['iterations']
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label}: {elapsed * 1000:.1f} ms per search, {len(texts) / elapsed:,.0f} products/s"
+                ))
+            for backend in stored_backends:
+                backend.store.close()
+
+        for label in ('batched', 'stored (warm)'):
+            for name in results[label]:
+                difference = np.abs(results[label][name] - results['per product'][name]).max()
+                self.stdout.write(f"{label} {name}: max similarity difference {difference:.2e}")
@@ -0,0 +1,79 @@
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+
+from webscraping.parsing import SoupProductParser, available_backends, get_product_parser
+
+DEFAULT_FIXTURES_DIR = Path(__file__).resolve().parents[2] / 'fixtures'
+
+
+def legacy_parse_products(content, num_products=20):
+    """The previous full-tree html.parser parse, kept as the benchmark baseline and parity reference"""
+    soup = BeautifulSoup(content, 'html.parser')
+    products = []
+    product_divs = soup.select('div[data-component-type="s-search-result"]')
+    if not product_divs:
+        product_divs = soup.select('.s-result-item')
+
+    for div in product_divs[:num_products]:
+        title = div.select_one('.a-text-normal') or div.select_one('h2') or div.select_one('.a-link-normal')
+        price = div.select_one('.a-price .a-offscreen') or div.select_one('.a-price') or div.select_one('.a-price-whole')
+        rating = div.select_one('.a-icon-alt') or div.select_one('.a-star-rating')
+        image = div.select_one('img.s-image') or div.select_one('.s-image')
+        asin = div.get('data-asin')
+        product_link = div.select_one('a.a-link-normal')
+        product_url = f"https://www.amazon.com{product_link['href']}" if product_link and 'href' in product_link.attrs else None
+        if title:
+            products.append({
+                'title': title.text.strip(),
+                'price': price.text.strip() if price else 'N/A',
+                'rating': rating.text.strip() if rating else 'N/A',
+                'image_url': image['src'] if image and 'src' in image.attrs else 'N/A',
+                'asin': asin if asin else 'N/A',
+                'product_url': product_url if product_url else 'N/A'
+            })
+    return products
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and output parity of the scraper parser backends over saved search pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', default=str(DEFAULT_FIXTURES_DIR), help='Directory of saved pages')
+        parser.add_argument('--iterations', type=int, default=50, help='Passes over the pages for timing')
+        parser.add_argument('--num-products', type=int, default=20)
+
+    def handle(self, *args, **options):
+        pages = [path.read_bytes() for path in sorted(Path(options['fixtures']).glob('*.html'))]
+        if not pages:
+            self.stderr.write(f"No .html pages in {options['fixtures']}")
+            return
+        num_products = options['num_products']
+        expected = [legacy_parse_products(page, num_products) for page in pages]
+
+        candidates = [('legacy html.parser', legacy_parse_products)]
+        for name in reversed(available_backends()):
+            parser = get_product_parser(name)
+            candidates.append((parser.name, parser.parse))
+            if isinstance(parser, SoupProductParser):
+                full_tree = SoupProductParser(features=name, strain=False)
+                candidates.append((full_tree.name, full_tree.parse))
+
+        baseline = None
+        for label, parse in candidates:
+            matching = sum(parse(page, num_products) == products for page, products in zip(pages, expected))
+
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                for page in pages:
+                    parse(page, num_products)
+            elapsed = time.perf_counter() - started
+            per_second = options['iterations'] * len(pages) / elapsed
+            baseline = baseline or per_second
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {matching}/{len(pages)} pages identical to legacy; "
+                f"{per_second:,.0f} pages/s ({per_second / baseline:.1f}x)"
+            ))
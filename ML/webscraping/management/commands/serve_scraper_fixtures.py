@@ -0,0 +1,72 @@
+import itertools
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_FIXTURES_DIR = Path(__file__).resolve().parents[2] / 'fixtures'
+
+
+def fixture_name(query, page=1):
+    """search_<query slug>.html for page 1, search_<query slug>_p<page>.html after that"""
+    slug = re.sub(r'[^a-z0-9]+', '_', query.lower()).strip('_')
+    return f"search_{slug}.html" if page <= 1 else f"search_{slug}_p{page}.html"
+
+
+def make_fixture_server(fixtures, port=0, fail_every=0, log=None):
+    """
+    HTTP server answering /s?k=<query>&page=<n> from saved pages; every
+    fail_every-th request gets a 503. port=0 picks a free port.
+    """
+    fixtures = Path(fixtures)
+    counter = itertools.count(1)
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path != '/s' or 'k' not in params:
+                return self.send_error(404)
+            if fail_every and next(counter) % fail_every == 0:
+                return self.send_error(503)
+
+            path = fixtures / fixture_name(params['k'][0], int(params.get('page', ['1'])[0]))
+            if not path.exists():
+                return self.send_error(404, f"No fixture {path.name}")
+            body = path.read_bytes()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if log:
+                log(format % args)
+
+    return ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+
+
+class Command(BaseCommand):
+    help = 'Serve saved search result pages so the scraper can run against them (set SCRAPER_BASE_URL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--fixtures', default=str(DEFAULT_FIXTURES_DIR), help='Directory of saved pages')
+        parser.add_argument('--fail-every', type=int, default=0,
+                            help='Answer every Nth request with a 503 to exercise retries')
+
+    def handle(self, *args, **options):
+        server = make_fixture_server(options['fixtures'], options['port'], options['fail_every'], self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving {options['fixtures']} on http://127.0.0.1:{options['port']} "
+            f"(SCRAPER_BASE_URL=http://127.0.0.1:{options['port']})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,180 @@
+import importlib.util
+import logging
+import os
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_URL_PREFIX = 'https://www.amazon.com'
+
+# Result containers: the first selector that matches anything wins
+CONTAINER_SELECTORS = [
+    ('div[data-component-type="s-search-result"]', {'data-component-type': 's-search-result'}),
+    ('.s-result-item', {'class': 's-result-item'}),
+]
+
+# Fallback selectors per field, tried in order within each container
+FIELD_SELECTORS = {
+    'title': ['.a-text-normal', 'h2', '.a-link-normal'],
+    'price': ['.a-price .a-offscreen', '.a-price', '.a-price-whole'],
+    'rating': ['.a-icon-alt', '.a-star-rating'],
+    'image': ['img.s-image', '.s-image'],
+    'link': ['a.a-link-normal'],
+}
+
+# SCRAPER_PARSER: auto, selectolax, lxml or html.parser
+SCRAPER_PARSER = os.getenv('SCRAPER_PARSER', 'auto')
+
+
+def build_product(title, price, rating, image_url, asin, href):
+    return {
+        'title': title,
+        'price': price if price is not None else 'N/A',
+        'rating': rating if rating is not None else 'N/A',
+        'image_url': image_url if image_url is not None else 'N/A',
+        'asin': asin if asin else 'N/A',
+        'product_url': f"{PRODUCT_URL_PREFIX}{href}" if href is not None else 'N/A',
+    }
+
+
+class SoupProductParser:
+    """
+    BeautifulSoup backend with precompiled soupsieve selectors.
+
+    With strain=True only the result containers are built into the tree
+    (via SoupStrainer) instead of the whole page.
+    """
+
+    def __init__(self, features='lxml', strain=True):
+        self.features = features
+        self.strain = strain
+        self.name = features if strain else f"{features} (full tree)"
+        self.containers = [(soupsieve.compile(selector), attrs) for selector, attrs in CONTAINER_SELECTORS]
+        self.fields = {
+            field: [soupsieve.compile(selector) for selector in selectors]
+            for field, selectors in FIELD_SELECTORS.items()
+        }
+
+    def _first(self, div, field):
+        for selector in self.fields[field]:
+            node = selector.select_one(div)
+            if node is not None:
+                return node
+        return None
+
+    def _containers(self, content):
+        soup = None if self.strain else BeautifulSoup(content, self.features)
+        for selector, attrs in self.containers:
+            if self.strain:
+                soup = BeautifulSoup(content, self.features, parse_only=SoupStrainer(attrs=attrs))
+            divs = selector.select(soup)
+            if divs:
+                return divs
+        return []
+
+    def parse(self, content, num_products=20):
+        product_divs = self._containers(content)
+        logger.info(f"Found {len(product_divs)} product divs")
+
+        products = []
+        # Only the first num_products containers are parsed; ones without a title are dropped
+        for div in product_divs[:num_products]:
+            try:
+                title = self._first(div, 'title')
+                if title is None:  # Only add product if at least title is found
+                    continue
+                price = self._first(div, 'price')
+                rating = self._first(div, 'rating')
+                image = self._first(div, 'image')
+                link = self._first(div, 'link')
+                product = build_product(
+                    title.text.strip(),
+                    price.text.strip() if price is not None else None,
+                    rating.text.strip() if rating is not None else None,
+                    image.get('src') if image is not None else None,
+                    div.get('data-asin'),
+                    link.get('href') if link is not None else None,
+                )
+                logger.info(f"Successfully parsed product: {product['title'][:30]}...")
+                products.append(product)
+            except Exception as e:
+                logger.error(f"Error parsing product: {str(e)}")
+        return products
+
+
+class SelectolaxProductParser:
+    """selectolax (lexbor) backend: a C parser and selector engine, several times faster than bs4"""
+
+    name = 'selectolax'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self.html_parser = LexborHTMLParser
+
+    @staticmethod
+    def _first(div, field):
+        for selector in FIELD_SELECTORS[field]:
+            node = div.css_first(selector)
+            if node is not None:
+                return node
+        return None
+
+    def parse(self, content, num_products=20):
+        tree = self.html_parser(content)
+        product_divs = []
+        for selector, _ in CONTAINER_SELECTORS:
+            product_divs = tree.css(selector)
+            if product_divs:
+                break
+        logger.info(f"Found {len(product_divs)} product divs")
+
+        products = []
+        for div in product_divs[:num_products]:
+            try:
+                title = self._first(div, 'title')
+                if title is None:
+                    continue
+                price = self._first(div, 'price')
+                rating = self._first(div, 'rating')
+                image = self._first(div, 'image')
+                link = self._first(div, 'link')
+                product = build_product(
+                    title.text().strip(),
+                    price.text().strip() if price is not None else None,
+                    rating.text().strip() if rating is not None else None,
+                    image.attributes.get('src') if image is not None else None,
+                    div.attributes.get('data-asin'),
+                    link.attributes.get('href') if link is not None else None,
+                )
+                logger.info(f"Successfully parsed product: {product['title'][:30]}...")
+                products.append(product)
+            except Exception as e:
+                logger.error(f"Error parsing product: {str(e)}")
+        return products
+
+
+def available_backends():
+    """Names of the parser backends usable in this environment, fastest first"""
+    backends = []
+    if importlib.util.find_spec('selectolax') is not None:
+        backends.append('selectolax')
+    if importlib.util.find_spec('lxml') is not None:
+        backends.append('lxml')
+    backends.append('html.parser')
+    return backends
+
+
+def get_product_parser(name=SCRAPER_PARSER):
+    """Parser backend by name; 'auto' picks the fastest available one"""
+    if name == 'auto':
+        name = available_backends()[0]
+    if name == 'selectolax':
+        return SelectolaxProductParser()
+    if name in ('lxml', 'html.parser'):
+        return SoupProductParser(features=name)
+    raise ValueError(f"Unknown scraper parser backend: {name}")
+
+
+product_parser = get_product_parser()
@@ -0,0 +1,360 @@
+import atexit
+import heapq
+import importlib.util
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .file_lock import locked
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_INDEX_DIR = os.getenv(
+    'PRODUCT_INDEX_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'product_index')
+)
+PRODUCT_INDEX_MAX_PRODUCTS = int(os.getenv('PRODUCT_INDEX_MAX_PRODUCTS', '20000'))
+# Candidates retrieved from the index per search, before re-ranking
+PRODUCT_INDEX_CANDIDATES = int(os.getenv('PRODUCT_INDEX_CANDIDATES', '50'))
+PRODUCT_INDEX_FLUSH_EVERY = int(os.getenv('PRODUCT_INDEX_FLUSH_EVERY', '20'))
+# faiss HNSW graph parameters; without faiss the index falls back to exact numpy search
+HNSW_M = int(os.getenv('PRODUCT_INDEX_HNSW_M', '32'))
+HNSW_EF_SEARCH = int(os.getenv('PRODUCT_INDEX_HNSW_EF_SEARCH', '64'))
+# The HNSW graph is rebuilt once this share of its nodes point at replaced or evicted products
+HNSW_REBUILD_STALE_RATIO = 0.25
+
+FAISS_AVAILABLE = importlib.util.find_spec('faiss') is not None
+
+
+class ProductVectorIndex:
+    """
+    Bounded nearest-neighbour index over scraped products for one embedding model.
+
+    Products are deduplicated by key (ASIN, or text hash), and the least
+    recently added or retrieved ones are evicted past max_products. Rows of
+    unit vectors and their product dicts are saved to disk and reloaded at
+    startup. Workers sharing the directory each keep their own index; a
+    save first takes in the products other workers saved, so none are
+    lost. Search uses a faiss HNSW graph (inner product on unit vectors,
+    i.e. cosine) when faiss is installed, otherwise an exact numpy
+    matrix-vector product. HNSW cannot delete nodes, so replaced rows are
+    skipped at query time and the graph is rebuilt once too many are stale.
+    """
+
+    def __init__(self, model_name, directory=PRODUCT_INDEX_DIR, max_products=PRODUCT_INDEX_MAX_PRODUCTS,
+                 flush_every=PRODUCT_INDEX_FLUSH_EVERY, use_faiss=FAISS_AVAILABLE):
+        self.model_name = model_name
+        self.max_products = max_products
+        self.flush_every = flush_every
+        self.use_faiss = use_faiss
+        self.directory = Path(directory)
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.vectors_path = self.directory / f"{slug}.npy"
+        self.meta_path = self.directory / f"{slug}.json"
+        self.graph_path = self.directory / f"{slug}.hnsw"
+        self.lock_path = self.directory / f"{slug}.lock"
+        self.dim = None
+        self._vectors = None
+        self._live = None
+        self._keys = []  # row -> key, None when free
+        self._products = []  # row -> product dict
+        self._last_used = []  # row -> time of last use, comparable across workers
+        self._rows = {}  # key -> row
+        self._free = []
+        self._unflushed = 0
+        self._ann = None
+        self._ann_rows = []  # faiss id -> row
+        self._row_ann_ids = None  # row -> current faiss id, -1 when none
+        self._lock = threading.Lock()
+        self._load()
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _allocate(self, dim):
+        self.dim = dim
+        self._vectors = np.zeros((self.max_products, dim), dtype=np.float32)
+        self._live = np.zeros(self.max_products, dtype=bool)
+        self._keys = [None] * self.max_products
+        self._products = [None] * self.max_products
+        self._last_used = [0] * self.max_products
+        self._free = list(range(self.max_products - 1, -1, -1))
+
+    def _load(self):
+        if not self.directory.exists():
+            return
+        # Workers sharing the directory replace the saved files as one set under this lock
+        with locked(self.lock_path):
+            self._load_saved()
+
+    def _read_saved(self):
+        """(metadata, vectors) of the saved index, or None; call under the lock"""
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding='utf-8'))
+            vectors = np.load(self.vectors_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read product index {self.meta_path}: {str(e)}")
+            return None
+        if meta.get('model') != self.model_name or len(meta['keys']) != len(vectors):
+            logger.info(f"Ignoring product index {self.meta_path} built for another model")
+            return None
+        return meta, vectors
+
+    def _load_saved(self):
+        saved = self._read_saved()
+        if saved is None:
+            return
+        meta, vectors = saved
+
+        self._allocate(vectors.shape[1])
+        order = range(len(vectors))
+        if len(vectors) > self.max_products:
+            # Keep the most recently used products when max_products has shrunk
+            order = sorted(order, key=lambda i: meta['last_used'][i], reverse=True)[:self.max_products]
+        for row, i in enumerate(order):
+            self._vectors[row] = vectors[i]
+            self._live[row] = True
+            self._keys[row] = meta['keys'][i]
+            self._products[row] = meta['products'][i]
+            self._last_used[row] = meta['last_used'][i]
+            self._rows[meta['keys'][i]] = row
+        self._free = list(range(self.max_products - 1, len(order) - 1, -1))
+        if not (len(vectors) <= self.max_products and self._load_ann(meta.get('ann_rows'))):
+            self._rebuild_ann()
+        logger.info(f"Loaded {len(self._rows)} products into the {self.model_name} product index")
+
+    def _load_ann(self, ann_rows):
+        """Reuse the saved HNSW graph; ann_rows is only in the metadata written alongside it"""
+        if not self.use_faiss or ann_rows is None or not self.graph_path.exists():
+            return False
+        import faiss
+        try:
+            ann = faiss.read_index(str(self.graph_path))
+        except RuntimeError as e:
+            logger.error(f"Could not read product index graph {self.graph_path}: {str(e)}")
+            return False
+        if ann.ntotal != len(ann_rows) or ann.d != self.dim:
+            return False
+        ann.hnsw.efSearch = HNSW_EF_SEARCH
+        self._ann = ann
+        self._ann_rows = list(ann_rows)
+        self._row_ann_ids = np.full(self.max_products, -1, dtype=np.int64)
+        for node, row in enumerate(ann_rows):
+            if row >= 0:
+                self._row_ann_ids[row] = node
+        return True
+
+    def _rebuild_ann(self):
+        if not self.use_faiss or self.dim is None:
+            return
+        import faiss
+        self._ann = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        self._ann.hnsw.efSearch = HNSW_EF_SEARCH
+        self._ann_rows = []
+        self._row_ann_ids = np.full(self.max_products, -1, dtype=np.int64)
+        rows = sorted(self._rows.values())
+        if rows:
+            self._add_to_ann(rows)
+
+    def _add_to_ann(self, rows):
+        first_id = len(self._ann_rows)
+        self._ann.add(self._vectors[rows])
+        self._ann_rows.extend(rows)
+        self._row_ann_ids[rows] = np.arange(first_id, first_id + len(rows))
+
+    def _update_ann(self, changed):
+        """Add the changed rows to the HNSW graph, or rebuild it once too many nodes are stale"""
+        if self._ann is None:
+            return
+        # Every live row ends up with one current node; any other node is stale
+        stale = len(self._ann_rows) + len(changed) - len(self._rows)
+        if stale > HNSW_REBUILD_STALE_RATIO * len(self._rows):
+            self._rebuild_ann()
+        else:
+            self._add_to_ann(sorted(changed))
+
+    def _touch(self, row):
+        self._last_used[row] = time.time()
+
+    def _evict(self, count, keep):
+        candidates = (
+            (self._last_used[row], row) for key, row in self._rows.items() if key not in keep
+        )
+        for _, row in heapq.nsmallest(count, candidates):
+            del self._rows[self._keys[row]]
+            self._keys[row] = self._products[row] = None
+            self._live[row] = False
+            if self._row_ann_ids is not None:
+                self._row_ann_ids[row] = -1
+            self._free.append(row)
+
+    def add(self, keys, vectors, products):
+        """
+        Insert or refresh products; an existing key gets the new product dict,
+        and only goes back into the HNSW graph if its vector changed.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        keys, vectors, products = list(keys)[-self.max_products:], vectors[-self.max_products:], products[-self.max_products:]
+        with self._lock:
+            if self._vectors is None:
+                self._allocate(vectors.shape[1])
+                self._rebuild_ann()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional {self.model_name} vectors, got {vectors.shape[1]}")
+
+            shortfall = len({key for key in keys if key not in self._rows}) - len(self._free)
+            if shortfall > 0:
+                self._evict(shortfall, keep=set(keys))
+
+            changed = set()
+            for key, vector, product in zip(keys, vectors, products):
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._rows[key] = self._free.pop()
+                    self._keys[row] = key
+                    self._live[row] = True
+                    changed.add(row)
+                elif not np.array_equal(self._vectors[row], vector):
+                    changed.add(row)
+                self._vectors[row] = vector
+                self._products[row] = dict(product)
+                self._touch(row)
+
+            self._update_ann(changed)
+
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                self._flush()
+
+    def _merge_saved(self):
+        """
+        Take in the products another worker saved that this index lacks,
+        keeping the max_products most recently used of both sets. Called
+        under the lock, so the save that follows loses no worker's products.
+        """
+        saved = self._read_saved()
+        if saved is None:
+            return
+        meta, vectors = saved
+        if vectors.shape[1] != self.dim:
+            return
+        incoming = [i for i, key in enumerate(meta['keys']) if key not in self._rows]
+        pool = [(self._last_used[row], False, row) for row in self._rows.values()]
+        pool += [(meta['last_used'][i], True, i) for i in incoming]
+        taken = [i for _, is_incoming, i in heapq.nlargest(self.max_products, pool) if is_incoming]
+        if not taken:
+            return
+
+        shortfall = len(taken) - len(self._free)
+        if shortfall > 0:
+            self._evict(shortfall, keep=set())
+        changed = set()
+        for i in taken:
+            key = meta['keys'][i]
+            row = self._rows[key] = self._free.pop()
+            self._keys[row] = key
+            self._live[row] = True
+            self._vectors[row] = vectors[i]
+            self._products[row] = meta['products'][i]
+            self._last_used[row] = meta['last_used'][i]
+            changed.add(row)
+        self._update_ann(changed)
+
+    def search(self, query_vector, k=PRODUCT_INDEX_CANDIDATES):
+        """[(product, similarity)] of the k nearest products to a unit query vector, best first"""
+        with self._lock:
+            if not self._rows:
+                return []
+            k = min(k, len(self._rows))
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+
+            if self._ann is not None:
+                # Over-fetch since some graph nodes may point at replaced rows
+                fetch = min(len(self._ann_rows), k + len(self._ann_rows) - len(self._rows))
+                scores, ids = self._ann.search(query_vector[None, :], fetch)
+                hits = [
+                    (self._ann_rows[i], float(score)) for i, score in zip(ids[0], scores[0])
+                    if i >= 0 and self._ann_rows[i] >= 0 and self._row_ann_ids[self._ann_rows[i]] == i
+                ][:k]
+            else:
+                scores = self._vectors @ query_vector
+                scores[~self._live] = -np.inf
+                best = np.argpartition(-scores, k - 1)[:k]
+                best = best[np.argsort(-scores[best])]
+                hits = [(int(row), float(scores[row])) for row in best]
+
+            for row, _ in hits:
+                self._touch(row)
+            return [(dict(self._products[row]), score) for row, score in hits]
+
+    def _flush(self, save_graph=False):
+        if self._vectors is None or not (self._unflushed or save_graph):
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Workers sharing the directory merge and replace the saved files one at a time
+            with locked(self.lock_path):
+                self._merge_saved()
+                self._write(save_graph)
+            self._unflushed = 0
+        except OSError as e:
+            logger.error(f"Could not write product index {self.meta_path}: {str(e)}")
+
+    def _write(self, save_graph):
+        """Save this index's rows (and graph) as one set of files; call under the lock"""
+        rows = sorted(self._rows.values())
+        meta = {
+            'model': self.model_name,
+            'keys': [self._keys[row] for row in rows],
+            'products': [self._products[row] for row in rows],
+            'last_used': [self._last_used[row] for row in rows],
+        }
+        # Temporary files are per process and index, so concurrent saves never share one
+        suffix = f'.{os.getpid()}.{id(self):x}.tmp'
+        replacements = []
+        if save_graph and self._ann is not None:
+            # Graph nodes are renumbered to the saved row order; stale nodes get -1
+            position = {row: i for i, row in enumerate(rows)}
+            meta['ann_rows'] = [
+                position[row] if row >= 0 and self._row_ann_ids[row] == node else -1
+                for node, row in enumerate(self._ann_rows)
+            ]
+            import faiss
+            tmp_graph = self.graph_path.with_suffix('.hnsw' + suffix)
+            faiss.write_index(self._ann, str(tmp_graph))
+            replacements.append((tmp_graph, self.graph_path))
+        tmp_vectors = self.vectors_path.with_suffix(suffix + '.npy')
+        np.save(tmp_vectors, self._vectors[rows])
+        tmp_meta = self.meta_path.with_suffix('.json' + suffix)
+        tmp_meta.write_text(json.dumps(meta), encoding='utf-8')
+        replacements += [(tmp_vectors, self.vectors_path), (tmp_meta, self.meta_path)]
+        for tmp_path, path in replacements:
+            os.replace(tmp_path, path)
+
+    def flush(self):
+        """
+        Save the indexed products, their vectors and the HNSW graph. Periodic
+        saves skip the graph, which is then rebuilt at the next startup.
+        """
+        with self._lock:
+            self._flush(save_graph=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'model': self.model_name,
+                'products': len(self._rows),
+                'maxProducts': self.max_products,
+                'backend': 'faiss-hnsw' if self._ann is not None else 'numpy',
+                'graphNodes': len(self._ann_rows) if self._ann is not None else None,
+            }
@@ -1,3 +1,301 @@
-from django.test import TestCase
+import atexit
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import RequestFactory, SimpleTestCase
+
+from .cache import ScrapeResultCache
+from .client import ScraperClient
+from .embedding_store import EmbeddingStore
+from .management.commands.benchmark_scraper_parsing import legacy_parse_products
+from .management.commands.serve_scraper_fixtures import DEFAULT_FIXTURES_DIR, make_fixture_server
+from .parsing import SoupProductParser, available_backends, get_product_parser, product_parser
+from .product_index import ProductVectorIndex
+from .views import get_top_products
+
+
+class FixtureServerTestCase(SimpleTestCase):
+    """Runs the saved search pages on a local server; every fail_every-th request gets a 503"""
+    fail_every = 0
+
+    def setUp(self):
+        self.server = make_fixture_server(DEFAULT_FIXTURES_DIR, fail_every=self.fail_every)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class ScraperClientRetryTests(FixtureServerTestCase):
+    fail_every = 2
+
+    def test_retries_recover_every_page(self):
+        client = ScraperClient(base_url=self.base_url, retries=2, backoff=0, max_workers=1)
+
+        pages = client.fetch_many([('laptop', 1), ('laptop', 2), ('solar charger', 1)])
+
+        self.assertTrue(all(page is not None for page in pages))
+        for page in pages:
+            self.assertTrue(product_parser.parse(page, 20))
+
+    def test_without_retries_failed_pages_are_none(self):
+        client = ScraperClient(base_url=self.base_url, retries=0, backoff=0, max_workers=1)
+
+        pages = client.fetch_many([('laptop', 1), ('laptop', 2)])
+
+        self.assertIsNotNone(pages[0])
+        self.assertIsNone(pages[1])
+
+
+class TopProductsViewTests(SimpleTestCase):
+    def test_non_integer_pages_is_rejected(self):
+        request = RequestFactory().get('/top-products/', {'query': 'laptop', 'pages': 'two'})
+
+        response = get_top_products(request)
+
+        self.assertEqual(response.status_code, 400)
+
+
+class EmbeddingStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def store(self, **kwargs):
+        store = EmbeddingStore('test-model', directory=self.directory, max_entries=4, **kwargs)
+        self.stores.append(store)
+        return store
+
+    @staticmethod
+    def vectors(*values):
+        return np.array([[value, -value] for value in values], dtype=np.float32)
+
+    def test_only_one_store_writes(self):
+        writer, other = self.store(flush_every=1), self.store(flush_every=1)
+
+        writer.put_many(['a', 'b'], self.vectors(1, 2))
+        other.put_many(['c'], self.vectors(3))
+
+        self.assertTrue(writer.stats()['writer'])
+        self.assertFalse(other.stats()['writer'])
+        positions, vectors = other.get_many(['a', 'b', 'c'])
+        self.assertEqual(positions, [0, 1])
+        np.testing.assert_array_equal(vectors, self.vectors(1, 2))
+
+    def test_reused_rows_are_not_served_under_an_old_index(self):
+        writer = self.store(flush_every=1)
+        writer.put_many(['a', 'b', 'c', 'd'], self.vectors(1, 2, 3, 4))
+        reader = self.store()
+        self.assertEqual(reader.stats()['entries'], 4)
+
+        # Evicts a and b into rows the saved index still gives them, without saving it
+        writer.flush_every = 100
+        writer.put_many(['e', 'f'], self.vectors(5, 6))
+
+        positions, vectors = reader.get_many(['a', 'b', 'c'])
+        self.assertEqual(positions, [2])
+        np.testing.assert_array_equal(vectors, self.vectors(3))
+        # As after a crash: a fresh load drops the entries whose rows were rewritten
+        self.assertEqual(self.store().stats()['entries'], 2)
+
+
+class ProductVectorIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.indexes = []
+        # A ticking clock, so every use has a distinct last-used time
+        clock = mock.patch('webscraping.product_index.time.time', side_effect=itertools.count(1))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def tearDown(self):
+        for index in self.indexes:
+            atexit.unregister(index.flush)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def index(self, max_products=4, flush_every=100):
+        index = ProductVectorIndex(
+            'test-model', directory=self.directory, max_products=max_products, flush_every=flush_every,
+            use_faiss=False
+        )
+        self.indexes.append(index)
+        return index
+
+    @staticmethod
+    def vectors(*angles):
+        return np.array([[np.cos(angle), np.sin(angle)] for angle in angles], dtype=np.float32)
+
+    @staticmethod
+    def products(*keys):
+        return [{'asin': key} for key in keys]
+
+    def add(self, index, *keys):
+        angles = [float(ord(key[0]) - ord('a')) / 10 for key in keys]
+        index.add(list(keys), self.vectors(*angles), self.products(*keys))
+
+    def keys(self, index):
+        return sorted(index._rows)
+
+    def test_same_key_is_stored_once(self):
+        index = self.index()
+        self.add(index, 'a', 'b')
+        index.add(['a'], self.vectors(1.5), [{'asin': 'a', 'title': 'new'}])
+
+        self.assertEqual(len(index), 2)
+        product, score = index.search(self.vectors(1.5)[0], k=1)[0]
+        self.assertEqual(product, {'asin': 'a', 'title': 'new'})
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+    def test_least_recently_used_products_are_evicted(self):
+        index = self.index(max_products=3)
+        self.add(index, 'a')
+        self.add(index, 'b')
+        self.add(index, 'c')
+        # Retrieving a makes b the least recently used
+        index.search(self.vectors(0)[0], k=1)
+        self.add(index, 'd')
+
+        self.assertEqual(self.keys(index), ['a', 'c', 'd'])
+
+    def test_saved_index_reloads(self):
+        index = self.index()
+        self.add(index, 'a', 'b', 'c')
+        index.flush()
+
+        reloaded = self.index()
+
+        self.assertEqual(self.keys(reloaded), ['a', 'b', 'c'])
+        np.testing.assert_array_equal(reloaded._vectors[reloaded._rows['b']], index._vectors[index._rows['b']])
+        self.assertEqual(reloaded.search(self.vectors(0.1)[0], k=1)[0][0], {'asin': 'b'})
+
+    def test_reload_keeps_most_recent_when_max_products_shrinks(self):
+        index = self.index()
+        for key in 'abcd':
+            self.add(index, key)
+        index.flush()
+
+        reloaded = self.index(max_products=2)
+
+        self.assertEqual(self.keys(reloaded), ['c', 'd'])
+
+    def test_numpy_search_returns_exact_top_k(self):
+        index = self.index(max_products=50)
+        angles = np.linspace(0, 3, 40)
+        keys = [f'p{i}' for i in range(40)]
+        index.add(keys, self.vectors(*angles), [{'asin': key} for key in keys])
+        query = self.vectors(1.234)[0]
+
+        results = index.search(query, k=5)
+
+        expected = np.argsort(-(self.vectors(*angles) @ query))[:5]
+        self.assertEqual([product['asin'] for product, _ in results], [keys[i] for i in expected])
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_saves_merge_products_of_other_workers(self):
+        first, second = self.index(), self.index()
+        self.add(first, 'a', 'b')
+        first.flush()
+        self.add(second, 'c')
+        second.flush()
+
+        self.assertEqual(self.keys(second), ['a', 'b', 'c'])
+        self.assertEqual(self.keys(self.index()), ['a', 'b', 'c'])
+
+
+class ScrapeResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ScrapeResultCache(ttl=10, stale_ttl=1000, max_entries=8, shared_alias='')
+        self.addCleanup(self.cache._refresher.shutdown)
+        self.calls = []
+
+    def loader(self, value, release=None):
+        def load():
+            self.calls.append(value)
+            if release is not None:
+                release.wait(5)
+            return value
+        return load
+
+    def wait_for(self, condition):
+        deadline = time.time() + 5
+        while not condition():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def test_fresh_entry_is_a_hit(self):
+        self.assertEqual(self.cache.get_or_load('k', self.loader(['a'])), (['a'], 'miss'))
+        self.assertEqual(self.cache.get_or_load('k', self.loader(['b'])), (['a'], 'fresh'))
+        self.assertEqual(self.calls, [['a']])
+
+    def test_stale_entry_is_served_while_it_refreshes(self):
+        self.cache._remember('k', ['old'], time.time() - 100)
+        release = threading.Event()
+
+        value, state = self.cache.get_or_load('k', self.loader(['new'], release))
+
+        self.assertEqual((value, state), (['old'], 'stale'))
+        # The refresh is still running, and a second stale read does not start another
+        self.wait_for(lambda: self.calls)
+        self.assertEqual(self.cache.get_or_load('k', self.loader(['other']))[1], 'stale')
+        release.set()
+        self.wait_for(lambda: self.cache.peek('k') == ['new'])
+        self.assertEqual(self.cache.get_or_load('k', self.loader(['other'])), (['new'], 'fresh'))
+        self.assertEqual(self.calls, [['new']])
+
+    def test_expired_entry_is_a_miss(self):
+        self.cache._remember('k', ['old'], time.time() - 2000)
+        self.assertEqual(self.cache.get_or_load('k', self.loader(['new'])), (['new'], 'miss'))
+
+    def test_concurrent_misses_load_once(self):
+        release = threading.Event()
+        results = []
+
+        def get():
+            results.append(self.cache.get_or_load('k', self.loader(['a'], release)))
+
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        # Release the load once the other four are waiting on it
+        self.wait_for(lambda: self.cache.stats()['coalesced'] == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, [['a']])
+        self.assertEqual(results, [(['a'], 'miss')] * 5)
+
+    def test_empty_results_are_not_cached(self):
+        self.cache.get_or_load('k', self.loader([]))
+        self.assertEqual(self.cache.get_or_load('k', self.loader(['a'])), (['a'], 'miss'))
+
+
+class ProductParserParityTests(SimpleTestCase):
+    def test_backends_match_legacy_parse_on_fixture_pages(self):
+        pages = sorted(DEFAULT_FIXTURES_DIR.glob('*.html'))
+        self.assertEqual(len(pages), 3)
+        parsers = [get_product_parser(name) for name in available_backends()]
+        parsers.append(SoupProductParser(features='html.parser', strain=False))
+        for path in pages:
+            content = path.read_bytes()
+            for num_products in (1, 5, 20, 100):
+                expected = legacy_parse_products(content, num_products)
+                self.assertTrue(expected)
+                for parser in parsers:
+                    with self.subTest(page=path.name, num_products=num_products, parser=parser.name):
+                        self.assertEqual(parser.parse(content, num_products), expected)
@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('top-products/', views.get_top_products, name='top-products'),
     path('top-productsone/', views.get_first_product, name='top-productsone'),
+    path('scrape-cache-status/', views.scrape_cache_status, name='scrape-cache-status'),
 ]
\ No newline at end of file
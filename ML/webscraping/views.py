@@ -1,100 +1,33 @@
 from django.http import JsonResponse
-from bs4 import BeautifulSoup
-import requests
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import logging
 
+from .cache import scrape_cache
+from .client import SCRAPER_MAX_PAGES, scraper_client
+from .parsing import product_parser
+
 logger = logging.getLogger(__name__)
 
-def get_amazon_products(search_query, num_products=20):
+def parse_products(content, num_products=20):
     """
-    Scrape Amazon products based on search query with improved parsing and debugging
+    Parse products out of an Amazon search results page
+    """
+    return product_parser.parse(content, num_products)
+
+def get_amazon_products(search_query, num_products=20, pages=1):
+    """
+    Scrape Amazon products based on search query, fetching result pages concurrently
     """
-    # Headers to better mimic a real browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-    }
-    
-    # Format the Amazon search URL
-    base_url = f'https://www.amazon.com/s?k={search_query.replace(" ", "+")}'
-    logger.info(f"Searching Amazon with URL: {base_url}")
-    
     try:
-        response = requests.get(base_url, headers=headers, timeout=10)
-        logger.info(f"Response status code: {response.status_code}")
-        
-        if response.status_code != 200:
-            logger.error(f"Failed to get response from Amazon. Status code: {response.status_code}")
-            return []
-            
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Debug: Save HTML to file for inspection
-        with open('amazon_response.html', 'w', encoding='utf-8') as f:
-            f.write(soup.prettify())
-            
         products = []
-        
-        # Try multiple possible selectors for product containers
-        product_divs = soup.select('div[data-component-type="s-search-result"]')
-        if not product_divs:
-            product_divs = soup.select('.s-result-item')
-        
-        logger.info(f"Found {len(product_divs)} product divs")
-        
-        for div in product_divs[:num_products]:
-            try:
-                # Multiple possible selectors for each field
-                title = (
-                    div.select_one('.a-text-normal')
-                    or div.select_one('h2')
-                    or div.select_one('.a-link-normal')
-                )
-                
-                price = (
-                    div.select_one('.a-price .a-offscreen')
-                    or div.select_one('.a-price')
-                    or div.select_one('.a-price-whole')
-                )
-                
-                rating = (
-                    div.select_one('.a-icon-alt')
-                    or div.select_one('.a-star-rating')
-                )
-                
-                image = (
-                    div.select_one('img.s-image')
-                    or div.select_one('.s-image')
-                )
-                
-                # Get ASIN (Amazon product ID)
-                asin = div.get('data-asin')
-                
-                # Extract product URL
-                product_link = div.select_one('a.a-link-normal')
-                product_url = f"https://www.amazon.com{product_link['href']}" if product_link and 'href' in product_link.attrs else None
-                
-                if title:  # Only add product if at least title is found
-                    product = {
-                        'title': title.text.strip() if title else 'N/A',
-                        'price': price.text.strip() if price else 'N/A',
-                        'rating': rating.text.strip() if rating else 'N/A',
-                        'image_url': image['src'] if image and 'src' in image.attrs else 'N/A',
-                        'asin': asin if asin else 'N/A',
-                        'product_url': product_url if product_url else 'N/A'
-                    }
-                    logger.info(f"Successfully parsed product: {product['title'][:30]}...")
-                    products.append(product)
-            except Exception as e:
-                logger.error(f"Error parsing product: {str(e)}")
+        for content in scraper_client.fetch_many((search_query, page) for page in range(1, pages + 1)):
+            if content is None:
                 continue
-                
+            products.extend(parse_products(content, num_products - len(products)))
+            if len(products) >= num_products:
+                break
         return products
     except Exception as e:
         logger.error(f"Error in get_amazon_products: {str(e)}")
@@ -109,10 +42,22 @@ def get_top_products(request):
     try:
         # Get search query from URL parameters
         search_query = request.GET.get('query', 'laptop')
+        try:
+            pages = max(1, min(int(request.GET.get('pages', 1)), SCRAPER_MAX_PAGES))
+        except ValueError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'pages must be an integer',
+                'query': search_query
+            }, status=400)
         logger.info(f"Received request for query: {search_query}")
         
-        # Get products
-        products = get_amazon_products(search_query)
+        # Cached per query; extra result pages are fetched concurrently when asked
+        num_products = 20 * pages
+        products, cache_state = scrape_cache.get_or_load(
+            scrape_cache.make_key(search_query, num_products, pages),
+            lambda: get_amazon_products(search_query, num_products=num_products, pages=pages)
+        )
         
         # Log the result
         logger.info(f"Found {len(products)} products")
@@ -121,6 +66,7 @@ def get_top_products(request):
             'status': 'success',
             'query': search_query,
             'count': len(products),
+            'cache': cache_state,
             'products': products
         }
         
@@ -146,8 +92,14 @@ def get_first_product(request):
         search_query = request.GET.get('query', 'laptop')
         logger.info(f"Received request for query (first product): {search_query}")
         
-        # Get products
-        products = get_amazon_products(search_query)
+        # Reuse a cached top-products result, otherwise parse only up to the first product
+        products = scrape_cache.peek(scrape_cache.make_key(search_query, 20, 1))
+        cache_state = 'cached' if products else None
+        if not products:
+            products, cache_state = scrape_cache.get_or_load(
+                scrape_cache.make_key(search_query, 1, 1),
+                lambda: get_amazon_products(search_query, num_products=1)
+            )
         
         if not products:
             return JsonResponse({
@@ -165,6 +117,7 @@ def get_first_product(request):
         response_data = {
             'status': 'success',
             'query': search_query,
+            'cache': cache_state,
             'product': first_product
         }
         
@@ -178,19 +131,23 @@ def get_first_product(request):
         }, status=500)
 
 
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import FAISS, Pinecone, Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import RetrievalQA
-from langchain.llms import OpenAI
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import LLMChainExtractor
-from sklearn.metrics.pairwise import cosine_similarity
-import pinecone
-import numpy as np
+@csrf_exempt
+@require_http_methods(["GET"])
+def scrape_cache_status(request):
+    """
+    Hit, stale and miss counters of the scrape result cache for this worker
+    """
+    return JsonResponse(scrape_cache.stats())
+
+
 from typing import List, Dict
 import spacy
-from sentence_transformers import SentenceTransformer
+
+from .embedding_store import embedding_key
+from .embeddings import (
+    SIMILARITY_WEIGHT, EmbeddingBackend, OpenAIEmbeddingBackend, build_embedding_backends, similarity_scores
+)
+from .product_index import ProductVectorIndex
 
 class GreenProductSearchEngine:
     """
@@ -248,20 +205,27 @@ class GreenProductSearchEngine:
         'TCO Certified': 0.8
     }
 
-    def __init__(self, openai_api_key: str):
-        """Initialize search engine with necessary APIs and models."""
-        self.sentence_transformer = SentenceTransformer('all-MiniLM-L6-v2')
-        self.openai_embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+    def __init__(self, openai_api_key: str = None, embedding_backends: List[EmbeddingBackend] = None):
+        """
+        Initialize search engine with necessary APIs and models.
+
+        Without an OpenAI key (or with GREEN_SEARCH_EMBEDDINGS=local) only the
+        local sentence-transformers model is used.
+        """
+        self.embedding_backends = embedding_backends or build_embedding_backends(openai_api_key)
         self.nlp = spacy.load("en_core_web_lg")
         
-        # Initialize FAISS for vector storage
-        self.faiss_index = FAISS.from_texts(
-            ["placeholder"], embedding=self.openai_embeddings
-        )
+        # Bounded, persisted ANN index of every product seen, on the first backend's vectors
+        self.index_backend = self.embedding_backends[0]
+        self.product_index = ProductVectorIndex(self.index_backend.model_name)
         
-        # Initialize LLM for context compression
-        self.llm = OpenAI(temperature=0)
-        self.compressor = LLMChainExtractor.from_llm(self.llm)
+        self.compressor = None
+        if any(b.name == OpenAIEmbeddingBackend.name for b in self.embedding_backends):
+            # Initialize LLM for context compression; langchain is only needed with OpenAI
+            from langchain.llms import OpenAI
+            from langchain.retrievers.document_compressors import LLMChainExtractor
+            self.llm = OpenAI(temperature=0)
+            self.compressor = LLMChainExtractor.from_llm(self.llm)
         
     def calculate_green_score(self, product: Dict) -> float:
         """
@@ -322,43 +286,46 @@ class GreenProductSearchEngine:
             'raw_score': score
         }
 
-    def semantic_search(self, products: List[Dict], query: str, top_k: int = 10) -> List[Dict]:
+    @staticmethod
+    def product_texts(products: List[Dict]):
+        """Texts to embed for products, and their embedding keys"""
+        texts = [f"{product['title']} {product.get('description', '')}" for product in products]
+        keys = [embedding_key(text, product.get('asin')) for text, product in zip(texts, products)]
+        return texts, keys
+
+    def semantic_search(self, products: List[Dict], query: str, top_k: int = 10,
+                        query_vectors: Dict = None) -> List[Dict]:
         """
         Perform semantic search using multiple embedding models and re-ranking.
+        query_vectors are query embeddings already computed, by backend name.
         """
-        # Generate query embeddings
-        query_embedding_st = self.sentence_transformer.encode(query)
-        query_embedding_openai = self.openai_embeddings.embed_query(query)
+        if not products:
+            return []
+        product_texts, product_keys = self.product_texts(products)
+        
+        # One batched embedding call per backend (for products not already in the
+        # embedding store), scored with a single matrix-vector product
+        similarities = similarity_scores(
+            self.embedding_backends, query, product_texts, product_keys, query_vectors=query_vectors
+        )
+        backend_weight = SIMILARITY_WEIGHT / len(self.embedding_backends)
         
         results = []
-        for product in products:
-            # Generate product embeddings
-            product_text = f"{product['title']} {product.get('description', '')}"
-            embedding_st = self.sentence_transformer.encode(product_text)
-            embedding_openai = self.openai_embeddings.embed_documents([product_text])[0]
-            
+        for i, product in enumerate(products):
             # Calculate green scores
             green_metrics = self.calculate_green_score(product)
             
-            # Calculate similarities
-            st_similarity = cosine_similarity([query_embedding_st], [embedding_st])[0][0]
-            openai_similarity = cosine_similarity([query_embedding_openai], [embedding_openai])[0][0]
-            
             # Combined scoring with weights
             combined_score = (
-                0.3 * st_similarity +  # Sentence transformer similarity
-                0.3 * openai_similarity +  # OpenAI embedding similarity
-                0.4 * green_metrics['score']  # Green score
+                sum(backend_weight * scores[i] for scores in similarities.values()) +
+                (1 - SIMILARITY_WEIGHT) * green_metrics['score']  # Green score
             )
             
             results.append({
                 'product': product,
-                'score': combined_score,
+                'score': float(combined_score),
                 'green_metrics': green_metrics,
-                'similarity_scores': {
-                    'sentence_transformer': float(st_similarity),
-                    'openai': float(openai_similarity)
-                }
+                'similarity_scores': {name: float(scores[i]) for name, scores in similarities.items()}
             })
         
         # Sort by combined score
@@ -371,20 +338,26 @@ class GreenProductSearchEngine:
         Main method to get eco-friendly product recommendations.
         """
         try:
-            # Store products in FAISS for vector similarity
-            product_texts = [
-                f"{p['title']} {p.get('description', '')}" 
-                for p in amazon_products
-            ]
-            self.faiss_index.add_texts(product_texts)
+            # Index the scraped products (deduplicated by ASIN)
+            if amazon_products:
+                product_texts, product_keys = self.product_texts(amazon_products)
+                self.product_index.add(
+                    product_keys, self.index_backend.embed_documents(product_texts, product_keys), amazon_products
+                )
             
-            # Perform semantic search
-            results = self.semantic_search(amazon_products, search_query)
+            # Retrieve the nearest indexed products as candidates, then re-rank only those;
+            # the query is embedded once and reused for re-ranking
+            query_vector = self.index_backend.embed_query(search_query)
+            candidates = [product for product, _ in self.product_index.search(query_vector)]
+            results = self.semantic_search(
+                candidates, search_query, query_vectors={self.index_backend.name: query_vector}
+            )
             
             # Format results for response
             formatted_results = []
             for result in results:
-                product_data = result['product']
+                # Copy, the scraped product dicts may be shared with the scrape cache
+                product_data = dict(result['product'])
                 product_data.update({
                     'green_score': result['green_metrics']['score'],
                     'sustainability_matches': result['green_metrics']['matches'],
@@ -1,41 +1,50 @@
 # train_model.py
+import ast
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder
 import joblib
 
+# The encoder and compact export live in the calculator app so training and serving share them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ML'))
+from calculator.compact_forest import CompactForest, check_parity
+from calculator.encoding import CategoricalEncoder
+
 # Load data
 df = pd.read_csv(r'C:/Users/vinay/Desktop/technovate/Technovate/Carbon Emission.csv')
 
+def count_items(value):
+    """Number of entries in a list column stored as a string like "['Metal', 'Glass']" """
+    if isinstance(value, str):
+        return len(ast.literal_eval(value))
+    return len(value)
+
 # Preprocess data
-def preprocess_data(df):
+def preprocess_data(df, encoder):
     """Preprocess the data for analysis and modeling"""
-    df_processed = df.copy()
-
     # Handle categorical variables
-    le = LabelEncoder()
-    categorical_cols = ['Body Type', 'Sex', 'Diet', 'How Often Shower', 'Heating Energy Source',
-                       'Transport', 'Vehicle Type', 'Social Activity', 'Frequency of Traveling by Air',
-                       'Waste Bag Size', 'Energy efficiency']
-
-    for col in categorical_cols:
-        df_processed[col] = le.fit_transform(df_processed[col].astype(str))
+    df_processed = encoder.transform_frame(df)
 
     # Handle list columns
-    df_processed['Recycling_Count'] = df_processed['Recycling'].apply(len)
-    df_processed['Cooking_Methods_Count'] = df_processed['Cooking_With'].apply(len)
+    df_processed['Recycling_Count'] = df_processed['Recycling'].apply(count_items)
+    df_processed['Cooking_Methods_Count'] = df_processed['Cooking_With'].apply(count_items)
 
     # Drop the original list columns
     df_processed = df_processed.drop(['Recycling', 'Cooking_With'], axis=1)
 
     return df_processed
 
+# Fit the category vocabularies once and reuse them for serving
+encoder = CategoricalEncoder.fit(df)
+
 # Preprocess the training data
-df_processed = preprocess_data(df)
+df_processed = preprocess_data(df, encoder)
 
 # Prepare features and target variable
-features = [col for col in df_processed.columns if col != 'CarbonEmission']
+features = encoder.training_columns()
 X = df_processed[features]
 y = df_processed['CarbonEmission']
 
@@ -43,7 +52,14 @@ y = df_processed['CarbonEmission']
 model = RandomForestRegressor(n_estimators=100, random_state=42)
 model.fit(X, y)
 
-# Save the trained model to a .pkl file
+# Save the trained model and its encoder side by side
 joblib.dump(model, 'carbon_footprint_model.pkl')
+encoder.save('carbon_footprint_encoder.json')
+
+# Export the flattened, memory-mappable copy served by the calculator and check it matches sklearn
+compact = CompactForest.from_sklearn(model)
+max_diff = check_parity(model, compact, X.values)
+compact.save('carbon_footprint_model_compact')
+print(f"Compact model exported (version {compact.version}, max parity difference {max_diff:.2e}).")
 
-print("Model training complete and saved successfully as 'carbon_footprint_model.pkl'.")
+print("Model training complete and saved successfully as 'carbon_footprint_model.pkl' with 'carbon_footprint_encoder.json'.")